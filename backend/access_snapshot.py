@@ -0,0 +1,428 @@
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import argparse
+import importlib.util
+from decimal import Decimal
+from datetime import date, datetime
+from itertools import islice
+import coreq_db
+from stage_profiler import stage
+
+# One Arrow IPC file per Access table plus the catalog, under exports/ (git-ignored)
+SNAPSHOT_DIR = os.path.join('exports', 'access-snapshot')
+
+CATALOG_NAME = '_catalog.json'
+
+SNAPSHOT_FORMAT = 'arrow-ipc'
+FORMAT_VERSION = 1
+
+# Rows per fetchmany() from Access, and per record batch in the file
+DUMP_BATCH_ROWS = 20000
+
+# Uncompressed files are memory-mapped without copying; lz4/zstd files are
+# smaller but are decompressed into memory when a table is opened
+COMPRESSIONS = ('lz4', 'zstd')
+
+# Access CURRENCY, when the driver reports no precision
+DEFAULT_DECIMAL = (19, 4)
+
+class UnsupportedQuery(ValueError):
+    """A query the snapshot cursor cannot answer (it is not a SQL engine)"""
+
+_SELECT_COUNT = re.compile(r'^\s*SELECT\s+COUNT\(\*\)\s+FROM\s+\[([^\]]+)\]\s*$', re.IGNORECASE)
+_SELECT = re.compile(r'^\s*SELECT\s+(.+?)\s+FROM\s+\[([^\]]+)\](\s+WHERE\s+1\s*=\s*0)?\s*$',
+                     re.IGNORECASE | re.DOTALL)
+
+def source_tables(access_conn):
+    """User tables of the source, Access or a SQLite stand-in"""
+    if isinstance(access_conn, sqlite3.Connection):
+        rows = access_conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        ).fetchall()
+        return [row[0] for row in rows]
+    cursor = access_conn.cursor()
+    tables = [info.table_name for info in cursor.tables(tableType='TABLE')
+              if not info.table_name.startswith('MSys')]
+    cursor.close()
+    return tables
+
+_DECLARED_PRECISION = re.compile(r'\(\s*(\d+)\s*(?:,\s*(\d+)\s*)?\)')
+
+def declared_arrow_type(pa, declared):
+    """Arrow type for a SQLite declared column type, following SQLite's affinity rules; None if undeclared.
+
+    Only TIMESTAMP and DATE come back as datetimes/dates (PARSE_DECLTYPES), so
+    other date-like declarations are left to the values. Money and flag
+    columns (NUMERIC affinity) never are: whole numbers in the first batch
+    would otherwise fix them as integers.
+    """
+    declared = declared.upper()
+    if declared == 'TIMESTAMP':
+        return pa.timestamp('us')
+    if declared == 'DATE':
+        return pa.date32()
+    if 'BOOL' in declared:
+        return pa.bool_()
+    if any(name in declared for name in ('DEC', 'NUMERIC', 'MONEY', 'CURRENCY')):
+        match = _DECLARED_PRECISION.search(declared)
+        precision, scale = (int(match.group(1)), int(match.group(2) or 0)) if match else DEFAULT_DECIMAL
+        return pa.decimal128(precision, scale)
+    if 'INT' in declared:
+        return pa.int64()
+    if any(name in declared for name in ('CHAR', 'CLOB', 'TEXT')):
+        return pa.string()
+    if 'BLOB' in declared:
+        return pa.binary()
+    if any(name in declared for name in ('REAL', 'FLOA', 'DOUB')):
+        return pa.float64()
+    return None
+
+def sqlite_column_types(pa, sqlite_conn, table):
+    """{column: declared Arrow type or None} from PRAGMA table_info"""
+    rows = sqlite_conn.execute(f'PRAGMA table_info("{table.replace(chr(34), chr(34) * 2)}")').fetchall()
+    return {row[1]: declared_arrow_type(pa, row[2] or '') for row in rows}
+
+def first_values(sqlite_conn, table, column):
+    """The column's first non-null value (as a one-value list), or an empty list"""
+    row = sqlite_conn.execute(
+        f'SELECT [{column}] FROM [{table}] WHERE [{column}] IS NOT NULL LIMIT 1'
+    ).fetchone()
+    return list(row or ())
+
+def arrow_type(pa, column, values, declared=None):
+    """Arrow type for a cursor.description column; None for binary (OLE) columns.
+
+    pyodbc reports a Python type per column. SQLite stand-ins report none, so
+    the declared column type is used, and failing that the type of the values.
+    """
+    type_code, precision, scale = column[1], column[4], column[5]
+    if type_code is bool:
+        return pa.bool_()
+    if type_code is int:
+        return pa.int32() if precision and precision <= 10 else pa.int64()
+    if type_code is float:
+        return pa.float64()
+    if type_code is Decimal:
+        precision, scale = (precision, scale) if precision else DEFAULT_DECIMAL
+        return pa.decimal128(precision, scale or 0)
+    if type_code is datetime:
+        return pa.timestamp('us')
+    if type_code is date:
+        return pa.date32()
+    if type_code is str:
+        return pa.string()
+    if type_code in (bytes, bytearray):
+        return None
+    if declared is not None:
+        return None if pa.types.is_binary(declared) else declared
+
+    inferred = pa.array(values).type
+    if pa.types.is_null(inferred):
+        return pa.string()
+    if pa.types.is_binary(inferred) or pa.types.is_large_binary(inferred):
+        return None
+    return inferred
+
+def python_type(pa, data_type):
+    """The type_code pyodbc would report for an Arrow column"""
+    for check, code in ((pa.types.is_boolean, bool), (pa.types.is_integer, int),
+                        (pa.types.is_floating, float), (pa.types.is_decimal, Decimal),
+                        (pa.types.is_timestamp, datetime), (pa.types.is_date, date)):
+        if check(data_type):
+            return code
+    return str
+
+def column_array(pa, values, data_type):
+    """One batch of a column as an Arrow array of the schema's type.
+
+    Values are converted by their own type and then cast safely, so a value
+    the column type cannot hold (4.25 in an integer column, an out-of-range
+    integer, more decimal places than declared) raises instead of being
+    truncated.
+    """
+    if pa.types.is_decimal(data_type):
+        # SQLite hands NUMERIC values back as int or float
+        values = [value if value is None or isinstance(value, Decimal) else Decimal(str(value))
+                  for value in values]
+    array = pa.array(values, from_pandas=False)
+    return array if array.type == data_type else array.cast(data_type, safe=True)
+
+def table_file_name(table):
+    return re.sub(r'[^\w.-]+', '_', table) + '.arrow'
+
+def dump_table(pa, access_conn, table, path, batch_rows=DUMP_BATCH_ROWS, compression=None):
+    """Write one Access table to an Arrow IPC file; returns (rows, schema, skipped columns)"""
+    cursor = access_conn.cursor()
+    with stage('fetch'):
+        cursor.execute(f'SELECT * FROM [{table}]')
+        batch = cursor.fetchmany(batch_rows)
+
+    # The schema is fixed up front: from the description (Access), or from
+    # the declared column types and values (SQLite stand-ins)
+    sqlite_source = isinstance(access_conn, sqlite3.Connection)
+    declared = sqlite_column_types(pa, access_conn, table) if sqlite_source else {}
+    columns = list(zip(*batch)) if batch else [()] * len(cursor.description)
+    fields = []
+    keep = []
+    skipped = []
+    for index, column in enumerate(cursor.description):
+        values = columns[index]
+        if sqlite_source and declared.get(column[0]) is None and all(value is None for value in values):
+            # Undeclared and NULL throughout the first batch: typed by its first non-null value
+            values = first_values(access_conn, table, column[0])
+        data_type = arrow_type(pa, column, values, declared.get(column[0]))
+        if data_type is None:
+            skipped.append(column[0])
+            continue
+        fields.append(pa.field(column[0], data_type))
+        keep.append(index)
+    schema = pa.schema(fields)
+
+    rows = 0
+    options = pa.ipc.IpcWriteOptions(compression=compression)
+    with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, schema, options=options) as writer:
+        while batch:
+            with stage('write'):
+                columns = list(zip(*batch))
+                writer.write_batch(pa.record_batch(
+                    [column_array(pa, columns[index], field.type) for index, field in zip(keep, fields)],
+                    schema=schema
+                ))
+            rows += len(batch)
+            with stage('fetch'):
+                batch = cursor.fetchmany(batch_rows)
+
+    cursor.close()
+    return rows, schema, skipped
+
+def load_catalog(directory):
+    with open(os.path.join(directory, CATALOG_NAME), encoding='utf-8') as f:
+        return json.load(f)
+
+def source_changed(catalog):
+    """True if the dumped Access file has been saved since the snapshot was taken"""
+    source = catalog.get('source')
+    if not source or not os.path.exists(source):
+        return False
+    stat = os.stat(source)
+    return (stat.st_mtime, stat.st_size) != (catalog.get('sourceMtime'), catalog.get('sourceSize'))
+
+def dump_snapshot(access_conn, source, out_dir=SNAPSHOT_DIR, tables=None,
+                  batch_rows=DUMP_BATCH_ROWS, compression=None):
+    """Dump Access tables to <out_dir>, replacing any previous snapshot there; returns the catalog.
+
+    The files are written to a sibling directory first, so a failed dump
+    leaves the previous snapshot in place.
+    """
+    import pyarrow as pa
+
+    tables = tables or source_tables(access_conn)
+    partial = f'{out_dir.rstrip(os.sep)}.partial'
+    shutil.rmtree(partial, ignore_errors=True)
+    os.makedirs(partial)
+
+    stat = os.stat(source) if os.path.exists(source) else None
+    catalog = {
+        'format': SNAPSHOT_FORMAT,
+        'version': FORMAT_VERSION,
+        'source': os.path.abspath(source),
+        'sourceMtime': stat.st_mtime if stat else None,
+        'sourceSize': stat.st_size if stat else None,
+        'createdAt': datetime.now().isoformat(timespec='seconds'),
+        'compression': compression,
+        'tables': {}
+    }
+
+    print(f'\n[INFO] Dumping {len(tables)} tables to {out_dir}...')
+    for table in tables:
+        started = time.perf_counter()
+        file_name = table_file_name(table)
+        with stage(table, phase='convert'):
+            rows, schema, skipped = dump_table(
+                pa, access_conn, table, os.path.join(partial, file_name), batch_rows, compression
+            )
+        size = os.path.getsize(os.path.join(partial, file_name))
+        catalog['tables'][table] = {
+            'file': file_name,
+            'rows': rows,
+            'bytes': size,
+            'columns': [[field.name, str(field.type)] for field in schema],
+            'skipped': skipped
+        }
+        print(f'  [OK] {table}: {rows} rows, {size / 1048576:.1f} MB ({time.perf_counter() - started:.2f}s)'
+              + (f', skipped binary columns {skipped}' if skipped else ''))
+
+    with open(os.path.join(partial, CATALOG_NAME), 'w', encoding='utf-8') as f:
+        json.dump(catalog, f, indent=2)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(partial, out_dir)
+    return catalog
+
+class SnapshotCursor:
+    """The part of a DB-API cursor the migrators use, over memory-mapped snapshot tables.
+
+    Answers SELECT * or SELECT [column], ... FROM [table] (optionally
+    WHERE 1 = 0, see row_mappers.select_columns) and SELECT COUNT(*) FROM
+    [table]. Rows are built one record batch at a time from the mapped file.
+    """
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.description = None
+        self.rowcount = -1
+        self._rows = iter(())
+
+    def execute(self, sql, params=None):
+        match = _SELECT_COUNT.match(sql)
+        if match:
+            rows = self.snapshot.table(match.group(1)).num_rows
+            self.description = (('COUNT(*)', int, None, None, None, None, False),)
+            self.rowcount = 1
+            self._rows = iter([(rows,)])
+            return self
+
+        match = _SELECT.match(sql)
+        if not match or params:
+            raise UnsupportedQuery(f'The Access snapshot cannot answer: {" ".join(sql.split())[:120]}')
+        selected, name, empty = match.groups()
+        table = self.snapshot.table(name)
+        if selected.strip() == '*':
+            columns = table.column_names
+        else:
+            columns = [column.strip()[1:-1] for column in selected.split(',')]
+        # Unknown columns raise KeyError, like a bad name raises on Access
+        table = table.select(columns)
+
+        pa = self.snapshot.pa
+        self.description = tuple(
+            (field.name, python_type(pa, field.type), None, None,
+             getattr(field.type, 'precision', None), getattr(field.type, 'scale', None), True)
+            for field in table.schema
+        )
+        self.rowcount = 0 if empty else table.num_rows
+        self._rows = iter(()) if empty else self._iter_rows(table)
+        return self
+
+    @staticmethod
+    def _iter_rows(table):
+        for batch in table.to_batches():
+            yield from zip(*(column.to_pylist() for column in batch.columns))
+
+    def fetchone(self):
+        return next(self._rows, None)
+
+    def fetchmany(self, size=1):
+        return list(islice(self._rows, size))
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def __iter__(self):
+        return self._rows
+
+    def close(self):
+        self._rows = iter(())
+
+class AccessSnapshot:
+    """Read-only stand-in for the Access connection, backed by a snapshot directory"""
+
+    def __init__(self, directory):
+        import pyarrow as pa
+        self.pa = pa
+        self.directory = directory
+        self.catalog = load_catalog(directory)
+        if self.catalog.get('format') != SNAPSHOT_FORMAT or self.catalog.get('version') != FORMAT_VERSION:
+            raise ValueError(f'{directory} is not a version {FORMAT_VERSION} {SNAPSHOT_FORMAT} snapshot')
+        # Access table names are case-insensitive
+        self.names = {name.lower(): name for name in self.catalog['tables']}
+        self._tables = {}
+        self._files = []
+
+    def table(self, name):
+        """The whole table as an Arrow Table over the mapped file (opened on first use)"""
+        key = name.lower()
+        if key not in self.names:
+            raise UnsupportedQuery(f'Table {name} is not in the snapshot at {self.directory}')
+        if key not in self._tables:
+            entry = self.catalog['tables'][self.names[key]]
+            source = self.pa.memory_map(os.path.join(self.directory, entry['file']), 'r')
+            self._files.append(source)
+            self._tables[key] = self.pa.ipc.open_file(source).read_all()
+        return self._tables[key]
+
+    def cursor(self):
+        return SnapshotCursor(self)
+
+    def close(self):
+        self._tables.clear()
+        for source in self._files:
+            source.close()
+        self._files = []
+
+def open_snapshot(directory=SNAPSHOT_DIR):
+    """Open a snapshot as the migrators' Access source, warning if Access has changed since"""
+    snapshot = AccessSnapshot(directory)
+    catalog = snapshot.catalog
+    print(f'[OK] Opened Access snapshot {directory} '
+          f'({len(catalog["tables"])} tables, taken {catalog["createdAt"]})')
+    if source_changed(catalog):
+        print(f'[WARNING] {catalog["source"]} has been saved since this snapshot was taken '
+              f'(refresh it with: coreq snapshot)')
+    return snapshot
+
+def print_catalog(directory):
+    catalog = load_catalog(directory)
+    print(f'\nSnapshot {directory}: {catalog["source"]} as of {catalog["createdAt"]}'
+          + (f' ({catalog["compression"]})' if catalog.get('compression') else ''))
+    print(f'{"Table":<30} {"Rows":>10} {"MB":>9}  Skipped')
+    for table, entry in catalog['tables'].items():
+        print(f'{table:<30} {entry["rows"]:>10} {entry["bytes"] / 1048576:>9.1f}  '
+              f'{", ".join(entry["skipped"]) or "-"}')
+    if source_changed(catalog):
+        print('[WARNING] The Access file has been saved since this snapshot was taken')
+
+def main(argv=None):
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Dump Access tables to a memory-mappable Arrow snapshot')
+    parser.add_argument('tables', nargs='*', help='Access tables to dump (default: all)')
+    parser.add_argument('--out', default=SNAPSHOT_DIR, help='snapshot directory (replaced by each dump)')
+    parser.add_argument('--source', default=None,
+                        help='Access file, or a SQLite stand-in (.db/.sqlite) with the same tables')
+    parser.add_argument('--batch-rows', type=int, default=DUMP_BATCH_ROWS, help='rows per fetch and record batch')
+    parser.add_argument('--compression', choices=COMPRESSIONS, default=None,
+                        help='compress the files (smaller, but read into memory instead of mapped)')
+    parser.add_argument('--show', action='store_true', help='list the existing snapshot and exit')
+    args = parser.parse_args(argv)
+
+    if importlib.util.find_spec('pyarrow') is None:
+        print('[ERROR] pyarrow is required for Access snapshots (pip install pyarrow)')
+        sys.exit(1)
+
+    if args.show:
+        try:
+            print_catalog(args.out)
+        except FileNotFoundError:
+            print(f'[ERROR] No snapshot at {args.out}')
+            sys.exit(1)
+        return
+
+    source = args.source or coreq_db.access_db_path()
+    try:
+        access_conn = coreq_db.open_source(source)
+    except Exception as e:
+        print(f'[ERROR] Connection failed: {e}')
+        sys.exit(1)
+
+    started = time.perf_counter()
+    catalog = dump_snapshot(access_conn, source, args.out, args.tables, args.batch_rows, args.compression)
+    access_conn.close()
+    print(f'\n[SUCCESS] Snapshot of {len(catalog["tables"])} tables written in '
+          f'{time.perf_counter() - started:.2f}s (use it with: coreq migrate --snapshot {args.out})')
+
+if __name__ == '__main__':
+    main()
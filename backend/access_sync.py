@@ -0,0 +1,278 @@
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import migrate_final
+from migrate_final import ACCESS_DB_PATH, ReferenceTracker
+from coreq_db import connect_mysql, open_source
+from loan_summaries import create_summary_tables, rebuild_summaries
+
+# Seconds between checks of the source file
+POLL_INTERVAL = 10
+
+# The source must stay unchanged this long before a cycle starts, so we do
+# not read a file Access is still writing
+SETTLE_SECONDS = 5
+
+# Rows per upsert statement (micro-batch)
+SYNC_BATCH_SIZE = 200
+
+METRICS_PATH = os.path.join('.cache', 'access_sync_metrics.json')
+
+# The metrics endpoint is unauthenticated, so it listens on loopback unless told otherwise
+METRICS_HOST = '127.0.0.1'
+
+# Parents first so the ReferenceTracker can validate children
+SYNC_STEPS = (
+    ('users', lambda src, dst, refs: migrate_final.migrate_users(src, dst, True)),
+    ('borrowers', lambda src, dst, refs: migrate_final.migrate_borrowers(src, dst, refs, None, True)),
+    ('collaterals', lambda src, dst, refs: migrate_final.migrate_collaterals(src, dst, refs, True)),
+    ('loans', lambda src, dst, refs: migrate_final.migrate_loans(src, dst, refs, None, True)),
+    ('payments', lambda src, dst, refs: migrate_final.migrate_payments(src, dst, refs, None, True)),
+    ('expenses', lambda src, dst, refs: migrate_final.migrate_expenses(src, dst, refs, True))
+)
+
+class SyncMetrics:
+    """Counters exposed as JSON and in Prometheus text format"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cycles = 0
+        self.errors = 0
+        self.last_error = None
+        self.last_sync = None
+        self.last_lag = None
+        self.max_lag = 0.0
+        self.last_cycle_seconds = None
+        self.batch_size = SYNC_BATCH_SIZE
+        self.tables = {}
+
+    def record_cycle(self, stats, high_water_marks, lag, seconds):
+        with self.lock:
+            self.cycles += 1
+            self.last_sync = datetime.now().isoformat(timespec='seconds')
+            self.last_lag = round(lag, 3)
+            self.max_lag = max(self.max_lag, self.last_lag)
+            self.last_cycle_seconds = round(seconds, 3)
+            for table, table_stats in stats.items():
+                totals = self.tables.setdefault(table, {'written': 0, 'unchanged': 0, 'failed': 0,
+                                                        'newRows': 0, 'highWaterMark': 0})
+                for key in ('written', 'unchanged', 'failed'):
+                    totals[key] += table_stats.get(key, 0)
+                previous = totals['highWaterMark']
+                current = high_water_marks.get(table) or 0
+                if previous and current > previous:
+                    totals['newRows'] += current - previous
+                totals['highWaterMark'] = current
+
+    def record_error(self, error):
+        with self.lock:
+            self.errors += 1
+            self.last_error = str(error)[:200]
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'cycles': self.cycles,
+                'errors': self.errors,
+                'lastError': self.last_error,
+                'lastSync': self.last_sync,
+                'lastLagSeconds': self.last_lag,
+                'maxLagSeconds': self.max_lag,
+                'lastCycleSeconds': self.last_cycle_seconds,
+                'batchSize': self.batch_size,
+                'tables': json.loads(json.dumps(self.tables))
+            }
+
+    def prometheus(self):
+        data = self.snapshot()
+        lines = [
+            f'coreq_sync_cycles_total {data["cycles"]}',
+            f'coreq_sync_errors_total {data["errors"]}',
+            f'coreq_sync_lag_seconds {data["lastLagSeconds"] or 0}',
+            f'coreq_sync_max_lag_seconds {data["maxLagSeconds"]}',
+            f'coreq_sync_cycle_seconds {data["lastCycleSeconds"] or 0}',
+            f'coreq_sync_batch_size {data["batchSize"]}'
+        ]
+        for table, totals in data['tables'].items():
+            for key, metric in (('written', 'rows_written_total'), ('unchanged', 'rows_unchanged_total'),
+                                ('failed', 'rows_failed_total'), ('newRows', 'rows_new_total'),
+                                ('highWaterMark', 'high_water_mark')):
+                lines.append(f'coreq_sync_{metric}{{table="{table}"}} {totals[key]}')
+        return '\n'.join(lines) + '\n'
+
+    def save(self, path=METRICS_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+def serve_metrics(metrics, port, host=METRICS_HOST):
+    """Serve /metrics (Prometheus text) and /metrics.json on a background thread"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/metrics.json':
+                body, content_type = json.dumps(metrics.snapshot()).encode('utf-8'), 'application/json'
+            elif self.path == '/metrics':
+                body, content_type = metrics.prometheus().encode('utf-8'), 'text/plain; version=0.0.4'
+            else:
+                self.send_response(404)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f'[INFO] Metrics on http://{host}:{port}/metrics')
+    return server
+
+def source_fingerprint(source):
+    """(mtime, size) of the source file; changes whenever Access saves"""
+    stat = os.stat(source)
+    return stat.st_mtime, stat.st_size
+
+def high_water_marks(mysql_conn):
+    """Highest id per synced table"""
+    cursor = mysql_conn.cursor()
+    marks = {}
+    for table, _ in SYNC_STEPS:
+        cursor.execute(f'SELECT MAX(id) FROM `{table}`')
+        marks[table] = cursor.fetchone()[0]
+    cursor.close()
+    return marks
+
+def sync_once(source, mysql_conn):
+    """Apply new and changed source rows to MySQL; returns per-table writer stats"""
+    source_conn = open_source(source)
+    refs = ReferenceTracker()
+    stats = {}
+    try:
+        for table, step in SYNC_STEPS:
+            stats[table] = step(source_conn, mysql_conn, refs) or {}
+    finally:
+        source_conn.close()
+
+    if any(table_stats.get('written') for table_stats in stats.values()):
+        rebuild_summaries(mysql_conn)
+
+    refs.write_report()
+    return stats
+
+def run(source, poll_interval, settle_seconds, max_interval, metrics):
+    """Watch the source and sync whenever it changes (or at least every max_interval)"""
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stopping.set())
+    signal.signal(signal.SIGINT, lambda *args: stopping.set())
+
+    mysql_conn = connect_mysql()
+    create_summary_tables(mysql_conn)
+    migrate_final.create_row_hash_table(mysql_conn)
+
+    synced_fingerprint = None
+    # First detection of unsynced changes (for the lag metric) and the latest change (for settling)
+    changed_at = None
+    last_change = None
+    last_seen = None
+    last_sync = 0.0
+
+    print(f'[INFO] Watching {source} (poll {poll_interval}s, settle {settle_seconds}s)')
+    while not stopping.is_set():
+        try:
+            fingerprint = source_fingerprint(source)
+            now = time.time()
+
+            if fingerprint != last_seen:
+                # Source is (still) changing; restart the settle window
+                last_seen = fingerprint
+                changed_at = changed_at or now
+                last_change = now
+                settled = False
+            else:
+                settled = now - (last_change or now) >= settle_seconds
+
+            due = max_interval and now - last_sync >= max_interval
+            if (fingerprint != synced_fingerprint and settled) or due:
+                detected = changed_at or now
+                started = time.perf_counter()
+                print(f'\n[SYNC] {datetime.now():%Y-%m-%d %H:%M:%S} source changed, syncing...')
+
+                if not mysql_conn.is_connected():
+                    mysql_conn.reconnect(attempts=3, delay=2)
+
+                stats = sync_once(source, mysql_conn)
+                metrics.record_cycle(stats, high_water_marks(mysql_conn),
+                                     time.time() - detected, time.perf_counter() - started)
+                metrics.save()
+
+                synced_fingerprint = fingerprint
+                changed_at = None
+                last_change = None
+                last_sync = time.time()
+                written = sum(table_stats.get('written', 0) for table_stats in stats.values())
+                print(f'[SYNC] {written} rows written, lag {metrics.last_lag}s')
+        except Exception as e:
+            metrics.record_error(e)
+            metrics.save()
+            print(f'[ERROR] Sync cycle failed: {e}')
+
+        stopping.wait(poll_interval)
+
+    mysql_conn.close()
+    print('[INFO] Sync service stopped')
+
+def main(argv=None):
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Continuous Access to MySQL sync service')
+    parser.add_argument('--source', default=ACCESS_DB_PATH,
+                        help='Access file, or a SQLite stand-in (.db/.sqlite) with the same tables')
+    parser.add_argument('--poll', type=float, default=POLL_INTERVAL, help='seconds between source checks')
+    parser.add_argument('--settle', type=float, default=SETTLE_SECONDS,
+                        help='seconds the source must be unchanged before syncing')
+    parser.add_argument('--max-interval', type=float, default=0,
+                        help='force a sync at least this often, even without a detected change (0 = never)')
+    parser.add_argument('--batch-size', type=int, default=SYNC_BATCH_SIZE, help='rows per upsert micro-batch')
+    parser.add_argument('--metrics-port', type=int, default=None, help='serve /metrics on this port')
+    parser.add_argument('--metrics-host', default=METRICS_HOST,
+                        help='address to serve /metrics on (0.0.0.0 to expose it to the network)')
+    parser.add_argument('--once', action='store_true', help='run a single sync cycle and exit')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.source):
+        print(f'[ERROR] Source not found: {args.source}')
+        sys.exit(1)
+
+    migrate_final.UPSERT_BATCH_SIZE = args.batch_size
+    metrics = SyncMetrics()
+    metrics.batch_size = args.batch_size
+
+    if args.metrics_port:
+        serve_metrics(metrics, args.metrics_port, args.metrics_host)
+
+    if args.once:
+        mysql_conn = connect_mysql()
+        create_summary_tables(mysql_conn)
+        migrate_final.create_row_hash_table(mysql_conn)
+        started = time.perf_counter()
+        stats = sync_once(args.source, mysql_conn)
+        elapsed = time.perf_counter() - started
+        metrics.record_cycle(stats, high_water_marks(mysql_conn), elapsed, elapsed)
+        metrics.save()
+        mysql_conn.close()
+        print(json.dumps(metrics.snapshot()['tables'], indent=2))
+        return
+
+    run(args.source, args.poll, args.settle, args.max_interval, metrics)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+import os
+import re
+import csv
+import sys
+import time
+import getpass
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from coreq_db import connect_mysql
+
+# Same cost factor the Node backend uses in authController (bcrypt.hash(password, 8))
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '8'))
+
+# Rows per UPDATE statement when writing hashes back
+BATCH_SIZE = 500
+
+# $2a$/$2b$/$2y$ hashes as written by bcrypt and bcryptjs
+BCRYPT_PATTERN = re.compile(r'^\$2[abxy]?\$\d{2}\$[./A-Za-z0-9]{53}$')
+
+# Columns a reset CSV may use to identify the user
+RESET_KEYS = ('id', 'username', 'email')
+
+def is_bcrypt_hash(value):
+    """Return True if value already looks like a bcrypt hash"""
+    return bool(value) and BCRYPT_PATTERN.match(value) is not None
+
+def hash_password(args):
+    """Hash one (key, plaintext, rounds) job; runs inside a worker process"""
+    import bcrypt
+    key, plaintext, rounds = args
+    hashed = bcrypt.hashpw(plaintext.encode('utf-8'), bcrypt.gensalt(rounds))
+    return key, hashed.decode('utf-8')
+
+def hash_all(jobs, rounds=BCRYPT_ROUNDS, workers=None):
+    """Hash a list of (key, plaintext) pairs across a process pool"""
+    if not jobs:
+        return []
+
+    work = [(key, plaintext, rounds) for key, plaintext in jobs]
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(work) // (workers * 4))
+
+    if workers == 1 or len(work) == 1:
+        return [hash_password(job) for job in work]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(hash_password, work, chunksize=chunksize))
+
+def write_hashes(mysql_conn, key_column, hashes, batch_size=BATCH_SIZE):
+    """Write (key, hash) pairs back with one CASE-based UPDATE per batch"""
+    cursor = mysql_conn.cursor()
+    updated = 0
+
+    for start in range(0, len(hashes), batch_size):
+        batch = hashes[start:start + batch_size]
+        cases = ' '.join(['WHEN %s THEN %s'] * len(batch))
+        keys = ', '.join(['%s'] * len(batch))
+        params = []
+        for key, hashed in batch:
+            params.extend((key, hashed))
+        params.extend(key for key, _ in batch)
+
+        cursor.execute(
+            f'UPDATE users SET password = CASE `{key_column}` {cases} END '
+            f'WHERE `{key_column}` IN ({keys})',
+            params
+        )
+        updated += cursor.rowcount
+        mysql_conn.commit()
+
+    cursor.close()
+    return updated
+
+def find_plaintext_users(mysql_conn):
+    """Return (id, password) for every user whose password is not bcrypt"""
+    cursor = mysql_conn.cursor()
+    cursor.execute('SELECT id, password FROM users')
+    pending = [(user_id, password) for user_id, password in cursor.fetchall()
+               if password and not is_bcrypt_hash(password)]
+    cursor.close()
+    return pending
+
+def read_reset_csv(path):
+    """Read reset requests from a CSV with a password column and one of id/username/email"""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        fields = [name.strip().lower() for name in (reader.fieldnames or [])]
+        key_column = next((key for key in RESET_KEYS if key in fields), None)
+
+        if key_column is None or 'password' not in fields:
+            raise ValueError(f'CSV needs a password column and one of: {", ".join(RESET_KEYS)}')
+
+        jobs = []
+        for line_no, row in enumerate(reader, start=2):
+            row = {k.strip().lower(): (v or '').strip() for k, v in row.items() if k}
+            if not row.get(key_column) or not row.get('password'):
+                print(f'  [WARNING] Skipping line {line_no}: missing {key_column} or password')
+                continue
+            jobs.append((row[key_column], row['password']))
+
+    return key_column, jobs
+
+def rehash_plaintext(mysql_conn, rounds, workers, dry_run=False):
+    """Hash every stored password that is not bcrypt yet"""
+    print('[INFO] Scanning users for non-bcrypt passwords...')
+    pending = find_plaintext_users(mysql_conn)
+    print(f'  Found {len(pending)} plaintext passwords')
+
+    if dry_run or not pending:
+        return
+
+    started = time.perf_counter()
+    hashes = hash_all(pending, rounds, workers)
+    elapsed = time.perf_counter() - started
+    print(f'  Hashed {len(hashes)} passwords in {elapsed:.2f}s (cost {rounds})')
+
+    updated = write_hashes(mysql_conn, 'id', hashes)
+    print(f'[SUCCESS] Updated {updated} users\n')
+
+def reset_from_csv(mysql_conn, path, rounds, workers, dry_run=False):
+    """Apply a batch of password resets from a CSV file"""
+    print(f'[INFO] Reading reset requests from {path}...')
+    key_column, jobs = read_reset_csv(path)
+    print(f'  {len(jobs)} reset requests keyed on {key_column}')
+
+    if dry_run or not jobs:
+        return
+
+    started = time.perf_counter()
+    hashes = hash_all(jobs, rounds, workers)
+    elapsed = time.perf_counter() - started
+    print(f'  Hashed {len(hashes)} passwords in {elapsed:.2f}s (cost {rounds})')
+
+    updated = write_hashes(mysql_conn, key_column, hashes)
+    if updated < len(hashes):
+        print(f'  [WARNING] {len(hashes) - updated} requests matched no user (or were unchanged)')
+    print(f'[SUCCESS] Reset {updated} passwords\n')
+
+def user_key_column(user):
+    """Guess which column identifies a user given on the command line"""
+    if user.isdigit():
+        return 'id'
+    return 'email' if '@' in user else 'username'
+
+def set_password(mysql_conn, user, password, rounds, dry_run=False):
+    """Set one user's password (replaces the one-off update_*_password scripts)"""
+    key_column = user_key_column(user)
+    print(f'[INFO] Setting password for {key_column} {user}...')
+    if dry_run:
+        return
+
+    hashes = [hash_password((user, password, rounds))]
+    updated = write_hashes(mysql_conn, key_column, hashes)
+    if updated:
+        print('[SUCCESS] Password updated\n')
+    else:
+        print(f'[WARNING] No user matched {key_column} {user} (or the password was unchanged)\n')
+
+def main(argv=None):
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Bulk bcrypt hashing for users.password')
+    parser.add_argument('--rehash', action='store_true',
+                        help='hash every stored password that is not bcrypt yet')
+    parser.add_argument('--reset', metavar='CSV',
+                        help='apply password resets from a CSV (id|username|email,password)')
+    parser.add_argument('--set', metavar='USER',
+                        help='set one password, prompting for it (USER is an id, username or email)')
+    parser.add_argument('--rounds', type=int, default=BCRYPT_ROUNDS,
+                        help=f'bcrypt cost factor (default {BCRYPT_ROUNDS})')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='hashing processes (default: CPU count)')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='report what would change without writing')
+    args = parser.parse_args(argv)
+
+    if not args.rehash and not args.reset and not args.set:
+        parser.print_help()
+        sys.exit(1)
+
+    password = None
+    if args.set:
+        password = getpass.getpass(f'New password for {args.set}: ')
+        if not password or password != getpass.getpass('Repeat password: '):
+            print('[ERROR] Passwords are empty or do not match')
+            sys.exit(1)
+
+    mysql_conn = connect_mysql()
+
+    if args.set:
+        set_password(mysql_conn, args.set, password, args.rounds, args.dry_run)
+    if args.rehash:
+        rehash_plaintext(mysql_conn, args.rounds, args.workers, args.dry_run)
+    if args.reset:
+        reset_from_csv(mysql_conn, args.reset, args.rounds, args.workers, args.dry_run)
+
+    mysql_conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import sys
+import argparse
+import importlib
+import stage_profiler
+
+# Subcommand -> (module, extra leading arguments, help). Modules are imported
+# only when their subcommand runs, so database drivers (pyodbc in particular)
+# are never loaded by tasks that do not need them.
+COMMANDS = {
+    'migrate': ('migrate_final', [], 'Access to MySQL migration (--shadow, --upsert, --partitioned, --photos)'),
+    'verify': ('migrate_final', ['--verify'], 'compare Access and MySQL row counts'),
+    'schema': ('schema_planner', [], 'diff the live schema against the declared one (--apply)'),
+    'swap': ('shadow_swap', [], 'status, --swap or --rollback of a migrate --shadow build'),
+    'snapshot': ('access_snapshot', [], 'dump Access tables to a memory-mapped snapshot (migrate --snapshot DIR)'),
+    'mirror': ('migrate_access_complete', [], 'copy every Access table as-is (--create-tables, --migrate-data)'),
+    'reconcile': ('reconcile', [], 'reconcile money totals by month and borrower (--drill GROUP)'),
+    'status': ('update_statuses_from_access', [], 'update loan statuses (--no-access: due dates only)'),
+    'status-workers': ('status_workers', [], 'share the status sweep across workers by loan id range'),
+    'photos': ('item_photos', [], 'extract item photos to content-addressed files'),
+    'inspect': ('profile_access_tables', [], 'profile Access tables and columns'),
+    'users': ('bulk_credentials', [], 'user admin: --set USER, --rehash, --reset CSV'),
+    'reprice': ('reprice_loans', [], 're-price loans from the current settings (--dry-run)'),
+    'summaries': ('loan_summaries', [], 'show or --rebuild the loan summary tables'),
+    'partitions': ('loan_partitions', [], 'add future monthly partitions (--months N)'),
+    'indexes': ('index_advisor', [], 'benchmark hot queries and propose indexes'),
+    'statements': ('loan_statements', [], 'write per-borrower loan statements with running balances (--as-of)'),
+    'analytics': ('portfolio_analytics', [], 'portfolio analytics report'),
+    'export': ('export_parquet', [], 'incremental Parquet export'),
+    'sync': ('access_sync', [], 'continuous Access to MySQL sync service')
+}
+
+def build_parser():
+    """Top-level parser; each command's own options are parsed by its module"""
+    commands = '\n'.join(f'  {name:<16}{help_text}' for name, (_, _, help_text) in COMMANDS.items())
+    parser = argparse.ArgumentParser(
+        prog='coreq',
+        description='Coreq Capital database tools',
+        epilog=f'commands:\n{commands}\n\nRun "coreq <command> --help" for the options of a command.\n'
+               'Profiling options go before the command: coreq --profile migrate --upsert',
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--profile', action='store_true',
+                        help='sample the command per stage; write flamegraphs and a hotspot summary')
+    parser.add_argument('--profile-dir', default=stage_profiler.PROFILE_DIR, help='where profiles are written')
+    parser.add_argument('--profile-interval', type=float, default=stage_profiler.SAMPLE_INTERVAL * 1000,
+                        help='milliseconds between samples')
+    parser.add_argument('--profile-top', type=int, default=stage_profiler.TOP_N,
+                        help='functions listed in the hotspot summary')
+    parser.add_argument('command', nargs='?', choices=COMMANDS, metavar='<command>')
+    parser.add_argument('args', nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    return parser
+
+def run(command, args):
+    """Import the command's module and hand it the remaining arguments"""
+    module_name, leading, _ = COMMANDS[command]
+    module = importlib.import_module(module_name)
+    return module.main(leading + args)
+
+def main(argv=None):
+    """Main function"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if not args.command:
+        parser.print_help()
+        sys.exit(1)
+
+    if not args.profile:
+        run(args.command, args.args)
+        return
+
+    stage_profiler.start(args.profile_interval / 1000)
+    try:
+        run(args.command, args.args)
+    finally:
+        stage_profiler.finish(args.command, args.profile_dir, args.profile_top)
+
+if __name__ == '__main__':
+    main()
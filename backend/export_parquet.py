@@ -0,0 +1,267 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+from datetime import datetime, timedelta
+from coreq_db import connect_snapshot
+from stage_profiler import stage
+
+# Rows per fetch from the server-side cursor, and per Parquet row group
+ROW_GROUP_SIZE = 50000
+
+COMPRESSION = 'zstd'
+
+MANIFEST_NAME = '_manifest.json'
+
+# Tables whose rows are never updated once inserted (the API only creates
+# payments) are exported by id. The others carry updatedAt and are exported by
+# an updatedAt watermark, so a changed row is written again to a newer part
+# file: readers keep the row with the latest updatedAt per id. Rows with no
+# updatedAt are exported once, by id. Deleted rows are not tracked; run --full
+# to drop them from the export.
+APPEND_ONLY_TABLES = ('payments',)
+
+# Each run re-reads changes this far behind the last exported updatedAt, for
+# transactions that committed after a later change was exported. A change
+# committed more than this after its updatedAt was set is missed until --full.
+CHANGE_LAG_SECONDS = 300
+
+# Exported tables, mirroring migrate_final.create_schema():
+# table -> (month partition column or None, [(column, type)])
+EXPORT_TABLES = {
+    'borrowers': (None, [
+        ('id', 'int'), ('fullName', 'string'), ('idNumber', 'string'),
+        ('phoneNumber', 'string'), ('emergencyNumber', 'string'), ('email', 'string'),
+        ('location', 'string'), ('apartment', 'string'), ('houseNumber', 'string'),
+        ('isStudent', 'bool'), ('institution', 'string'), ('registrationNumber', 'string'),
+        ('createdAt', 'datetime'), ('updatedAt', 'datetime')
+    ]),
+    'collaterals': (None, [
+        ('id', 'int'), ('borrowerId', 'int'), ('category', 'string'), ('itemName', 'string'),
+        ('modelNumber', 'string'), ('serialNumber', 'string'), ('itemCondition', 'string'),
+        ('isSeized', 'bool'), ('isSold', 'bool'), ('soldPrice', 'money'),
+        ('soldDate', 'datetime'), ('createdAt', 'datetime'), ('updatedAt', 'datetime')
+    ]),
+    'loans': ('dateIssued', [
+        ('id', 'int'), ('borrowerId', 'int'), ('collateralId', 'int'),
+        ('amountIssued', 'money'), ('dateIssued', 'datetime'), ('loanPeriod', 'int'),
+        ('interestRate', 'rate'), ('dueDate', 'datetime'), ('gracePeriodEnd', 'datetime'),
+        ('status', 'enum'), ('totalAmount', 'money'), ('penalties', 'money'),
+        ('isNegotiable', 'bool'), ('lastPenaltyDate', 'datetime'),
+        ('createdAt', 'datetime'), ('updatedAt', 'datetime')
+    ]),
+    'payments': ('paymentDate', [
+        ('id', 'int'), ('loanId', 'int'), ('amount', 'money'),
+        ('paymentDate', 'datetime'), ('note', 'string'), ('createdAt', 'datetime')
+    ]),
+    'expenses': ('date', [
+        ('id', 'int'), ('category', 'string'), ('name', 'string'), ('date', 'datetime'),
+        ('amount', 'money'), ('addedBy', 'int'),
+        ('createdAt', 'datetime'), ('updatedAt', 'datetime')
+    ])
+}
+
+def arrow_type(pa, type_name):
+    """Map an EXPORT_TABLES type name to an Arrow type"""
+    return {
+        'int': pa.int32(),
+        'string': pa.string(),
+        'enum': pa.dictionary(pa.int8(), pa.string()),
+        'bool': pa.bool_(),
+        'money': pa.decimal128(10, 2),
+        'rate': pa.decimal128(5, 2),
+        'datetime': pa.timestamp('s')
+    }[type_name]
+
+def to_arrow_value(type_name, value):
+    """Coerce a MySQL value to what pyarrow expects for the column type"""
+    if value is None:
+        return None
+    if type_name == 'bool':
+        return bool(value)
+    if type_name in ('string', 'enum') and isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8')
+    return value
+
+def load_manifest(out_dir):
+    """Read the export manifest (per-table high-water marks)"""
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def save_manifest(out_dir, manifest):
+    """Write the export manifest atomically"""
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+def changed_rows_queries(table, names, state, cutoff):
+    """[(SELECT, params, watermark key)] for the rows past the table's watermarks, each in watermark order.
+
+    updatedAt is filtered and ordered on bare, so an index on it serves the
+    query. Rows changed at or after the run's cut-off are left to the next run.
+    """
+    select = f'SELECT {", ".join(f"`{name}`" for name in names)} FROM `{table}` '
+    if table in APPEND_ONLY_TABLES:
+        return [(select + 'WHERE id > %s ORDER BY id', (state['lastId'],), 'lastId')]
+
+    queries = [(select + 'WHERE `updatedAt` IS NULL AND id > %s ORDER BY id',
+                (state.get('lastNullId', 0),), 'lastNullId')]
+    if state.get('lastChange'):
+        since = datetime.fromisoformat(state['lastChange']) - timedelta(seconds=CHANGE_LAG_SECONDS)
+        queries.append((select + 'WHERE `updatedAt` >= %s AND `updatedAt` < %s ORDER BY `updatedAt`, id',
+                        (since, cutoff), 'lastChange'))
+    else:
+        queries.append((select + 'WHERE `updatedAt` < %s ORDER BY `updatedAt`, id', (cutoff,), 'lastChange'))
+    return queries
+
+def export_table(pa, pq, mysql_conn, out_dir, table, state, run_tag, cutoff):
+    """Stream one table's new or changed rows with a server-side cursor into month-partitioned Parquet files.
+
+    Returns (rows, watermark, files). Files of a failed export are removed.
+    """
+    partition_column, columns = EXPORT_TABLES[table]
+    names = [name for name, _ in columns]
+    types = [type_name for _, type_name in columns]
+    schema = pa.schema([(name, arrow_type(pa, type_name)) for name, type_name in columns])
+    partition_index = names.index(partition_column) if partition_column else None
+    updated_index = None if table in APPEND_ONLY_TABLES else names.index('updatedAt')
+
+    queries = changed_rows_queries(table, names, state, cutoff)
+    watermark = {key: state.get(key, None if key == 'lastChange' else 0) for _, _, key in queries}
+
+    writers = {}
+    files = []
+    exported = 0
+    cursor = None
+    try:
+        for sql, params, watermark_key in queries:
+            cursor = mysql_conn.cursor(buffered=False)
+            cursor.execute(sql, params)
+            while True:
+                with stage('fetch'):
+                    rows = cursor.fetchmany(ROW_GROUP_SIZE)
+                if not rows:
+                    break
+
+                # Split the chunk by partition so each becomes one row group per month
+                partitions = {}
+                for row in rows:
+                    if partition_index is None:
+                        key = None
+                    else:
+                        value = row[partition_index]
+                        key = value.strftime('%Y-%m') if value else 'unknown'
+                    partitions.setdefault(key, []).append(row)
+
+                for key, part_rows in partitions.items():
+                    if key not in writers:
+                        directory = os.path.join(out_dir, table)
+                        if key is not None:
+                            directory = os.path.join(directory, f'month={key}')
+                        os.makedirs(directory, exist_ok=True)
+                        path = os.path.join(directory, f'part-{run_tag}.parquet')
+                        writers[key] = pq.ParquetWriter(path, schema, compression=COMPRESSION)
+                        files.append(path)
+
+                    # Enums are built as plain strings and dictionary-encoded by the cast
+                    arrays = [
+                        pa.array([to_arrow_value(type_name, row[i]) for row in part_rows],
+                                 type=pa.string() if type_name == 'enum' else schema.field(i).type)
+                        for i, type_name in enumerate(types)
+                    ]
+                    batch = pa.Table.from_arrays(arrays, names=names).cast(schema)
+                    with stage('write'):
+                        writers[key].write_table(batch)
+
+                exported += len(rows)
+                if watermark_key == 'lastChange':
+                    watermark['lastChange'] = str(rows[-1][updated_index])
+                else:
+                    watermark[watermark_key] = rows[-1][0]
+            cursor.close()
+            cursor = None
+    except BaseException:
+        if cursor is not None:
+            cursor.close()
+        for writer in writers.values():
+            writer.close()
+        for path in files:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+
+    for writer in writers.values():
+        writer.close()
+    return exported, watermark, files
+
+def main(argv=None):
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Export the loan book to Parquet')
+    parser.add_argument('tables', nargs='*', help=f'tables to export (default: {", ".join(EXPORT_TABLES)})')
+    parser.add_argument('--out', default='exports/parquet', help='output directory')
+    parser.add_argument('--full', action='store_true',
+                        help='ignore high-water marks and export every row again')
+    args = parser.parse_args(argv)
+
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        print('[ERROR] pyarrow is required for Parquet export (pip install pyarrow)')
+        sys.exit(1)
+
+    tables = args.tables or list(EXPORT_TABLES)
+    unknown = [table for table in tables if table not in EXPORT_TABLES]
+    if unknown:
+        print(f'[ERROR] Unknown tables: {", ".join(unknown)}')
+        sys.exit(1)
+
+    os.makedirs(args.out, exist_ok=True)
+    manifest = load_manifest(args.out)
+    if args.full:
+        for table in tables:
+            manifest.pop(table, None)
+            shutil.rmtree(os.path.join(args.out, table), ignore_errors=True)
+    run_tag = datetime.now().strftime('%Y%m%d%H%M%S')
+
+    # Every table is exported as of the same instant
+    mysql_conn = connect_snapshot()
+    cursor = mysql_conn.cursor()
+    cursor.execute('SELECT NOW()')
+    cutoff = cursor.fetchone()[0]
+    cursor.close()
+    print(f'\n[INFO] Exporting {len(tables)} tables to {args.out} (changes before {cutoff})...')
+
+    for table in tables:
+        state = manifest.get(table, {'lastId': 0, 'rows': 0, 'files': []})
+        started = time.perf_counter()
+        try:
+            with stage(table, phase='convert'):
+                exported, watermark, files = export_table(
+                    pa, pq, mysql_conn, args.out, table, state, run_tag, cutoff
+                )
+        except Exception as e:
+            print(f'  [ERROR] Could not export {table}: {e}')
+            continue
+
+        manifest[table] = {
+            **watermark,
+            'rows': state['rows'] + exported,
+            'files': state['files'] + [os.path.relpath(path, args.out) for path in files],
+            'exportedAt': datetime.now().isoformat(timespec='seconds')
+        }
+        save_manifest(args.out, manifest)
+        print(f'  [OK] {table}: {exported} new or changed rows in {len(files)} files '
+              f'({time.perf_counter() - started:.2f}s)')
+
+    mysql_conn.close()
+    print('\n[SUCCESS] Export completed')
+
+if __name__ == '__main__':
+    main()
@@ -1,36 +1,29 @@
-import mysql.connector
-import os
-from dotenv import load_dotenv
+from coreq_db import connect_mysql
 
-load_dotenv()
+def main():
+    """Main function"""
+    # Connect to MySQL
+    mysql_conn = connect_mysql()
+    cursor = mysql_conn.cursor()
 
-# Database configuration
-MYSQL_CONFIG = {
-    'host': os.getenv('DB_HOST', 'localhost'),
-    'user': os.getenv('DB_USER', 'root'),
-    'password': os.getenv('DB_PASSWORD', ''),
-    'database': os.getenv('DB_NAME', 'coreq_loans')
-}
+    # Bcrypt hash for password "1234"
+    hashed_password = '$2b$08$UJak.sGeDWfU0psop1UbiObvntpudjLQ35Dr/Jjz.x19XR7AIfyO.'
 
-# Connect to MySQL
-mysql_conn = mysql.connector.connect(**MYSQL_CONFIG)
-cursor = mysql_conn.cursor()
+    # Update the user
+    cursor.execute(
+        "UPDATE users SET password = %s WHERE id = 1",
+        (hashed_password,)
+    )
+    mysql_conn.commit()
 
-# Bcrypt hash for password "1234"
-hashed_password = '$2b$08$UJak.sGeDWfU0psop1UbiObvntpudjLQ35Dr/Jjz.x19XR7AIfyO.'
+    # Verify
+    cursor.execute("SELECT id, email, password FROM users WHERE id = 1")
+    user = cursor.fetchone()
+    print(f"Updated user: {user[1]}")
+    print(f"Password hash: {user[2]}")
 
-# Update the user
-cursor.execute(
-    "UPDATE users SET password = %s WHERE id = 1",
-    (hashed_password,)
-)
-mysql_conn.commit()
+    cursor.close()
+    mysql_conn.close()
 
-# Verify
-cursor.execute("SELECT id, email, password FROM users WHERE id = 1")
-user = cursor.fetchone()
-print(f"Updated user: {user[1]}")
-print(f"Password hash: {user[2]}")
-
-cursor.close()
-mysql_conn.close()
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+import re
+import time
+import argparse
+from datetime import datetime, timedelta
+from coreq_db import connect_mysql
+from loan_statements import LOAN_SQL as STATEMENT_LOAN_SQL, PAGE_SIZE as STATEMENT_PAGE_SIZE
+from loan_statements import PAYMENT_SQL as STATEMENT_PAYMENT_SQL
+from reprice_loans import LOAN_PAGE_SQL, PAGE_SIZE as REPRICE_PAGE_SIZE
+from update_statuses_from_access import CHANGED_LOANS_SQL, SWEEP_CHUNK_SIZE, SWEEP_CHUNK_SQL
+
+# Timed executions per query when benchmarking (median is reported)
+BENCHMARK_RUNS = 5
+
+def max_loan_id(cursor):
+    """The scheduler's keyset position once every loan has been loaded"""
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM loans')
+    return cursor.fetchone()[0]
+
+# The project's hot queries, built from the SQL the jobs run. Each entry
+# names one table of the query (by its alias in the plan), the columns the
+# query filters that table on by equality, by range and for ordering, plus
+# the columns it reads from it, which is what the advisor needs to derive a
+# composite (and covering) index. A query touching several tables has one
+# entry per table worth indexing.
+HOT_QUERIES = [
+    {
+        'name': 'open_loans_sweep',
+        'source': 'update_statuses_from_access.py / status_workers.py',
+        'table': 'loans',
+        'alias': 'l',
+        'sql': SWEEP_CHUNK_SQL.format(upper=''),
+        'params': lambda cursor: (0, SWEEP_CHUNK_SIZE),
+        'equality': [],
+        'range': ['id'],
+        'order': ['id'],
+        'select': []
+    },
+    {
+        # The correlated SUM(payments.amount) per swept loan is the expensive part
+        'name': 'open_loans_sweep_paid',
+        'source': 'update_statuses_from_access.py / status_workers.py',
+        'table': 'payments',
+        'alias': 'p',
+        'sql': SWEEP_CHUNK_SQL.format(upper=''),
+        'params': lambda cursor: (0, SWEEP_CHUNK_SIZE),
+        'equality': ['loanId'],
+        'range': [],
+        'order': [],
+        'select': ['amount']
+    },
+    {
+        'name': 'reprice_page_paid',
+        'source': 'reprice_loans.py',
+        'table': 'payments',
+        'alias': 'p',
+        'sql': LOAN_PAGE_SQL.format(filters=''),
+        'params': lambda cursor: (0, REPRICE_PAGE_SIZE),
+        'equality': ['loanId'],
+        'range': [],
+        'order': [],
+        'select': ['amount']
+    },
+    {
+        'name': 'loans_changed_since',
+        'source': 'update_statuses_from_access.py --schedule',
+        'table': 'loans',
+        'sql': CHANGED_LOANS_SQL,
+        'params': lambda cursor: (max_loan_id(cursor), datetime.now() - timedelta(minutes=1)),
+        'equality': [],
+        'range': ['updatedAt'],
+        'order': [],
+        'select': []
+    },
+    {
+        'name': 'statement_loans',
+        'source': 'loan_statements.py',
+        'table': 'loans',
+        'sql': STATEMENT_LOAN_SQL,
+        'params': lambda cursor: (0, STATEMENT_PAGE_SIZE, datetime.now()),
+        'equality': [],
+        'range': ['borrowerId'],
+        'order': [],
+        'select': []
+    },
+    {
+        'name': 'statement_payments',
+        'source': 'loan_statements.py',
+        'table': 'payments',
+        'alias': 'p',
+        'sql': STATEMENT_PAYMENT_SQL,
+        'params': lambda cursor: (0, STATEMENT_PAGE_SIZE, datetime.now(), datetime.now()),
+        'equality': ['loanId'],
+        'range': [],
+        'order': ['paymentDate'],
+        'select': ['amount']
+    }
+]
+
+def existing_indexes(cursor, table):
+    """Return {index name: [columns in order]} for a table"""
+    cursor.execute('''
+        SELECT INDEX_NAME, COLUMN_NAME
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        ORDER BY INDEX_NAME, SEQ_IN_INDEX
+    ''', (table,))
+    indexes = {}
+    for index_name, column in cursor.fetchall():
+        indexes.setdefault(index_name, []).append(column)
+    return indexes
+
+def propose_index(query, covering=True):
+    """Derive index columns: equality columns, then one range/order column, then covered columns"""
+    columns = list(query['equality'])
+    for column in query['order'] + query['range']:
+        if column not in columns:
+            columns.append(column)
+            # Columns after the first range/order column cannot be used for seeking
+            break
+    if covering:
+        for column in query['select']:
+            if column not in columns:
+                columns.append(column)
+    return columns
+
+def is_served(columns, indexes):
+    """True if an existing index already starts with the proposed seek columns"""
+    return any(existing[:len(columns)] == columns for existing in indexes.values())
+
+def index_name(table, columns):
+    """Name for an advisor-created index"""
+    return f'idx_{table}_' + '_'.join(column[:12] for column in columns)
+
+def explain_analyze(cursor, sql, params, table):
+    """Run EXPLAIN ANALYZE (MySQL 8.0.18+), or plain EXPLAIN on older servers.
+
+    Returns (plan text, problems) where problems lists 'full scan' and/or
+    'filesort' if the plan reads all of table or sorts its rows.
+    """
+    import mysql.connector
+    problems = []
+    try:
+        cursor.execute('EXPLAIN ANALYZE ' + sql, params)
+        plan = '\n'.join(row[0] for row in cursor.fetchall())
+        if re.search(rf'-> (Table|Index) scan on `?{table}`?\b', plan):
+            problems.append('full scan')
+        if re.search(r'-> Sort\b', plan):
+            problems.append('filesort')
+        return plan, problems
+    except mysql.connector.Error:
+        cursor.execute('EXPLAIN ' + sql, params)
+        columns = [column[0] for column in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        for row in rows:
+            if row.get('table') != table:
+                continue
+            if row.get('type') in ('ALL', 'index') and 'full scan' not in problems:
+                problems.append('full scan')
+            if 'Using filesort' in str(row.get('Extra') or '') and 'filesort' not in problems:
+                problems.append('filesort')
+        return '\n'.join(str(row) for row in rows), problems
+
+def drop_prefix_proposals(proposals, indexes_by_table):
+    """Drop proposals that are a left prefix of an existing index or of another proposal.
+
+    proposals maps (table, columns) -> query names; the names of a dropped
+    proposal move to the longer index that covers it.
+    """
+    kept = dict(proposals)
+    for (table, columns), queries in sorted(proposals.items(), key=lambda item: len(item[0][1])):
+        if any(list(existing[:len(columns)]) == list(columns) for existing in indexes_by_table[table].values()):
+            del kept[(table, columns)]
+            continue
+        longer = [key for key in kept if key[0] == table and len(key[1]) > len(columns)
+                  and key[1][:len(columns)] == columns]
+        if longer:
+            kept[longer[0]] = kept[longer[0]] + [name for name in kept[(table, columns)]
+                                                 if name not in kept[longer[0]]]
+            del kept[(table, columns)]
+    return kept
+
+def benchmark(cursor, sql, params, runs=BENCHMARK_RUNS):
+    """Median wall-clock latency of a query in milliseconds"""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+def advise(mysql_conn, apply=False, covering=True, verbose=False):
+    """Benchmark the hot queries, propose indexes, optionally apply them and re-benchmark"""
+    cursor = mysql_conn.cursor()
+    results = []
+    proposals = {}
+    indexes_by_table = {}
+
+    print('[INFO] Benchmarking hot queries...')
+    print('=' * 50)
+    for query in HOT_QUERIES:
+        params = query['params'](cursor)
+        before = benchmark(cursor, query['sql'], params)
+        plan, problems = explain_analyze(cursor, query['sql'], params, query.get('alias', query['table']))
+
+        columns = propose_index(query, covering)
+        seek_columns = propose_index(query, covering=False)
+        if query['table'] not in indexes_by_table:
+            indexes_by_table[query['table']] = existing_indexes(cursor, query['table'])
+        served = is_served(seek_columns, indexes_by_table[query['table']])
+
+        print(f'\n[QUERY] {query["name"]} ({query["source"]}): {before:.2f} ms'
+              + (f' [{", ".join(problems)}]' if problems else ''))
+        if verbose:
+            for line in plan.splitlines():
+                print(f'    {line}')
+
+        if served:
+            print('  [OK] Already served by an existing index')
+        elif not problems:
+            # The optimizer already seeks and reads in order without a new index
+            print('  [OK] Plan has no full scan or filesort on this table')
+        else:
+            ddl_key = (query['table'], tuple(columns))
+            proposals.setdefault(ddl_key, []).append(query['name'])
+            print(f'  [PROPOSED] {query["table"]}({", ".join(columns)})')
+
+        results.append({'query': query, 'params': params, 'before': before})
+
+    proposals = drop_prefix_proposals(proposals, indexes_by_table)
+    if not proposals:
+        print('\n[SUCCESS] No missing indexes for the registered queries')
+        cursor.close()
+        return results
+
+    print('\n[INFO] Proposed indexes:')
+    statements = []
+    for (table, columns), queries in proposals.items():
+        statement = (f'ALTER TABLE `{table}` ADD INDEX `{index_name(table, columns)}` '
+                     f'({", ".join(f"`{c}`" for c in columns)}), ALGORITHM=INPLACE, LOCK=NONE')
+        statements.append(statement)
+        print(f'  {statement};  -- {", ".join(queries)}')
+
+    if not apply:
+        print('\n[INFO] Re-run with --apply to create them')
+        cursor.close()
+        return results
+
+    print('\n[INFO] Applying indexes...')
+    import mysql.connector
+    for statement in statements:
+        try:
+            cursor.execute(statement)
+            print(f'  [OK] {statement}')
+        except mysql.connector.Error as e:
+            print(f'  [WARNING] {e}')
+
+    print('\n[INFO] Re-benchmarking...')
+    print('=' * 50)
+    for result in results:
+        query = result['query']
+        after = benchmark(cursor, query['sql'], result['params'])
+        result['after'] = after
+        change = ((after - result['before']) / result['before'] * 100) if result['before'] else 0
+        print(f'  {query["name"]:<24} {result["before"]:>9.2f} ms -> {after:>9.2f} ms ({change:+.1f}%)')
+
+    cursor.close()
+    return results
+
+def main(argv=None):
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Index advisor for the hot query catalog')
+    parser.add_argument('--apply', action='store_true', help='create the proposed indexes and re-benchmark')
+    parser.add_argument('--no-covering', action='store_true',
+                        help='propose seek-only composite indexes (no covered columns)')
+    parser.add_argument('--verbose', action='store_true', help='print EXPLAIN ANALYZE plans')
+    args = parser.parse_args(argv)
+
+    mysql_conn = connect_mysql()
+    advise(mysql_conn, args.apply, not args.no_covering, args.verbose)
+    mysql_conn.close()
+
+if __name__ == '__main__':
+    main()
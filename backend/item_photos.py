@@ -0,0 +1,239 @@
+import os
+import sys
+import time
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import coreq_db
+from stage_profiler import stage
+
+# Photos are stored once per content hash: uploads/items/<2 hex>/<sha256><ext>
+PHOTO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads', 'items')
+
+# collaterals.photoPath is relative to the backend directory
+PHOTO_PATH_PREFIX = 'uploads/items'
+
+# Access [ITEMS] columns
+ITEM_ID_COLUMN = 'ITEMID'
+PHOTO_COLUMN = 'ITEM PHOTO'
+
+# Photos fetched from Access per query (bounds the blobs held in memory)
+PHOTO_CHUNK_SIZE = 50
+
+# Threads hashing and writing photos
+PHOTO_WORKERS = 4
+
+# Access stores pictures as OLE objects: a wrapper header followed by the image.
+# The image starts at the first known signature within this many bytes.
+OLE_HEADER_SCAN = 64 * 1024
+
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'GIF87a', '.gif'),
+    (b'GIF89a', '.gif'),
+    (b'II*\x00', '.tif'),
+    (b'MM\x00*', '.tif')
+)
+
+def create_photo_columns(mysql_conn):
+    """Add collaterals.photoPath/photoHash if the schema predates them"""
+    cursor = mysql_conn.cursor()
+    cursor.execute('''
+        SELECT COLUMN_NAME FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'collaterals'
+    ''')
+    existing = {row[0] for row in cursor.fetchall()}
+    additions = [definition for column, definition in (
+        ('photoPath', 'ADD COLUMN photoPath VARCHAR(255)'),
+        ('photoHash', 'ADD COLUMN photoHash CHAR(64)')
+    ) if column not in existing]
+    if additions:
+        cursor.execute(f'ALTER TABLE collaterals {", ".join(additions)}')
+        mysql_conn.commit()
+        print(f'[OK] Added photo columns to collaterals ({len(additions)})')
+    cursor.close()
+
+def unwrap_image(blob):
+    """(image bytes, extension) with any OLE wrapper stripped; unknown formats are kept as .bin"""
+    data = memoryview(blob)
+    head = bytes(data[:OLE_HEADER_SCAN])
+
+    found = [(head.find(signature), extension) for signature, extension in IMAGE_SIGNATURES]
+    found = [(offset, extension) for offset, extension in found if offset >= 0]
+    if found:
+        offset, extension = min(found)
+        return data[offset:], extension
+
+    # Bitmaps ("Paintbrush Picture"): 'BM' is too short to search for on its own,
+    # so also require the file size stored after it to fit the blob
+    offset = head.find(b'BM')
+    while offset >= 0:
+        size = int.from_bytes(head[offset + 2:offset + 6], 'little')
+        if 26 < size <= len(data) - offset:
+            return data[offset:offset + size], '.bmp'
+        offset = head.find(b'BM', offset + 1)
+
+    return data, '.bin'
+
+@stage('photos', phase='write')
+def store_photo(item_id, blob, photo_dir=PHOTO_DIR):
+    """Write one photo under its content hash; returns (item id, hash, path, size, extension, written)"""
+    data, extension = unwrap_image(blob)
+    digest = hashlib.sha256(data).hexdigest()
+    relative = f'{digest[:2]}/{digest}{extension}'
+    path = os.path.join(photo_dir, digest[:2], f'{digest}{extension}')
+
+    written = False
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so a crash never leaves a truncated file under a valid hash
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        written = True
+
+    return item_id, digest, f'{PHOTO_PATH_PREFIX}/{relative}', len(data), extension, written
+
+def pending_item_ids(access_conn, mysql_conn, refresh=False):
+    """Item ids with a photo in Access whose collateral exists (and has no photo yet, unless refresh)"""
+    cursor = mysql_conn.cursor()
+    cursor.execute('SELECT id FROM collaterals' + ('' if refresh else ' WHERE photoHash IS NULL'))
+    wanted = {row[0] for row in cursor.fetchall()}
+    cursor.close()
+
+    access_cursor = access_conn.cursor()
+    access_cursor.execute(f'SELECT [{ITEM_ID_COLUMN}] FROM [ITEMS] WHERE [{PHOTO_COLUMN}] IS NOT NULL')
+    item_ids = sorted(row[0] for row in access_cursor.fetchall() if row[0] in wanted)
+    access_cursor.close()
+    return item_ids
+
+def fetch_photo_chunks(access_conn, item_ids, chunk_size=PHOTO_CHUNK_SIZE):
+    """Yield [(item id, blob)] for item_ids, chunk_size photos per query"""
+    cursor = access_conn.cursor()
+    for start in range(0, len(item_ids), chunk_size):
+        chunk = item_ids[start:start + chunk_size]
+        with stage('fetch'):
+            cursor.execute(
+                f'SELECT [{ITEM_ID_COLUMN}], [{PHOTO_COLUMN}] FROM [ITEMS] '
+                f'WHERE [{ITEM_ID_COLUMN}] IN ({", ".join(["?"] * len(chunk))})',
+                chunk
+            )
+            rows = [(item_id, blob) for item_id, blob in cursor.fetchall() if blob]
+        yield rows
+    cursor.close()
+
+def write_photo_refs(mysql_conn, results):
+    """Record path and hash for a chunk of photos with one CASE-based UPDATE"""
+    cases = ' '.join(['WHEN %s THEN %s'] * len(results))
+    params = []
+    for index in (2, 1):
+        for result in results:
+            params.extend((result[0], result[index]))
+    params.extend(result[0] for result in results)
+
+    cursor = mysql_conn.cursor()
+    cursor.execute(
+        f'UPDATE collaterals SET photoPath = CASE id {cases} END, photoHash = CASE id {cases} END '
+        f'WHERE id IN ({", ".join(["%s"] * len(results))})',
+        params
+    )
+    mysql_conn.commit()
+    cursor.close()
+
+@stage('photos', phase='convert')
+def extract_photos(access_conn, mysql_conn, photo_dir=PHOTO_DIR, workers=PHOTO_WORKERS,
+                   chunk_size=PHOTO_CHUNK_SIZE, refresh=False):
+    """Extract ITEM PHOTO blobs to content-addressed files and record them on collaterals.
+
+    The next chunk is read from Access while the worker threads hash and
+    write the previous one. Returns counts for the run.
+    """
+    create_photo_columns(mysql_conn)
+    item_ids = pending_item_ids(access_conn, mysql_conn, refresh)
+    counts = {'photos': 0, 'written': 0, 'duplicates': 0, 'unknownFormat': 0, 'failed': 0, 'bytes': 0}
+
+    print(f'[MIGRATING] Item photos: {len(item_ids)} to extract with {workers} threads...')
+    started = time.perf_counter()
+
+    def collect(futures):
+        results = []
+        for item_id, future in futures:
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f'  [WARNING] Could not store photo of item {item_id}: {str(e)[:100]}')
+                counts['failed'] += 1
+                continue
+            results.append(result)
+            counts['photos'] += 1
+            counts['bytes'] += result[3]
+            counts['written' if result[5] else 'duplicates'] += 1
+            if result[4] == '.bin':
+                counts['unknownFormat'] += 1
+        if results:
+            write_photo_refs(mysql_conn, results)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        for chunk in fetch_photo_chunks(access_conn, item_ids, chunk_size):
+            submitted = [(item_id, pool.submit(store_photo, item_id, blob, photo_dir)) for item_id, blob in chunk]
+            collect(pending)
+            pending = submitted
+        collect(pending)
+
+    elapsed = time.perf_counter() - started
+    counts['seconds'] = round(elapsed, 3)
+    print(f'  [SUCCESS] {counts["photos"]} photos ({counts["bytes"] / 1048576:.1f} MB): '
+          f'{counts["written"]} new files, {counts["duplicates"]} already stored'
+          + (f', {counts["unknownFormat"]} unknown format' if counts['unknownFormat'] else '')
+          + (f', {counts["failed"]} failed' if counts['failed'] else '')
+          + f' in {elapsed:.2f}s\n')
+    return counts
+
+def prune_photos(mysql_conn, photo_dir=PHOTO_DIR):
+    """Delete stored photos no collateral refers to; returns the number removed"""
+    cursor = mysql_conn.cursor()
+    cursor.execute('SELECT DISTINCT photoHash FROM collaterals WHERE photoHash IS NOT NULL')
+    referenced = {row[0] for row in cursor.fetchall()}
+    cursor.close()
+
+    removed = 0
+    for directory, _, files in os.walk(photo_dir):
+        for name in files:
+            if name.split('.', 1)[0] not in referenced:
+                os.remove(os.path.join(directory, name))
+                removed += 1
+    return removed
+
+def main(argv=None):
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Extract Access item photos to content-addressed files')
+    parser.add_argument('--workers', type=int, default=PHOTO_WORKERS, help='threads hashing and writing photos')
+    parser.add_argument('--chunk-size', type=int, default=PHOTO_CHUNK_SIZE, help='photos per Access query')
+    parser.add_argument('--refresh', action='store_true',
+                        help='re-extract photos of collaterals that already have one')
+    parser.add_argument('--prune', action='store_true', help='then delete files no collateral refers to')
+    parser.add_argument('--out', default=PHOTO_DIR, help='photo directory')
+    parser.add_argument('--source', default=None,
+                        help='Access file, or a SQLite stand-in (.db/.sqlite) with the same tables')
+    args = parser.parse_args(argv)
+
+    try:
+        access_conn = coreq_db.open_source(args.source)
+        mysql_conn = coreq_db.connect_mysql()
+    except Exception as e:
+        print(f'[ERROR] Connection failed: {e}')
+        sys.exit(1)
+
+    extract_photos(access_conn, mysql_conn, args.out, args.workers, args.chunk_size, args.refresh)
+    if args.prune:
+        print(f'[OK] Pruned {prune_photos(mysql_conn, args.out)} unreferenced photos')
+
+    access_conn.close()
+    mysql_conn.close()
+
+if __name__ == '__main__':
+    main()
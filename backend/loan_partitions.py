@@ -0,0 +1,111 @@
+import os
+import sys
+from datetime import date
+from coreq_db import connect_mysql
+
+# Partitioned tables and the DATETIME column they are ranged on
+PARTITIONED_TABLES = {
+    'loans': 'dateIssued',
+    'payments': 'paymentDate'
+}
+
+# First monthly partition; anything older lands in p_old
+PARTITION_START = date(int(os.getenv('PARTITION_START_YEAR', '2020')), 1, 1)
+
+# Monthly partitions kept ready beyond the current month
+PARTITION_MONTHS_AHEAD = 3
+
+def add_months(day, months):
+    """First day of the month `months` after day's month"""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month_start):
+    """Partition name for the month starting at month_start (pYYYYMM)"""
+    return f'p{month_start.year}{month_start.month:02d}'
+
+def monthly_partitions(start, end):
+    """Partition definitions for every month in [start, end)"""
+    definitions = []
+    month = date(start.year, start.month, 1)
+    while month < end:
+        upper = add_months(month, 1)
+        definitions.append(f"PARTITION {partition_name(month)} VALUES LESS THAN ('{upper.isoformat()}')")
+        month = upper
+    return definitions
+
+def partition_clause(column, today=None):
+    """PARTITION BY RANGE COLUMNS clause covering history up to a few months ahead"""
+    today = today or date.today()
+    end = add_months(today, PARTITION_MONTHS_AHEAD + 1)
+    definitions = (
+        [f"PARTITION p_old VALUES LESS THAN ('{PARTITION_START.isoformat()}')"]
+        + monthly_partitions(PARTITION_START, end)
+        + ['PARTITION p_future VALUES LESS THAN (MAXVALUE)']
+    )
+    return f'PARTITION BY RANGE COLUMNS({column}) (\n            ' + ',\n            '.join(definitions) + '\n        )'
+
+def last_monthly_boundary(cursor, table):
+    """Upper bound of the newest monthly partition, or None if the table is not partitioned"""
+    cursor.execute('''
+        SELECT PARTITION_NAME, PARTITION_DESCRIPTION
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    ''', (table,))
+    boundaries = [
+        description.strip("'")
+        for name, description in cursor.fetchall()
+        if name not in ('p_old', 'p_future')
+    ]
+    if not boundaries:
+        return None
+    return date.fromisoformat(boundaries[-1][:10])
+
+def ensure_future_partitions(mysql_conn, months_ahead=PARTITION_MONTHS_AHEAD, today=None):
+    """Split p_future so every partitioned table has monthly partitions months_ahead out"""
+    today = today or date.today()
+    target = add_months(today, months_ahead + 1)
+    cursor = mysql_conn.cursor()
+    added = {}
+
+    for table in PARTITIONED_TABLES:
+        boundary = last_monthly_boundary(cursor, table)
+        if boundary is None:
+            print(f'  [INFO] {table} is not partitioned, skipping')
+            continue
+        if boundary >= target:
+            print(f'  [OK] {table}: partitioned through {boundary}')
+            continue
+
+        definitions = monthly_partitions(boundary, target)
+        cursor.execute(
+            f'ALTER TABLE `{table}` REORGANIZE PARTITION p_future INTO ('
+            + ', '.join(definitions)
+            + ', PARTITION p_future VALUES LESS THAN (MAXVALUE))'
+        )
+        added[table] = len(definitions)
+        print(f'  [OK] {table}: added {len(definitions)} partitions through {target}')
+
+    cursor.close()
+    return added
+
+def main(argv=None):
+    """Main function"""
+    argv = sys.argv[1:] if argv is None else argv
+    months = PARTITION_MONTHS_AHEAD
+    if len(argv) > 1 and argv[0] == '--months':
+        months = int(argv[1])
+    elif argv:
+        print('[ERROR] Unknown option. Use:')
+        print(f'  --months N  : Keep N monthly partitions ahead (default {PARTITION_MONTHS_AHEAD})')
+        sys.exit(1)
+
+    mysql_conn = connect_mysql()
+    print('[INFO] Adding future partitions...')
+    ensure_future_partitions(mysql_conn, months)
+    mysql_conn.close()
+    print('[SUCCESS] Partition maintenance completed')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+import json
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+# Interest tier (percent) per loan period in weeks, as stored in settings.interestRates
+DEFAULT_INTEREST_RATES = {'1': 20, '2': 28, '3': 32, '4': 35}
+
+# Days between the due date and default
+DEFAULT_GRACE_PERIOD_DAYS = 7
+
+CENT = Decimal('0.01')
+
+class LoanPricing:
+    """Interest tiers and grace period resolved once into a lookup table"""
+
+    def __init__(self, interest_rates=None, grace_period=DEFAULT_GRACE_PERIOD_DAYS):
+        tiers = {int(weeks): Decimal(str(rate)) for weeks, rate in (interest_rates or DEFAULT_INTEREST_RATES).items()}
+        self.interest_rates = {str(weeks): float(rate) for weeks, rate in sorted(tiers.items())}
+        self.max_period = max(tiers)
+
+        # rates[weeks] for every period up to the longest tier; a missing
+        # period uses the tier below it, shorter periods use the first tier
+        rates = []
+        current = tiers[min(tiers)]
+        for weeks in range(self.max_period + 1):
+            current = tiers.get(weeks, current)
+            rates.append(current)
+        self.rates = tuple(rates)
+
+        self.grace_period_days = int(grace_period)
+        self.grace_period = timedelta(days=self.grace_period_days)
+
+    def rate(self, loan_period):
+        """Interest rate for a loan period; longer periods use the longest tier"""
+        return self.rates[min(max(int(loan_period or 0), 0), self.max_period)]
+
+    def total(self, amount_issued, rate):
+        """Principal plus interest, rounded to cents like the DECIMAL(10,2) column"""
+        amount = Decimal(str(amount_issued or 0))
+        return (amount + amount * rate / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+
+    def grace_period_end(self, due_date):
+        return due_date + self.grace_period if due_date else None
+
+def load_pricing(mysql_conn):
+    """Read the settings row once; defaults if the table is missing or empty"""
+    cursor = mysql_conn.cursor()
+    try:
+        cursor.execute('SELECT interestRates, gracePeriod FROM settings ORDER BY id DESC LIMIT 1')
+        row = cursor.fetchone()
+    except Exception:
+        row = None
+    cursor.close()
+
+    if not row:
+        return LoanPricing()
+
+    interest_rates, grace_period = row
+    if isinstance(interest_rates, (bytes, bytearray)):
+        interest_rates = interest_rates.decode('utf-8')
+    if isinstance(interest_rates, str):
+        interest_rates = json.loads(interest_rates)
+    return LoanPricing(interest_rates or None,
+                       DEFAULT_GRACE_PERIOD_DAYS if grace_period is None else grace_period)
@@ -0,0 +1,285 @@
+import io
+import os
+import csv
+import sys
+import json
+import time
+import shutil
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+from coreq_db import connect_snapshot
+from stage_profiler import stage
+
+# Borrowers per keyset page (three queries per page: borrowers, their loans, their payments)
+PAGE_SIZE = 500
+
+# Processes rendering and writing statement files
+STATEMENT_WORKERS = os.cpu_count() or 1
+
+# Statements are written under exports/ (git-ignored), one directory per statement date
+STATEMENT_DIR = os.path.join('exports', 'statements')
+
+FORMATS = ('txt', 'csv')
+
+SUMMARY_NAME = '_summary.json'
+
+BORROWER_PAGE_SQL = '''
+    SELECT id, fullName, idNumber, phoneNumber, location FROM borrowers
+    WHERE id > %s
+    ORDER BY id
+    LIMIT %s
+'''
+
+LOAN_SQL = '''
+    SELECT id, borrowerId, amountIssued, dateIssued, dueDate, status, totalAmount,
+           COALESCE(penalties, 0), lastPenaltyDate
+    FROM loans
+    WHERE borrowerId > %s AND borrowerId <= %s AND dateIssued <= %s
+    ORDER BY id
+'''
+
+PAYMENT_SQL = '''
+    SELECT p.loanId, p.paymentDate, p.amount, p.note
+    FROM payments p
+    JOIN loans l ON l.id = p.loanId
+    WHERE l.borrowerId > %s AND l.borrowerId <= %s AND l.dateIssued <= %s AND p.paymentDate <= %s
+    ORDER BY p.loanId, p.paymentDate, p.id
+'''
+
+# The loans table keeps only the current status and one accrued penalty total,
+# so statements for a past date replay issues and payments but not those
+PAST_STATEMENT_NOTE = ('Note: loan status is the current status. Penalties are shown only if '
+                       'they were last accrued by the statement date.')
+
+# Same-day entries: charges before payments
+PRINCIPAL, INTEREST, PENALTIES, PAYMENT = range(4)
+
+def loan_statement(loan, payments, until):
+    """Chronological entries with the running balance for one loan and its payments"""
+    (loan_id, _, amount_issued, date_issued, due_date, status, total_amount,
+     penalties, penalty_date) = loan
+    principal = Decimal(amount_issued or 0)
+    interest = Decimal(total_amount or 0) - principal
+    penalties = Decimal(penalties)
+
+    entries = [(date_issued, PRINCIPAL, 'Principal issued', principal),
+               (date_issued, INTEREST, 'Interest', interest)]
+    # Penalties are kept as one accrued total, dated by the last accrual
+    charged = penalty_date or due_date
+    if penalties and charged <= until:
+        entries.append((charged, PENALTIES, 'Penalties', penalties))
+    else:
+        penalties = Decimal('0')
+    entries.extend((paid_at, PAYMENT, f'Payment ({note})' if note else 'Payment', -Decimal(amount))
+                   for _, paid_at, amount, note in payments)
+    entries.sort(key=lambda entry: (entry[0], entry[1]))
+
+    balance = Decimal('0')
+    lines = []
+    for when, _, description, amount in entries:
+        balance += amount
+        lines.append((when, description, amount, balance))
+
+    return {
+        'loanId': loan_id,
+        'status': status,
+        'dateIssued': date_issued,
+        'dueDate': due_date,
+        'principal': principal,
+        'interest': interest,
+        'penalties': penalties,
+        'paid': sum((Decimal(payment[2]) for payment in payments), Decimal('0')),
+        'balance': balance,
+        'lines': lines
+    }
+
+def merge_statements(borrowers, loans, payments, until):
+    """Merge a page's loans (by id) and payments (by loanId, paymentDate) into per-borrower statements.
+
+    One pass over both sorted lists, so a page costs the same three queries
+    however many loans its borrowers have. Borrowers without loans are left out.
+    """
+    statements = {borrower[0]: (borrower, []) for borrower in borrowers}
+    position = 0
+    for loan in loans:
+        loan_id = loan[0]
+        while position < len(payments) and payments[position][0] < loan_id:
+            position += 1
+        start = position
+        while position < len(payments) and payments[position][0] == loan_id:
+            position += 1
+        if loan[1] in statements:
+            statements[loan[1]][1].append(loan_statement(loan, payments[start:position], until))
+    return [statement for statement in statements.values() if statement[1]]
+
+def money(value):
+    return f'{value:,.2f}'
+
+def render_text(borrower, loans, as_of):
+    borrower_id, name, id_number, phone, location = borrower
+    out = io.StringIO()
+    out.write('COREQ CAPITAL - LOAN STATEMENT\n')
+    out.write(f'Statement date: {as_of.isoformat()}\n')
+    if as_of < date.today():
+        out.write(f'{PAST_STATEMENT_NOTE}\n')
+    out.write('\n')
+    out.write(f'Borrower: {name} (ID {id_number})\n')
+    out.write(f'Phone:    {phone or "-"}\n')
+    out.write(f'Location: {location or "-"}\n')
+
+    for loan in loans:
+        out.write(f'\nLoan #{loan["loanId"]}  issued {loan["dateIssued"]:%Y-%m-%d}  '
+                  f'due {loan["dueDate"]:%Y-%m-%d}  status {loan["status"]}\n')
+        out.write(f'  {"Date":<12} {"Description":<36} {"Amount":>14} {"Balance":>14}\n')
+        for when, description, amount, balance in loan['lines']:
+            out.write(f'  {when:%Y-%m-%d}   {description[:36]:<36} {money(amount):>14} {money(balance):>14}\n')
+        out.write(f'  Principal {money(loan["principal"])}  Interest {money(loan["interest"])}  '
+                  f'Penalties {money(loan["penalties"])}  Paid {money(loan["paid"])}  '
+                  f'Balance {money(loan["balance"])}\n')
+
+    total = sum((loan['balance'] for loan in loans), Decimal('0'))
+    out.write(f'\nTotal balance: {money(total)}\n')
+    return out.getvalue()
+
+def render_csv(borrower, loans, as_of):
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator='\n')
+    writer.writerow(['borrowerId', 'loanId', 'date', 'description', 'amount', 'balance'])
+    for loan in loans:
+        for when, description, amount, balance in loan['lines']:
+            writer.writerow([borrower[0], loan['loanId'], when.strftime('%Y-%m-%d'), description, amount, balance])
+    return out.getvalue()
+
+RENDERERS = {'txt': render_text, 'csv': render_csv}
+
+def write_statements(statements, out_dir, fmt, as_of):
+    """Render and write one page of statements; returns (files, bytes). Runs in a worker process."""
+    render = RENDERERS[fmt]
+    written = 0
+    for borrower, loans in statements:
+        data = render(borrower, loans, as_of).encode('utf-8')
+        path = os.path.join(out_dir, f'{borrower[0]}.{fmt}')
+        with open(path, 'wb') as f:
+            f.write(data)
+        written += len(data)
+    return len(statements), written
+
+@stage('statements', phase='convert')
+def generate_statements(mysql_conn, out_dir, as_of, fmt='txt', workers=STATEMENT_WORKERS, page_size=PAGE_SIZE):
+    """Write a statement per borrower with loans issued by as_of; returns the run summary.
+
+    For a past as_of, loans, payments and balances are as of that day, but
+    status is the current one and penalties are all-or-nothing (see
+    PAST_STATEMENT_NOTE).
+
+    Pages are fetched and merged here while worker processes render and
+    write the previous pages. The files go to <out_dir>.partial first and
+    replace out_dir when every page is written.
+    """
+    until = datetime.combine(as_of, datetime.max.time())
+    partial = f'{out_dir.rstrip(os.sep)}.partial'
+    shutil.rmtree(partial, ignore_errors=True)
+    os.makedirs(partial)
+
+    summary = {
+        'asOf': as_of.isoformat(),
+        'generatedAt': datetime.now().isoformat(timespec='seconds'),
+        'note': PAST_STATEMENT_NOTE if as_of < date.today() else None,
+        'format': fmt,
+        'borrowers': 0,
+        'loans': 0,
+        'payments': 0,
+        'outstanding': Decimal('0.00'),
+        'bytes': 0
+    }
+
+    def collect(future):
+        with stage('write'):
+            _, written = future.result()
+        summary['bytes'] += written
+
+    print(f'[INFO] Writing {fmt} statements as of {as_of} with {workers} processes...')
+    started = time.perf_counter()
+    cursor = mysql_conn.cursor()
+    last_id = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        while True:
+            with stage('fetch'):
+                cursor.execute(BORROWER_PAGE_SQL, (last_id, page_size))
+                borrowers = cursor.fetchall()
+                if not borrowers:
+                    break
+                bounds = (last_id, borrowers[-1][0])
+                cursor.execute(LOAN_SQL, (*bounds, until))
+                loans = cursor.fetchall()
+                cursor.execute(PAYMENT_SQL, (*bounds, until, until))
+                payments = cursor.fetchall()
+            last_id = borrowers[-1][0]
+
+            statements = merge_statements(borrowers, loans, payments, until)
+            summary['borrowers'] += len(statements)
+            summary['loans'] += len(loans)
+            summary['payments'] += len(payments)
+            summary['outstanding'] += sum((max(loan['balance'], Decimal('0'))
+                                           for _, borrower_loans in statements for loan in borrower_loans),
+                                          Decimal('0'))
+
+            if statements:
+                pending.append(pool.submit(write_statements, statements, partial, fmt, as_of))
+            # Bound the pages held in memory while the workers catch up
+            while len(pending) > workers * 2:
+                collect(pending.popleft())
+            print(f'  [PAGE] through borrower {last_id}: {len(statements)} statements, '
+                  f'{len(loans)} loans, {len(payments)} payments')
+
+        while pending:
+            collect(pending.popleft())
+    cursor.close()
+
+    summary['seconds'] = round(time.perf_counter() - started, 3)
+    with open(os.path.join(partial, SUMMARY_NAME), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2, default=str)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(partial, out_dir)
+    return summary
+
+def main(argv=None):
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Write loan statements with running balances for every borrower')
+    parser.add_argument('--as-of', default=date.today().isoformat(),
+                        help='statement date: loans issued and payments made up to this day (YYYY-MM-DD). '
+                             'For past dates, loan status is the current one, and penalties are shown '
+                             'only if last accrued by that day')
+    parser.add_argument('--format', choices=FORMATS, default='txt', help='statement file format')
+    parser.add_argument('--workers', type=int, default=STATEMENT_WORKERS,
+                        help='processes rendering and writing statements')
+    parser.add_argument('--page-size', type=int, default=PAGE_SIZE, help='borrowers per keyset page')
+    parser.add_argument('--out', default=None, help=f'output directory (default: {STATEMENT_DIR}/<as-of>)')
+    parser.add_argument('--primary', action='store_true',
+                        help='read from the primary even if DB_REPLICA_URL is set')
+    args = parser.parse_args(argv)
+
+    try:
+        as_of = datetime.strptime(args.as_of, '%Y-%m-%d').date()
+    except ValueError:
+        print(f'[ERROR] --as-of must be a date (YYYY-MM-DD), got {args.as_of}')
+        sys.exit(1)
+    if as_of < date.today():
+        print(f'[WARNING] Past statement date: {PAST_STATEMENT_NOTE}')
+    out_dir = args.out or os.path.join(STATEMENT_DIR, as_of.isoformat())
+
+    # Every statement is drawn from the same point in time
+    mysql_conn = connect_snapshot(use_replica=not args.primary)
+    summary = generate_statements(mysql_conn, out_dir, as_of, args.format, max(args.workers, 1), args.page_size)
+    mysql_conn.close()
+
+    print(f'[SUCCESS] {summary["borrowers"]} statements ({summary["loans"]} loans, '
+          f'{summary["payments"]} payments, {money(summary["outstanding"])} outstanding) '
+          f'written to {out_dir} in {summary["seconds"]:.2f}s')
+
+if __name__ == '__main__':
+    main()
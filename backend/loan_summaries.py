@@ -0,0 +1,211 @@
+import sys
+from coreq_db import connect_mysql, connect_snapshot
+
+# Borrower location is the branch dimension in the migrated schema
+UNKNOWN_LOCATION = ''
+
+def create_summary_tables(mysql_conn):
+    """Create the summary tables if they do not exist"""
+    cursor = mysql_conn.cursor()
+
+    # Loan count and outstanding balance per status per location
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS loan_status_summary (
+            status VARCHAR(20) NOT NULL,
+            location VARCHAR(255) NOT NULL DEFAULT '',
+            loanCount INT NOT NULL DEFAULT 0,
+            outstanding DECIMAL(14,2) NOT NULL DEFAULT 0,
+            updatedAt DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (status, location)
+        )
+    ''')
+
+    # Disbursements and collections per calendar day
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS daily_loan_summary (
+            day DATE NOT NULL PRIMARY KEY,
+            disbursedCount INT NOT NULL DEFAULT 0,
+            disbursedAmount DECIMAL(14,2) NOT NULL DEFAULT 0,
+            collectedCount INT NOT NULL DEFAULT 0,
+            collectedAmount DECIMAL(14,2) NOT NULL DEFAULT 0,
+            updatedAt DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    ''')
+
+    mysql_conn.commit()
+    cursor.close()
+
+class SummaryDeltas:
+    """Accumulates summary-table deltas in memory and applies them in one batch"""
+
+    def __init__(self):
+        self.status = {}
+        self.daily = {}
+        # loanId -> (status, location, outstanding) for loans seen in this run
+        self.loans = {}
+        # borrowerId -> location, filled by the borrower migrator
+        self.locations = {}
+
+    def _status(self, status, location, count, amount):
+        key = (status, location or UNKNOWN_LOCATION)
+        entry = self.status.setdefault(key, [0, 0.0])
+        entry[0] += count
+        entry[1] += amount
+
+    def _daily(self, day, index, count, amount):
+        entry = self.daily.setdefault(day, [0, 0.0, 0, 0.0])
+        entry[index] += count
+        entry[index + 1] += amount
+
+    def loan_added(self, loan_id, status, location, outstanding, date_issued, amount_issued):
+        """A new loan row was written"""
+        outstanding = float(outstanding or 0)
+        self.loans[loan_id] = (status, location, outstanding)
+        self._status(status, location, 1, outstanding)
+        if date_issued:
+            self._daily(date_issued.date() if hasattr(date_issued, 'date') else date_issued,
+                        0, 1, float(amount_issued or 0))
+
+    def status_changed(self, loan_id, old_status, new_status, location, outstanding):
+        """An existing loan moved from one status to another"""
+        if old_status == new_status:
+            return
+        outstanding = float(outstanding or 0)
+        self._status(old_status, location, -1, -outstanding)
+        self._status(new_status, location, 1, outstanding)
+        self.loans[loan_id] = (new_status, location, outstanding)
+
+    def outstanding_changed(self, loan_id, status, location, old_outstanding, new_outstanding):
+        """An existing loan was re-priced"""
+        delta = float(new_outstanding or 0) - float(old_outstanding or 0)
+        if delta:
+            self._status(status, location, 0, delta)
+            self.loans[loan_id] = (status, location, float(new_outstanding or 0))
+
+    def payment_added(self, loan_id, amount, payment_date):
+        """A payment row was written against a loan seen in this run"""
+        amount = float(amount or 0)
+        if payment_date:
+            self._daily(payment_date.date() if hasattr(payment_date, 'date') else payment_date,
+                        2, 1, amount)
+        if loan_id in self.loans:
+            status, location, outstanding = self.loans[loan_id]
+            reduction = min(amount, outstanding)
+            self._status(status, location, 0, -reduction)
+            self.loans[loan_id] = (status, location, outstanding - reduction)
+
+    def apply(self, mysql_conn):
+        """Write accumulated deltas with batched upserts and reset"""
+        cursor = mysql_conn.cursor()
+
+        status_rows = [
+            (status, location, count, round(amount, 2))
+            for (status, location), (count, amount) in self.status.items()
+            if count or amount
+        ]
+        if status_rows:
+            cursor.executemany('''
+                INSERT INTO loan_status_summary (status, location, loanCount, outstanding)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    loanCount = loanCount + VALUES(loanCount),
+                    outstanding = outstanding + VALUES(outstanding)
+            ''', status_rows)
+
+        daily_rows = [
+            (day, d_count, round(d_amount, 2), c_count, round(c_amount, 2))
+            for day, (d_count, d_amount, c_count, c_amount) in self.daily.items()
+        ]
+        if daily_rows:
+            cursor.executemany('''
+                INSERT INTO daily_loan_summary
+                (day, disbursedCount, disbursedAmount, collectedCount, collectedAmount)
+                VALUES (%s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    disbursedCount = disbursedCount + VALUES(disbursedCount),
+                    disbursedAmount = disbursedAmount + VALUES(disbursedAmount),
+                    collectedCount = collectedCount + VALUES(collectedCount),
+                    collectedAmount = collectedAmount + VALUES(collectedAmount)
+            ''', daily_rows)
+
+        mysql_conn.commit()
+        cursor.close()
+
+        applied = len(status_rows) + len(daily_rows)
+        self.status = {}
+        self.daily = {}
+        return applied
+
+def rebuild_summaries(mysql_conn):
+    """Recompute both summary tables from loans and payments (repair path)"""
+    create_summary_tables(mysql_conn)
+    cursor = mysql_conn.cursor()
+
+    cursor.execute('DELETE FROM loan_status_summary')
+    cursor.execute('''
+        INSERT INTO loan_status_summary (status, location, loanCount, outstanding)
+        SELECT l.status, COALESCE(b.location, ''), COUNT(*),
+               SUM(GREATEST(l.totalAmount + COALESCE(l.penalties, 0) - COALESCE(p.paid, 0), 0))
+        FROM loans l
+        LEFT JOIN borrowers b ON b.id = l.borrowerId
+        LEFT JOIN (SELECT loanId, SUM(amount) AS paid FROM payments GROUP BY loanId) p
+            ON p.loanId = l.id
+        GROUP BY l.status, COALESCE(b.location, '')
+    ''')
+
+    cursor.execute('DELETE FROM daily_loan_summary')
+    cursor.execute('''
+        INSERT INTO daily_loan_summary
+        (day, disbursedCount, disbursedAmount, collectedCount, collectedAmount)
+        SELECT day, SUM(dc), SUM(da), SUM(cc), SUM(ca) FROM (
+            SELECT DATE(dateIssued) AS day, COUNT(*) AS dc, SUM(amountIssued) AS da, 0 AS cc, 0 AS ca
+            FROM loans GROUP BY DATE(dateIssued)
+            UNION ALL
+            SELECT DATE(paymentDate), 0, 0, COUNT(*), SUM(amount)
+            FROM payments GROUP BY DATE(paymentDate)
+        ) days
+        GROUP BY day
+    ''')
+
+    mysql_conn.commit()
+    cursor.close()
+
+def print_summaries(mysql_conn):
+    """Print the current contents of the summary tables"""
+    cursor = mysql_conn.cursor()
+
+    print('\nLoans by status and location:')
+    cursor.execute('SELECT status, location, loanCount, outstanding FROM loan_status_summary ORDER BY status, location')
+    for status, location, count, outstanding in cursor.fetchall():
+        print(f'  {status:<10} {location or "-":<20} {count:>6}  {float(outstanding):>14,.2f}')
+
+    print('\nLast 14 days (disbursed / collected):')
+    cursor.execute('SELECT day, disbursedAmount, collectedAmount FROM daily_loan_summary ORDER BY day DESC LIMIT 14')
+    for day, disbursed, collected in reversed(cursor.fetchall()):
+        print(f'  {day}: {float(disbursed):>12,.2f} {float(collected):>12,.2f}')
+
+    cursor.close()
+
+def main(argv=None):
+    """Main function"""
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] not in ('--rebuild', '--show'):
+        print('[ERROR] Unknown option. Use:')
+        print('  --rebuild  : Recompute summary tables from scratch')
+        print('  --show     : Print the summary tables (default)')
+        return
+
+    if argv and argv[0] == '--rebuild':
+        mysql_conn = connect_mysql()
+        print('[INFO] Rebuilding summary tables from loans and payments...')
+        rebuild_summaries(mysql_conn)
+        print('[SUCCESS] Summary tables rebuilt')
+        print_summaries(mysql_conn)
+    else:
+        mysql_conn = connect_snapshot()
+        print_summaries(mysql_conn)
+
+    mysql_conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -1,21 +1,12 @@
-import pyodbc
-import mysql.connector
-import os
-from dotenv import load_dotenv
 import sys
+import coreq_db
+from row_mappers import select_columns
+from stage_profiler import stage
 
-# Load environment variables
-load_dotenv()
+# Database configurations (drivers are only imported when connecting)
+MYSQL_CONFIG = coreq_db.mysql_config()
 
-# Database configurations
-MYSQL_CONFIG = {
-    'host': os.getenv('DB_HOST', 'localhost'),
-    'user': os.getenv('DB_USER', 'root'),
-    'password': os.getenv('DB_PASSWORD', ''),
-    'database': os.getenv('DB_NAME', 'coreq_loans')
-}
-
-ACCESS_DB_PATH = r'D:\coreq capital WORKING.accdb'
+ACCESS_DB_PATH = coreq_db.access_db_path()
 
 # Access to MySQL data type mapping
 TYPE_MAPPING = {
@@ -34,13 +25,14 @@ TYPE_MAPPING = {
     'VARCHAR': 'VARCHAR(255)',
     'LONGCHAR': 'TEXT',
     'MEMO': 'TEXT',
-    'LONGBINARY': 'BLOB',
     'BINARY': 'VARBINARY(255)',
     'GUID': 'CHAR(36)'
 }
 
 def connect_to_databases():
     """Connect to both Access and MySQL databases"""
+    import pyodbc
+    import mysql.connector
     try:
         # Find Access driver
         drivers = [driver for driver in pyodbc.drivers() if 'Access' in driver or 'access' in driver]
@@ -86,6 +78,11 @@ def get_access_tables(access_conn):
             tables.append(table_name)
     return tables
 
+def binary_columns(access_cursor, table):
+    """OLE object (LONGBINARY) columns of a table; photos are extracted to files by item_photos.py"""
+    return [column.column_name for column in access_cursor.columns(table=table)
+            if column.type_name.upper() == 'LONGBINARY']
+
 def map_access_type_to_mysql(access_type, column_size=None):
     """Map Access data type to MySQL data type"""
     access_type = access_type.upper()
@@ -126,6 +123,11 @@ def create_mysql_tables(access_conn, mysql_conn):
                 col_size = column.column_size
                 is_nullable = column.nullable
 
+                # Blobs would bloat every row scan; they are stored as files instead
+                if col_type.upper() == 'LONGBINARY':
+                    print(f'  [SKIPPED] {col_name} (binary, use item_photos.py)')
+                    continue
+
                 # Map to MySQL type
                 mysql_type = map_access_type_to_mysql(col_type, col_size)
 
@@ -174,44 +176,48 @@ def migrate_data(access_conn, mysql_conn):
 
     for table in tables:
         try:
-            print(f'\n[MIGRATING] Table: {table}')
-
-            # Get data from Access
-            access_cursor.execute(f'SELECT * FROM [{table}]')
-            rows = access_cursor.fetchall()
-
-            if not rows:
-                print(f'  [INFO] No data in {table}')
-                continue
-
-            # Get column names
-            columns = [column[0] for column in access_cursor.description]
-
-            # Prepare insert query
-            placeholders = ', '.join(['%s'] * len(columns))
-            column_names = ', '.join([f'`{col}`' for col in columns])
-            insert_query = f'INSERT INTO `{table}` ({column_names}) VALUES ({placeholders})'
-
-            # Insert data
-            migrated_count = 0
-            for row in rows:
-                try:
-                    # Convert row data - handle None values and special types
-                    clean_row = []
-                    for value in row:
-                        if value is None:
-                            clean_row.append(None)
-                        else:
-                            clean_row.append(value)
-
-                    mysql_cursor.execute(insert_query, tuple(clean_row))
-                    migrated_count += 1
-                except Exception as e:
-                    print(f'  [WARNING] Error inserting row: {str(e)[:100]}')
-
-            mysql_conn.commit()
-            total_migrated += migrated_count
-            print(f'  [SUCCESS] Migrated {migrated_count}/{len(rows)} rows')
+            with stage(table, phase='convert'):
+                print(f'\n[MIGRATING] Table: {table}')
+
+                # Get data from Access
+                with stage('fetch'):
+                    access_cursor.execute(select_columns(access_cursor, table, binary_columns(access_cursor, table)))
+                    rows = access_cursor.fetchall()
+
+                if not rows:
+                    print(f'  [INFO] No data in {table}')
+                    continue
+
+                # Get column names
+                columns = [column[0] for column in access_cursor.description]
+
+                # Prepare insert query
+                placeholders = ', '.join(['%s'] * len(columns))
+                column_names = ', '.join([f'`{col}`' for col in columns])
+                insert_query = f'INSERT INTO `{table}` ({column_names}) VALUES ({placeholders})'
+
+                # Insert data
+                migrated_count = 0
+                for row in rows:
+                    try:
+                        # Convert row data - handle None values and special types
+                        clean_row = []
+                        for value in row:
+                            if value is None:
+                                clean_row.append(None)
+                            else:
+                                clean_row.append(value)
+
+                        with stage('write'):
+                            mysql_cursor.execute(insert_query, tuple(clean_row))
+                        migrated_count += 1
+                    except Exception as e:
+                        print(f'  [WARNING] Error inserting row: {str(e)[:100]}')
+
+                with stage('commit'):
+                    mysql_conn.commit()
+                total_migrated += migrated_count
+                print(f'  [SUCCESS] Migrated {migrated_count}/{len(rows)} rows')
 
         except Exception as e:
             print(f'  [ERROR] Error migrating {table}: {e}')
@@ -262,8 +268,9 @@ def verify_migration(access_conn, mysql_conn):
     else:
         print('[WARNING] Some tables have mismatched row counts')
 
-def main():
+def main(argv=None):
     """Main function"""
+    argv = sys.argv[1:] if argv is None else argv
     print('\n' + '=' * 50)
     print('ACCESS TO MYSQL MIGRATION TOOL')
     print('=' * 50)
@@ -271,8 +278,8 @@ def main():
     # Connect to databases
     access_conn, mysql_conn = connect_to_databases()
 
-    if len(sys.argv) > 1:
-        mode = sys.argv[1]
+    if argv:
+        mode = argv[0]
 
         if mode == '--create-tables':
             # Create tables only
@@ -1,24 +1,15 @@
-import pyodbc
-import mysql.connector
-import os
-from dotenv import load_dotenv
 import sys
+import coreq_db
 
-# Load environment variables
-load_dotenv()
+# Database configurations (drivers are only imported when connecting)
+MYSQL_CONFIG = coreq_db.mysql_config()
 
-# Database configurations
-MYSQL_CONFIG = {
-    'host': os.getenv('DB_HOST', 'localhost'),
-    'user': os.getenv('DB_USER', 'root'),
-    'password': os.getenv('DB_PASSWORD', ''),
-    'database': os.getenv('DB_NAME', 'coreq_loans')
-}
-
-ACCESS_DB_PATH = r'D:\coreq capital WORKING.accdb'
+ACCESS_DB_PATH = coreq_db.access_db_path()
 
 def connect_to_databases():
     """Connect to both Access and MySQL databases"""
+    import pyodbc
+    import mysql.connector
     try:
         # List all available drivers for debugging
         print('Available ODBC drivers:')
@@ -1,49 +1,386 @@
-import pyodbc
-import mysql.connector
 import os
-from dotenv import load_dotenv
 import sys
-from datetime import datetime
-
-# Load environment variables
-load_dotenv()
-
-# Database configurations
-MYSQL_CONFIG = {
-    'host': os.getenv('DB_HOST', 'localhost'),
-    'user': os.getenv('DB_USER', 'root'),
-    'password': os.getenv('DB_PASSWORD', ''),
-    'database': os.getenv('DB_NAME', 'coreq_loans')
+import argparse
+import re
+import json
+import hashlib
+from loan_summaries import SummaryDeltas, create_summary_tables, rebuild_summaries
+from loan_partitions import partition_clause
+from row_mappers import fetch_records, select_columns
+from loan_pricing import DEFAULT_INTEREST_RATES, DEFAULT_GRACE_PERIOD_DAYS, load_pricing
+from item_photos import PHOTO_COLUMN, extract_photos
+from stage_profiler import stage
+import coreq_db
+
+# Database configurations (drivers are only imported when connecting)
+MYSQL_CONFIG = coreq_db.mysql_config()
+
+ACCESS_DB_PATH = coreq_db.access_db_path()
+
+ORPHAN_REPORT_PATH = 'migration_orphans.json'
+
+# Which duplicate survives when client rows are merged: first, last or most_complete
+BORROWER_MERGE_RULE = os.getenv('BORROWER_MERGE_RULE', 'most_complete')
+
+# Client columns: ID NUMBER merges duplicates; a shared Phone number is only
+# reported, since relatives and shops share phones
+BORROWER_ID_COLUMN = 0
+BORROWER_PHONE_COLUMN = 2
+
+# Changed rows written per statement in --upsert mode
+UPSERT_BATCH_SIZE = 500
+
+# Access source table of each migrated MySQL table
+SOURCE_TABLES = {
+    'users': 'Users',
+    'borrowers': 'client',
+    'collaterals': 'ITEMS',
+    'loans': 'LOANS',
+    'payments': 'PAYMENT TABLE',
+    'expenses': 'EXPENDITURE'
 }
 
-ACCESS_DB_PATH = r'D:\coreq capital WORKING.accdb'
+# Target columns of each curated mapping (first column is the primary key)
+USER_COLUMNS = ('id', 'username', 'password', 'role')
+BORROWER_COLUMNS = ('id', 'fullName', 'idNumber', 'phoneNumber', 'emergencyNumber', 'email',
+                    'location', 'apartment', 'houseNumber', 'isStudent', 'institution',
+                    'registrationNumber')
+COLLATERAL_COLUMNS = ('id', 'borrowerId', 'itemName', 'serialNumber', 'modelNumber', 'itemCondition')
+LOAN_COLUMNS = ('id', 'borrowerId', 'collateralId', 'amountIssued', 'dateIssued', 'loanPeriod',
+                'interestRate', 'dueDate', 'gracePeriodEnd', 'totalAmount', 'status')
+PAYMENT_COLUMNS = ('id', 'loanId', 'amount', 'paymentDate', 'note')
+EXPENSE_COLUMNS = ('id', 'category', 'name', 'date', 'amount')
+
+# Access columns each migrator reads, resolved by name from cursor.description
+# (alternatives are accepted spellings). Client fields stay in source order so
+# BORROWER_ID_COLUMN/BORROWER_PHONE_COLUMN can index them.
+CLIENT_FIELDS = (
+    ('id_number', 'ID NUMBER'),
+    ('name', 'Name'),
+    ('phone', ('Phone number', 'Phone')),
+    ('emergency', ('Emergency No', 'Emergency Number')),
+    ('location', 'Location'),
+    ('email', 'Email'),
+    ('apartment', 'Apartment'),
+    ('house_number', ('House Number', 'House No')),
+    ('institution', 'Institution'),
+    ('registration', ('Registration No', 'Registration Number'))
+)
+ITEM_FIELDS = (
+    ('item_id', 'ITEMID'),
+    ('id_number', 'ID NUMBER'),
+    ('item', 'ITEM'),
+    ('serial_no', ('SERIAL NO', 'SERIAL NUMBER')),
+    ('model_no', ('MODEL NO', 'MODEL NUMBER')),
+    ('condition', 'CONDITION')
+)
+LOAN_FIELDS = (
+    ('loan_id', 'LOANID'),
+    ('id_number', 'ID NUMBER'),
+    ('amount_issued', 'AMOUNT ISSUED'),
+    ('date_issued', 'DATE ISSUED'),
+    ('loan_period', 'LOAN PERIOD'),
+    ('item_id', 'ITEM ID')
+)
+PAYMENT_FIELDS = (
+    ('payment_id', 'PAYMENTID'),
+    ('loan_id', 'LOANID'),
+    ('amount_paid', 'AMOUNT PAID'),
+    ('date_paid', 'DATE PAID'),
+    ('comment', 'COMMENT')
+)
+EXPENDITURE_FIELDS = (
+    ('id', 'ID'),
+    ('category', 'CATEGORY'),
+    ('date', 'DATE'),
+    ('amount', 'AMOUNT')
+)
+ACCESS_USER_FIELDS = (
+    ('id', 'ID'),
+    ('username', 'USERNAME'),
+    ('password', 'PASSWORD')
+)
+
+class KeySet:
+    """Compact membership set for migrated primary keys (bitmap for ints, set otherwise)"""
+
+    def __init__(self):
+        self.bits = bytearray()
+        self.other = set()
+        self.size = 0
+
+    @staticmethod
+    def _normalize(key):
+        # Access numeric IDs can come back as floats (e.g. 12345678.0)
+        if isinstance(key, float) and key.is_integer():
+            return int(key)
+        return key
+
+    def add(self, key):
+        key = self._normalize(key)
+        if isinstance(key, int) and key >= 0:
+            byte, bit = divmod(key, 8)
+            if byte >= len(self.bits):
+                self.bits.extend(bytes(max(byte + 1, len(self.bits) * 2) - len(self.bits)))
+            if not self.bits[byte] & (1 << bit):
+                self.bits[byte] |= 1 << bit
+                self.size += 1
+        elif key not in self.other:
+            self.other.add(key)
+            self.size += 1
+
+    def __contains__(self, key):
+        key = self._normalize(key)
+        if isinstance(key, int) and key >= 0:
+            byte, bit = divmod(key, 8)
+            return byte < len(self.bits) and bool(self.bits[byte] & (1 << bit))
+        return key in self.other
+
+    def __len__(self):
+        return self.size
+
+class ReferenceTracker:
+    """Keys migrated so far, used to validate child rows before they reach MySQL"""
+
+    def __init__(self):
+        self.borrowers = KeySet()
+        self.collaterals = KeySet()
+        self.loans = KeySet()
+        self.orphans = []
+        self.borrower_remap = {}
+        self.phone_matches = []
+
+    def resolve_borrower(self, borrower_id):
+        """Follow the dedup remap from a merged client ID to the surviving one"""
+        return self.borrower_remap.get(KeySet._normalize(borrower_id), borrower_id)
+
+    def check(self, table, row_id, **references):
+        """Return True if every reference exists; otherwise record the orphan"""
+        missing = {
+            column: value for column, (value, keys) in references.items()
+            if value is None or value not in keys
+        }
+        if missing:
+            self.orphans.append({'table': table, 'id': row_id, 'missing': missing})
+            return False
+        return True
+
+    def require(self, table, row_id, **values):
+        """Return True if every value is present; otherwise record the row as skipped"""
+        missing = {column: None for column, value in values.items() if value is None}
+        if missing:
+            self.orphans.append({'table': table, 'id': row_id, 'missing': missing})
+            return False
+        return True
+
+    def write_report(self, path=ORPHAN_REPORT_PATH):
+        """Write orphaned rows to a JSON report"""
+        counts = {}
+        for orphan in self.orphans:
+            counts[orphan['table']] = counts.get(orphan['table'], 0) + 1
+
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'counts': counts,
+                'orphans': self.orphans,
+                'borrowerRemap': self.borrower_remap,
+                'phoneMatches': self.phone_matches
+            }, f, indent=2, default=str)
+
+        return counts
+
+def row_hash(values):
+    """Compact, stable hash of a row's mapped values"""
+    return hashlib.blake2b(repr(tuple(values)).encode('utf-8'), digest_size=16).digest()
+
+def create_row_hash_table(mysql_conn):
+    """Create the table that remembers the hash of every synced row"""
+    cursor = mysql_conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS migration_row_hashes (
+            tableName VARCHAR(64) NOT NULL,
+            rowId VARCHAR(64) NOT NULL,
+            rowHash BINARY(16) NOT NULL,
+            syncedAt DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (tableName, rowId)
+        )
+    ''')
+    mysql_conn.commit()
+    cursor.close()
 
-def connect_to_databases():
-    """Connect to both Access and MySQL databases"""
+class RowWriter:
+    """Writes mapped rows to one table and records their hashes.
+
+    In insert mode every row is INSERTed immediately, as the migrators always
+    did. In upsert mode the stored hashes for the table are loaded once, rows
+    whose hash is unchanged are skipped, and changed rows are written with
+    batched INSERT ... ON DUPLICATE KEY UPDATE together with their new hashes.
+    Partitioned tables key on (id, date), where a changed date is not a
+    duplicate key, so their existing rows are matched by id and UPDATEd.
+    Values must come from the source row alone (no clock fallbacks), or the
+    hash changes on every run.
+    """
+
+    def __init__(self, mysql_conn, table, columns, upsert=False, preserve=(), batch_size=None):
+        self.mysql_conn = mysql_conn
+        self.cursor = mysql_conn.cursor()
+        self.table = table
+        self.upsert = upsert
+        self.batch_size = batch_size or UPSERT_BATCH_SIZE
+        self.pending = []
+        self.written_hashes = []
+        self.written = 0
+        self.unchanged = 0
+        self.failed = 0
+        self.match_by_id = False
+
+        column_list = ', '.join(f'`{column}`' for column in columns)
+        placeholders = ', '.join(['%s'] * len(columns))
+        self.sql = f'INSERT INTO `{table}` ({column_list}) VALUES ({placeholders})'
+
+        self.hashes = {}
+        if upsert:
+            # Columns in `preserve` keep their live value when an existing row is updated
+            with stage('fetch'):
+                self.cursor.execute('''
+                    SELECT COUNT(*) FROM information_schema.PARTITIONS
+                    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+                ''', (table,))
+                self.match_by_id = self.cursor.fetchone()[0] > 0
+            if self.match_by_id:
+                updated = [index for index, column in enumerate(columns) if index and column not in preserve]
+                self.update_sql = (f'UPDATE `{table}` SET '
+                                   + ', '.join(f'`{columns[index]}` = %s' for index in updated)
+                                   + ' WHERE id = %s')
+                self.updated_indexes = updated
+            else:
+                updates = ', '.join(f'`{column}` = VALUES(`{column}`)'
+                                    for column in columns[1:] if column not in preserve)
+                self.sql += f' ON DUPLICATE KEY UPDATE {updates}'
+            with stage('fetch'):
+                self.cursor.execute(
+                    'SELECT rowId, rowHash FROM migration_row_hashes WHERE tableName = %s', (table,)
+                )
+                self.hashes = {row_id: bytes(digest) for row_id, digest in self.cursor.fetchall()}
+
+    def write(self, values):
+        """Write one row (insert mode) or queue it if its hash changed (upsert mode)"""
+        key = str(values[0])
+        digest = row_hash(values)
+
+        if not self.upsert:
+            with stage('write'):
+                self.cursor.execute(self.sql, values)
+            self.written += 1
+            self.written_hashes.append((key, digest))
+            if len(self.written_hashes) >= self.batch_size:
+                self._save_hashes()
+            return
+
+        if self.hashes.get(key) == digest:
+            self.unchanged += 1
+            return
+
+        self.pending.append((values, key, digest))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    @stage('write')
+    def _save_hashes(self):
+        if not self.written_hashes:
+            return
+        self.cursor.executemany('''
+            INSERT INTO migration_row_hashes (tableName, rowId, rowHash)
+            VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE rowHash = VALUES(rowHash)
+        ''', [(self.table, key, digest) for key, digest in self.written_hashes])
+        for key, digest in self.written_hashes:
+            self.hashes[key] = digest
+        self.written_hashes = []
+
+    def _write_rows(self, rows):
+        if not self.match_by_id:
+            self.cursor.executemany(self.sql, rows)
+            return
+
+        self.cursor.execute(
+            f'SELECT id FROM `{self.table}` WHERE id IN ({", ".join(["%s"] * len(rows))})',
+            [values[0] for values in rows]
+        )
+        existing = {str(row[0]) for row in self.cursor.fetchall()}
+        updates = [values for values in rows if str(KeySet._normalize(values[0])) in existing]
+        inserts = [values for values in rows if str(KeySet._normalize(values[0])) not in existing]
+        if updates:
+            self.cursor.executemany(self.update_sql, [
+                [values[index] for index in self.updated_indexes] + [values[0]] for values in updates
+            ])
+        if inserts:
+            self.cursor.executemany(self.sql, inserts)
+
+    @stage('write')
+    def flush(self):
+        """Write queued changed rows and all recorded hashes"""
+        batch, self.pending = self.pending, []
+        if batch:
+            # A failed batch is rolled back to here before the per-row retry
+            self.cursor.execute('SAVEPOINT row_batch')
+            try:
+                self._write_rows([values for values, _, _ in batch])
+                written = batch
+            except Exception as e:
+                self.cursor.execute('ROLLBACK TO SAVEPOINT row_batch')
+                # Retry row by row so one bad row does not sink the batch
+                print(f'  [WARNING] Batch upsert into {self.table} failed, retrying per row: {str(e)[:100]}')
+                written = []
+                for item in batch:
+                    self.cursor.execute('SAVEPOINT row_batch')
+                    try:
+                        self._write_rows([item[0]])
+                        written.append(item)
+                    except Exception as row_error:
+                        self.cursor.execute('ROLLBACK TO SAVEPOINT row_batch')
+                        self.failed += 1
+                        print(f'  [WARNING] Error upserting {self.table} {item[1]}: {str(row_error)[:100]}')
+            self.written += len(written)
+            self.written_hashes.extend((key, digest) for _, key, digest in written)
+
+        self._save_hashes()
+        with stage('commit'):
+            self.mysql_conn.commit()
+
+    def stats(self):
+        """Counters for this writer"""
+        return {'written': self.written, 'unchanged': self.unchanged, 'failed': self.failed}
+
+    def close(self):
+        """Flush pending rows and hashes and release the cursor"""
+        self.flush()
+        self.cursor.close()
+        if self.upsert:
+            print(f'  [INFO] {self.table}: {self.written} written, {self.unchanged} unchanged'
+                  + (f', {self.failed} failed' if self.failed else ''))
+
+def connect_to_access(db_path=ACCESS_DB_PATH):
+    """Connect to the Access database through the best available ODBC driver"""
+    return coreq_db.connect_access(db_path)
+
+def open_access_source(snapshot=None):
+    """The Access connection, or a snapshot taken with access_snapshot.py standing in for it"""
+    if snapshot:
+        from access_snapshot import open_snapshot
+        return open_snapshot(snapshot)
+    access_conn = connect_to_access()
+    print('[OK] Connected to Access database')
+    return access_conn
+
+def connect_to_databases(snapshot=None):
+    """Connect to both Access (or its snapshot) and MySQL databases"""
     try:
-        # Find Access driver
-        drivers = [driver for driver in pyodbc.drivers() if 'Access' in driver or 'access' in driver]
-        if not drivers:
-            print('[ERROR] No Access ODBC drivers found!')
-            sys.exit(1)
-
-        selected_driver = None
-        for driver in drivers:
-            if '.accdb' in driver:
-                selected_driver = driver
-                break
-        if not selected_driver:
-            selected_driver = drivers[0]
-
-        print(f'Using ODBC driver: {selected_driver}')
-
         # Connect to Access
-        access_conn_str = f'Driver={{{selected_driver}}};DBQ={ACCESS_DB_PATH};'
-        access_conn = pyodbc.connect(access_conn_str)
-        print('[OK] Connected to Access database')
+        access_conn = open_access_source(snapshot)
 
         # Connect to MySQL
-        mysql_conn = mysql.connector.connect(**MYSQL_CONFIG)
+        mysql_conn = coreq_db.connect_mysql()
         print('[OK] Connected to MySQL database')
 
         return access_conn, mysql_conn
@@ -69,8 +406,64 @@ def drop_all_tables(mysql_conn):
     cursor.close()
     print('[SUCCESS] All tables dropped\n')
 
-def create_schema(mysql_conn):
-    """Create MySQL schema according to requirements"""
+LOAN_TABLE_COLUMNS = '''
+    id INT AUTO_INCREMENT,
+    borrowerId INT NOT NULL,
+    collateralId INT NOT NULL,
+    amountIssued DECIMAL(10,2) NOT NULL,
+    dateIssued DATETIME NOT NULL,
+    loanPeriod INT NOT NULL,
+    interestRate DECIMAL(5,2) NOT NULL,
+    dueDate DATETIME NOT NULL,
+    gracePeriodEnd DATETIME,
+    status ENUM('active', 'paid', 'defaulted', 'pastDue', 'due', 'closed') DEFAULT 'active',
+    totalAmount DECIMAL(10,2) NOT NULL,
+    penalties DECIMAL(10,2) DEFAULT 0,
+    isNegotiable TINYINT(1) DEFAULT 0,
+    lastPenaltyDate DATETIME,
+    createdAt DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updatedAt DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+'''
+
+PAYMENT_TABLE_COLUMNS = '''
+    id INT AUTO_INCREMENT,
+    loanId INT NOT NULL,
+    amount DECIMAL(10,2) NOT NULL,
+    paymentDate DATETIME NOT NULL,
+    note TEXT,
+    createdAt DATETIME DEFAULT CURRENT_TIMESTAMP
+'''
+
+def partitionable_table_ddl(table, columns, partitioned, partition_column, references):
+    """CREATE TABLE for loans/payments, with or without monthly partitions.
+
+    Unpartitioned: PRIMARY KEY (id) and foreign keys. Partitioned: the
+    partition column joins the primary key and references become plain
+    indexes (MySQL requires both), so id is unique only because AUTO_INCREMENT
+    hands out each value once; duplicate_ids() checks it.
+    """
+    if partitioned:
+        keys = [f'PRIMARY KEY (id, {partition_column})'] + [f'KEY ({column})' for column, _ in references]
+        suffix = partition_clause(partition_column)
+    else:
+        keys = ['PRIMARY KEY (id)'] + [f'FOREIGN KEY ({column}) REFERENCES {parent}(id) ON DELETE CASCADE'
+                                       for column, parent in references]
+        suffix = ''
+    return f'CREATE TABLE {table} ({columns.rstrip()},\n    ' + ',\n    '.join(keys) + f'\n) {suffix}'
+
+def duplicate_ids(cursor, table):
+    """Ids that occur more than once (possible only in partitioned loans/payments)"""
+    cursor.execute(f'SELECT id FROM `{table}` GROUP BY id HAVING COUNT(*) > 1 LIMIT 20')
+    return [row[0] for row in cursor.fetchall()]
+
+def create_schema(mysql_conn, partitioned=False):
+    """Create MySQL schema according to requirements.
+
+    With partitioned=True, loans and payments are RANGE partitioned by month
+    on dateIssued/paymentDate. MySQL does not allow foreign keys on
+    partitioned tables, so their references become plain indexes and
+    integrity comes from the ReferenceTracker pre-validation.
+    """
     cursor = mysql_conn.cursor()
 
     print('[INFO] Creating MySQL schema...')
@@ -126,6 +519,8 @@ def create_schema(mysql_conn):
             isSold TINYINT(1) DEFAULT 0,
             soldPrice DECIMAL(10,2),
             soldDate DATETIME,
+            photoPath VARCHAR(255),
+            photoHash CHAR(64),
             createdAt DATETIME DEFAULT CURRENT_TIMESTAMP,
             updatedAt DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
             FOREIGN KEY (borrowerId) REFERENCES borrowers(id) ON DELETE CASCADE
@@ -133,44 +528,14 @@ def create_schema(mysql_conn):
     ''')
     print('[OK] Created: collaterals')
 
-    # Loans table
-    cursor.execute('''
-        CREATE TABLE loans (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            borrowerId INT NOT NULL,
-            collateralId INT NOT NULL,
-            amountIssued DECIMAL(10,2) NOT NULL,
-            dateIssued DATETIME NOT NULL,
-            loanPeriod INT NOT NULL,
-            interestRate DECIMAL(5,2) NOT NULL,
-            dueDate DATETIME NOT NULL,
-            gracePeriodEnd DATETIME,
-            status ENUM('active', 'paid', 'defaulted', 'pastDue') DEFAULT 'active',
-            totalAmount DECIMAL(10,2) NOT NULL,
-            penalties DECIMAL(10,2) DEFAULT 0,
-            isNegotiable TINYINT(1) DEFAULT 0,
-            lastPenaltyDate DATETIME,
-            createdAt DATETIME DEFAULT CURRENT_TIMESTAMP,
-            updatedAt DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-            FOREIGN KEY (borrowerId) REFERENCES borrowers(id) ON DELETE CASCADE,
-            FOREIGN KEY (collateralId) REFERENCES collaterals(id) ON DELETE CASCADE
-        )
-    ''')
-    print('[OK] Created: loans')
+    # Loans and payments: one column list each, keyed by partitioning
+    cursor.execute(partitionable_table_ddl('loans', LOAN_TABLE_COLUMNS, partitioned, 'dateIssued',
+                                           (('borrowerId', 'borrowers'), ('collateralId', 'collaterals'))))
+    print('[OK] Created: loans' + (' (partitioned by month of dateIssued)' if partitioned else ''))
 
-    # Payments table
-    cursor.execute('''
-        CREATE TABLE payments (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            loanId INT NOT NULL,
-            amount DECIMAL(10,2) NOT NULL,
-            paymentDate DATETIME NOT NULL,
-            note TEXT,
-            createdAt DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (loanId) REFERENCES loans(id) ON DELETE CASCADE
-        )
-    ''')
-    print('[OK] Created: payments')
+    cursor.execute(partitionable_table_ddl('payments', PAYMENT_TABLE_COLUMNS, partitioned, 'paymentDate',
+                                           (('loanId', 'loans'),)))
+    print('[OK] Created: payments' + (' (partitioned by month of paymentDate)' if partitioned else ''))
 
     # Expenses table
     cursor.execute('''
@@ -205,142 +570,224 @@ def create_schema(mysql_conn):
     mysql_conn.commit()
     cursor.close()
 
+    create_summary_tables(mysql_conn)
+    print('[OK] Created: loan_status_summary, daily_loan_summary')
+
     print('=' * 50)
     print('[SUCCESS] Schema created successfully!\n')
 
-def migrate_borrowers(access_conn, mysql_conn):
+def normalize_id_number(value):
+    """Canonical form of a national ID number: no spacing/punctuation, no leading zeros"""
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    normalized = re.sub(r'[^0-9A-Za-z]', '', str(value)).upper().lstrip('0')
+    return normalized or None
+
+def normalize_phone(value):
+    """Canonical form of a Kenyan phone number: the last 9 digits (07.., +2547.., 7..)"""
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    digits = re.sub(r'\D', '', str(value))
+    return digits[-9:] if len(digits) >= 9 else None
+
+def dedupe_borrowers(rows, rule=BORROWER_MERGE_RULE):
+    """Group duplicate client rows in one pass and merge each group.
+
+    Rows are merged only when their normalized ID numbers match. Different ID
+    numbers sharing a phone number are left apart and returned for review.
+    Returns (merged_rows, remap, phone_matches) where remap maps every dropped
+    client ID to the ID of the row that survived.
+    """
+    if rule not in ('first', 'last', 'most_complete'):
+        raise ValueError(f'Unknown borrower merge rule: {rule}')
+
+    groups = {}
+    for i, row in enumerate(rows):
+        key = normalize_id_number(row[BORROWER_ID_COLUMN])
+        groups.setdefault(key if key is not None else ('row', i), []).append(i)
+
+    ids_by_phone = {}
+    for members in groups.values():
+        phones = {normalize_phone(rows[i][BORROWER_PHONE_COLUMN]) for i in members} - {None}
+        for phone in phones:
+            ids_by_phone.setdefault(phone, []).append(rows[members[0]][BORROWER_ID_COLUMN])
+    phone_matches = [{'phone': phone, 'ids': ids} for phone, ids in ids_by_phone.items() if len(ids) > 1]
+
+    merged = []
+    remap = {}
+    for members in groups.values():
+        if len(members) == 1:
+            merged.append(rows[members[0]])
+            continue
+
+        if rule == 'first':
+            keep = members[0]
+        elif rule == 'last':
+            keep = members[-1]
+        else:
+            keep = max(members, key=lambda i: sum(1 for v in rows[i] if v not in (None, '')))
+
+        survivor = list(rows[keep])
+        for i in members:
+            if i == keep:
+                continue
+            # Fill blanks on the survivor from its duplicates
+            for column, value in enumerate(rows[i]):
+                if survivor[column] in (None, '') and value not in (None, ''):
+                    survivor[column] = value
+            dropped_id = KeySet._normalize(rows[i][0])
+            if dropped_id != KeySet._normalize(survivor[0]):
+                remap[dropped_id] = survivor[0]
+        merged.append(rows[keep]._make(survivor) if hasattr(rows[keep], '_make') else survivor)
+
+    return merged, remap, phone_matches
+
+@stage('borrowers', phase='convert')
+def migrate_borrowers(access_conn, mysql_conn, refs=None, summaries=None, upsert=False):
     """Migrate borrowers from Access client table"""
     access_cursor = access_conn.cursor()
-    mysql_cursor = mysql_conn.cursor()
+    writer = RowWriter(mysql_conn, 'borrowers', BORROWER_COLUMNS, upsert)
 
     print('[MIGRATING] Borrowers...')
 
     # Get data from Access
-    access_cursor.execute('SELECT * FROM [client]')
-    rows = access_cursor.fetchall()
+    with stage('fetch'):
+        access_cursor.execute('SELECT * FROM [client]')
+        source_rows = fetch_records(access_cursor, 'ClientRow', CLIENT_FIELDS)
+
+    rows, remap, phone_matches = dedupe_borrowers(source_rows)
+    if remap:
+        print(f'  [INFO] Merged {len(remap)} duplicate clients ({BORROWER_MERGE_RULE})')
+    if phone_matches:
+        print(f'  [INFO] {len(phone_matches)} phone numbers are shared by different ID numbers '
+              f'(not merged; listed for review in {ORPHAN_REPORT_PATH})')
+    if refs is not None:
+        refs.borrower_remap.update(remap)
+        refs.phone_matches.extend(phone_matches)
 
     migrated = 0
     for row in rows:
         try:
             # Map Access columns to MySQL columns
-            # Access: ID NUMBER, Name, Phone number, Emergency No, Location, Email,
-            #         Apartment, House Number, Institution, Registration No
-            mysql_cursor.execute('''
-                INSERT INTO borrowers
-                (id, fullName, idNumber, phoneNumber, emergencyNumber, email,
-                 location, apartment, houseNumber, isStudent, institution, registrationNumber)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ''', (
-                row[0],  # ID NUMBER -> id
-                row[1],  # Name -> fullName
-                str(row[0]),  # ID NUMBER -> idNumber
-                str(row[2]) if row[2] else '',  # Phone number -> phoneNumber
-                str(row[3]) if row[3] else None,  # Emergency No -> emergencyNumber
-                row[5] if row[5] else None,  # Email
-                row[4] if row[4] else '',  # Location
-                row[6] if row[6] else None,  # Apartment
-                row[7] if row[7] else None,  # House Number
-                1 if row[8] else 0,  # Institution present -> isStudent
-                row[8] if row[8] else None,  # Institution
-                row[9] if row[9] else None   # Registration No
+            writer.write((
+                row.id_number,  # ID NUMBER -> id
+                row.name,  # Name -> fullName
+                normalize_id_number(row.id_number) or str(row.id_number),  # ID NUMBER -> idNumber
+                str(row.phone) if row.phone else '',  # Phone number -> phoneNumber
+                str(row.emergency) if row.emergency else None,  # Emergency No -> emergencyNumber
+                row.email if row.email else None,  # Email
+                row.location if row.location else '',  # Location
+                row.apartment if row.apartment else None,  # Apartment
+                row.house_number if row.house_number else None,  # House Number
+                1 if row.institution else 0,  # Institution present -> isStudent
+                row.institution if row.institution else None,  # Institution
+                row.registration if row.registration else None   # Registration No
             ))
             migrated += 1
+            if refs is not None:
+                refs.borrowers.add(row.id_number)
+            if summaries is not None:
+                summaries.locations[KeySet._normalize(row.id_number)] = row.location or ''
         except Exception as e:
             print(f'  [WARNING] Error migrating borrower: {str(e)[:100]}')
 
+    writer.close()
     mysql_conn.commit()
-    print(f'  [SUCCESS] Migrated {migrated}/{len(rows)} borrowers\n')
+    print(f'  [SUCCESS] Migrated {migrated}/{len(rows)} borrowers ({len(source_rows)} client rows)\n')
 
     access_cursor.close()
-    mysql_cursor.close()
+    return writer.stats()
 
-def migrate_collaterals(access_conn, mysql_conn):
+@stage('collaterals', phase='convert')
+def migrate_collaterals(access_conn, mysql_conn, refs=None, upsert=False):
     """Migrate collaterals from Access ITEMS table"""
     access_cursor = access_conn.cursor()
-    mysql_cursor = mysql_conn.cursor()
+    writer = RowWriter(mysql_conn, 'collaterals', COLLATERAL_COLUMNS, upsert)
 
     print('[MIGRATING] Collaterals...')
 
-    # Get data from Access
-    access_cursor.execute('SELECT * FROM [ITEMS]')
-    rows = access_cursor.fetchall()
+    # Get data from Access (photos are extracted to files separately, see item_photos.py)
+    with stage('fetch'):
+        access_cursor.execute(select_columns(access_cursor, 'ITEMS', exclude=(PHOTO_COLUMN,)))
+        rows = fetch_records(access_cursor, 'ItemRow', ITEM_FIELDS)
 
     migrated = 0
     for row in rows:
+        borrower_id = refs.resolve_borrower(row.id_number) if refs is not None else row.id_number
+        if refs is not None and not refs.check('collaterals', row.item_id, borrowerId=(borrower_id, refs.borrowers)):
+            continue
         try:
-            # Access: ITEMID, ID NUMBER, ITEM, SERIAL NO, MODEL NO, CONDITION, ITEM PHOTO
-            mysql_cursor.execute('''
-                INSERT INTO collaterals
-                (id, borrowerId, itemName, serialNumber, modelNumber, itemCondition)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            ''', (
-                row[0],  # ITEMID -> id
-                row[1],  # ID NUMBER -> borrowerId
-                row[2] if row[2] else 'Unknown',  # ITEM -> itemName
-                row[3] if row[3] else None,  # SERIAL NO
-                row[4] if row[4] else None,  # MODEL NO
-                row[5] if row[5] else None   # CONDITION
+            writer.write((
+                row.item_id,  # ITEMID -> id
+                borrower_id,  # ID NUMBER -> borrowerId (after dedup remap)
+                row.item if row.item else 'Unknown',  # ITEM -> itemName
+                row.serial_no if row.serial_no else None,  # SERIAL NO
+                row.model_no if row.model_no else None,  # MODEL NO
+                row.condition if row.condition else None   # CONDITION
             ))
             migrated += 1
+            if refs is not None:
+                refs.collaterals.add(row.item_id)
         except Exception as e:
             print(f'  [WARNING] Error migrating collateral: {str(e)[:100]}')
 
+    writer.close()
     mysql_conn.commit()
     print(f'  [SUCCESS] Migrated {migrated}/{len(rows)} collaterals\n')
 
     access_cursor.close()
-    mysql_cursor.close()
+    return writer.stats()
 
-def migrate_loans(access_conn, mysql_conn):
+@stage('loans', phase='convert')
+def migrate_loans(access_conn, mysql_conn, refs=None, summaries=None, upsert=False):
     """Migrate loans from Access LOANS table"""
     access_cursor = access_conn.cursor()
-    mysql_cursor = mysql_conn.cursor()
+    # Re-synced loans keep the status the status updater gave them
+    writer = RowWriter(mysql_conn, 'loans', LOAN_COLUMNS, upsert, preserve=('status',))
 
     print('[MIGRATING] Loans...')
 
+    # Interest tiers and grace period from settings (defaults on a fresh schema)
+    pricing = load_pricing(mysql_conn)
+
     # Get data from Access
-    access_cursor.execute('SELECT * FROM [LOANS]')
-    rows = access_cursor.fetchall()
+    with stage('fetch'):
+        access_cursor.execute('SELECT * FROM [LOANS]')
+        rows = fetch_records(access_cursor, 'LoanRow', LOAN_FIELDS)
 
     migrated = 0
     for row in rows:
+        if refs is not None and not refs.check('loans', row.loan_id,
+                                               borrowerId=(refs.resolve_borrower(row.id_number), refs.borrowers),
+                                               collateralId=(row.item_id, refs.collaterals)):
+            continue
+        # No date to derive dueDate from (nor, partitioned, to key on); today's date would change every run
+        if not row.date_issued:
+            if refs is not None:
+                refs.require('loans', row.loan_id, dateIssued=None)
+            continue
         try:
-            # Access: LOANID, ID NUMBER, AMOUNT ISSUED, DATE ISSUED, LOAN PERIOD, ITEM ID
-            loan_id = row[0]
-            borrower_id = row[1]
-            amount_issued = float(row[2]) if row[2] else 0
-            date_issued = row[3] if row[3] else datetime.now()
-            loan_period = int(row[4]) if row[4] else 1
-            collateral_id = row[5]
-
-            # Calculate interest rate based on loan period
-            interest_rate = 20.0  # default 1 week
-            if loan_period == 2:
-                interest_rate = 28.0
-            elif loan_period == 3:
-                interest_rate = 32.0
-            elif loan_period >= 4:
-                interest_rate = 35.0
-
-            # Calculate total amount
-            interest_amount = amount_issued * (interest_rate / 100)
-            total_amount = amount_issued + interest_amount
+            loan_id = row.loan_id
+            borrower_id = refs.resolve_borrower(row.id_number) if refs is not None else row.id_number
+            amount_issued = float(row.amount_issued) if row.amount_issued else 0
+            date_issued = row.date_issued
+            loan_period = int(row.loan_period) if row.loan_period else 1
+            collateral_id = row.item_id
+
+            # Calculate interest rate and total amount from the settings tiers
+            interest_rate = float(pricing.rate(loan_period))
+            total_amount = float(pricing.total(amount_issued, pricing.rate(loan_period)))
 
             # Calculate due date (loan_period is in weeks)
             from datetime import timedelta
-            if isinstance(date_issued, datetime):
-                due_date = date_issued + timedelta(weeks=loan_period)
-                grace_period_end = due_date + timedelta(days=7)
-            else:
-                due_date = datetime.now() + timedelta(weeks=loan_period)
-                grace_period_end = due_date + timedelta(days=7)
-
-            mysql_cursor.execute('''
-                INSERT INTO loans
-                (id, borrowerId, collateralId, amountIssued, dateIssued, loanPeriod,
-                 interestRate, dueDate, gracePeriodEnd, totalAmount, status)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ''', (
+            due_date = date_issued + timedelta(weeks=loan_period)
+            grace_period_end = pricing.grace_period_end(due_date)
+
+            writer.write((
                 loan_id,
                 borrower_id,
                 collateral_id,
@@ -354,177 +801,327 @@ def migrate_loans(access_conn, mysql_conn):
                 'active'
             ))
             migrated += 1
+            if refs is not None:
+                refs.loans.add(loan_id)
+            if summaries is not None:
+                summaries.loan_added(loan_id, 'active', summaries.locations.get(KeySet._normalize(borrower_id)),
+                                     total_amount, date_issued, amount_issued)
         except Exception as e:
-            print(f'  [WARNING] Error migrating loan {row[0]}: {str(e)[:100]}')
+            print(f'  [WARNING] Error migrating loan {row.loan_id}: {str(e)[:100]}')
 
+    writer.close()
     mysql_conn.commit()
     print(f'  [SUCCESS] Migrated {migrated}/{len(rows)} loans\n')
 
     access_cursor.close()
-    mysql_cursor.close()
+    return writer.stats()
 
-def migrate_payments(access_conn, mysql_conn):
+@stage('payments', phase='convert')
+def migrate_payments(access_conn, mysql_conn, refs=None, summaries=None, upsert=False):
     """Migrate payments from Access PAYMENT TABLE"""
     access_cursor = access_conn.cursor()
-    mysql_cursor = mysql_conn.cursor()
+    writer = RowWriter(mysql_conn, 'payments', PAYMENT_COLUMNS, upsert)
 
     print('[MIGRATING] Payments...')
 
     try:
-        access_cursor.execute('SELECT * FROM [PAYMENT TABLE]')
-        rows = access_cursor.fetchall()
+        with stage('fetch'):
+            access_cursor.execute('SELECT * FROM [PAYMENT TABLE]')
+            rows = fetch_records(access_cursor, 'PaymentRow', PAYMENT_FIELDS)
 
         migrated = 0
         for row in rows:
+            if refs is not None and not refs.check('payments', row.payment_id, loanId=(row.loan_id, refs.loans)):
+                continue
+            if not row.date_paid:
+                if refs is not None:
+                    refs.require('payments', row.payment_id, paymentDate=None)
+                continue
             try:
-                # Access: PAYMENTID, LOANID, AMOUNT PAID, DATE PAID, COMMENT
-                mysql_cursor.execute('''
-                    INSERT INTO payments
-                    (id, loanId, amount, paymentDate, note)
-                    VALUES (%s, %s, %s, %s, %s)
-                ''', (
-                    row[0],  # PAYMENTID
-                    row[1],  # LOANID
-                    float(row[2]) if row[2] else 0,  # AMOUNT PAID
-                    row[3] if row[3] else datetime.now(),  # DATE PAID
-                    row[4] if row[4] else None  # COMMENT
+                writer.write((
+                    row.payment_id,  # PAYMENTID
+                    row.loan_id,  # LOANID
+                    float(row.amount_paid) if row.amount_paid else 0,  # AMOUNT PAID
+                    row.date_paid,  # DATE PAID
+                    row.comment if row.comment else None  # COMMENT
                 ))
                 migrated += 1
+                if summaries is not None:
+                    summaries.payment_added(row.loan_id, row.amount_paid, row.date_paid)
             except Exception as e:
                 print(f'  [WARNING] Error migrating payment: {str(e)[:100]}')
 
+        writer.flush()
         mysql_conn.commit()
         print(f'  [SUCCESS] Migrated {migrated}/{len(rows)} payments\n')
     except Exception as e:
         print(f'  [ERROR] Could not migrate payments: {e}\n')
 
+    writer.close()
     access_cursor.close()
-    mysql_cursor.close()
+    return writer.stats()
 
-def migrate_expenses(access_conn, mysql_conn):
+@stage('expenses', phase='convert')
+def migrate_expenses(access_conn, mysql_conn, refs=None, upsert=False):
     """Migrate expenses from Access EXPENDITURE table"""
     access_cursor = access_conn.cursor()
-    mysql_cursor = mysql_conn.cursor()
+    writer = RowWriter(mysql_conn, 'expenses', EXPENSE_COLUMNS, upsert)
 
     print('[MIGRATING] Expenses...')
 
     try:
-        access_cursor.execute('SELECT * FROM [EXPENDITURE]')
-        rows = access_cursor.fetchall()
+        with stage('fetch'):
+            access_cursor.execute('SELECT * FROM [EXPENDITURE]')
+            rows = fetch_records(access_cursor, 'ExpenditureRow', EXPENDITURE_FIELDS)
 
         migrated = 0
         for row in rows:
+            if not row.date:
+                if refs is not None:
+                    refs.require('expenses', row.id, date=None)
+                continue
             try:
-                # Access: ID, CATEGORY, DATE, AMOUNT
-                mysql_cursor.execute('''
-                    INSERT INTO expenses
-                    (id, category, name, date, amount)
-                    VALUES (%s, %s, %s, %s, %s)
-                ''', (
-                    row[0],  # ID
-                    row[1] if row[1] else 'General',  # CATEGORY
-                    row[1] if row[1] else 'Expense',  # name (use category as name)
-                    row[2] if row[2] else datetime.now(),  # DATE
-                    float(row[3]) if row[3] else 0  # AMOUNT
+                writer.write((
+                    row.id,  # ID
+                    row.category if row.category else 'General',  # CATEGORY
+                    row.category if row.category else 'Expense',  # name (use category as name)
+                    row.date,  # DATE
+                    float(row.amount) if row.amount else 0  # AMOUNT
                 ))
                 migrated += 1
             except Exception as e:
                 print(f'  [WARNING] Error migrating expense: {str(e)[:100]}')
 
+        writer.flush()
         mysql_conn.commit()
         print(f'  [SUCCESS] Migrated {migrated}/{len(rows)} expenses\n')
     except Exception as e:
         print(f'  [ERROR] Could not migrate expenses: {e}\n')
 
+    writer.close()
     access_cursor.close()
-    mysql_cursor.close()
+    return writer.stats()
 
-def migrate_users(access_conn, mysql_conn):
+@stage('users', phase='convert')
+def migrate_users(access_conn, mysql_conn, upsert=False):
     """Migrate users from Access Users table"""
     access_cursor = access_conn.cursor()
-    mysql_cursor = mysql_conn.cursor()
+    # Re-synced users keep their live password (bcrypt after bulk_credentials.py --rehash)
+    writer = RowWriter(mysql_conn, 'users', USER_COLUMNS, upsert, preserve=('password',))
 
     print('[MIGRATING] Users...')
 
     try:
-        access_cursor.execute('SELECT * FROM [Users]')
-        rows = access_cursor.fetchall()
+        with stage('fetch'):
+            access_cursor.execute('SELECT * FROM [Users]')
+            rows = fetch_records(access_cursor, 'AccessUserRow', ACCESS_USER_FIELDS)
 
         migrated = 0
         for row in rows:
             try:
-                # Access: ID, USERNAME, PASSWORD
-                mysql_cursor.execute('''
-                    INSERT INTO users
-                    (id, username, password, role)
-                    VALUES (%s, %s, %s, %s)
-                ''', (
-                    row[0],  # ID
-                    row[1] if row[1] else f'user{row[0]}',  # USERNAME
-                    row[2] if row[2] else 'password',  # PASSWORD (already hashed)
+                writer.write((
+                    row.id,  # ID
+                    row.username if row.username else f'user{row.id}',  # USERNAME
+                    row.password if row.password else 'password',  # PASSWORD (plaintext is hashed by bulk_credentials.py --rehash)
                     'admin'  # Default to admin for migrated users
                 ))
                 migrated += 1
             except Exception as e:
                 print(f'  [WARNING] Error migrating user: {str(e)[:100]}')
 
+        writer.flush()
         mysql_conn.commit()
         print(f'  [SUCCESS] Migrated {migrated}/{len(rows)} users\n')
     except Exception as e:
         print(f'  [ERROR] Could not migrate users: {e}\n')
 
+    writer.close()
     access_cursor.close()
-    mysql_cursor.close()
+    return writer.stats()
 
 def create_default_settings(mysql_conn):
     """Create default settings"""
     cursor = mysql_conn.cursor()
 
-    print('[INFO] Creating default settings...')
+    cursor.execute('SELECT COUNT(*) FROM settings')
+    if cursor.fetchone()[0]:
+        print('[INFO] Settings already exist, keeping them\n')
+        cursor.close()
+        return
 
-    interest_rates = {
-        "1": 20,
-        "2": 28,
-        "3": 32,
-        "4": 35
-    }
+    print('[INFO] Creating default settings...')
 
-    import json
     cursor.execute('''
         INSERT INTO settings (interestRates, penaltyFee, gracePeriod, loanThreshold, negotiableThreshold)
         VALUES (%s, %s, %s, %s, %s)
-    ''', (json.dumps(interest_rates), 3.00, 7, 12000.00, 50000.00))
+    ''', (json.dumps(DEFAULT_INTEREST_RATES), 3.00, DEFAULT_GRACE_PERIOD_DAYS, 12000.00, 50000.00))
 
     mysql_conn.commit()
     cursor.close()
     print('[OK] Default settings created\n')
 
-def main():
-    """Main migration function"""
-    print('\n' + '=' * 50)
-    print('COMPREHENSIVE ACCESS TO MYSQL MIGRATION')
-    print('=' * 50 + '\n')
+def verify_migration(access_conn, mysql_conn):
+    """Compare row counts of each Access source table with its MySQL table; returns (all_match, failed).
 
-    # Connect
-    access_conn, mysql_conn = connect_to_databases()
+    Count differences are warnings (merged clients and skipped orphans
+    explain them); duplicate ids and failed checks set `failed`.
+    """
+    access_cursor = access_conn.cursor()
+    mysql_cursor = mysql_conn.cursor()
+
+    print('\n[INFO] Verifying migration...')
+    print('=' * 50)
+
+    all_match = True
+    failed = False
+    for table, source in SOURCE_TABLES.items():
+        try:
+            access_cursor.execute(f'SELECT COUNT(*) FROM [{source}]')
+            access_count = access_cursor.fetchone()[0]
 
-    # Drop all existing tables
-    drop_all_tables(mysql_conn)
+            mysql_cursor.execute(f'SELECT COUNT(*) FROM `{table}`')
+            mysql_count = mysql_cursor.fetchone()[0]
 
-    # Create new schema
-    create_schema(mysql_conn)
+            if table in ('loans', 'payments'):
+                duplicates = duplicate_ids(mysql_cursor, table)
+                if duplicates:
+                    print(f'[ERROR] {table}: ids stored more than once: {duplicates}')
+                    all_match = False
+                    failed = True
 
-    # Migrate data
-    migrate_users(access_conn, mysql_conn)
-    migrate_borrowers(access_conn, mysql_conn)
-    migrate_collaterals(access_conn, mysql_conn)
-    migrate_loans(access_conn, mysql_conn)
-    migrate_payments(access_conn, mysql_conn)
-    migrate_expenses(access_conn, mysql_conn)
+            if access_count == mysql_count:
+                print(f'[OK] {table}: {mysql_count} rows')
+            else:
+                print(f'[WARNING] {table}: Access[{source}]={access_count}, MySQL={mysql_count}')
+                all_match = False
+        except Exception as e:
+            print(f'[ERROR] Error verifying {table}: {e}')
+            all_match = False
+            failed = True
+
+    access_cursor.close()
+    mysql_cursor.close()
+
+    print('=' * 50)
+    if all_match:
+        print('[SUCCESS] All tables verified successfully!')
+    elif failed:
+        print('[ERROR] Verification failed (see the errors above)')
+    else:
+        # Merged duplicate clients and skipped orphans account for expected differences
+        print(f'[WARNING] Some tables have mismatched row counts (see {ORPHAN_REPORT_PATH})')
+    return all_match, failed
+
+def load_data(access_conn, mysql_conn, upsert=False, photos=False):
+    """Run every migrator against mysql_conn's schema, then summaries, photos and settings"""
+    create_row_hash_table(mysql_conn)
+
+    # Migrate data. Child rows are validated against the keys migrated so
+    # far, so FK checks can be relaxed for the bulk load.
+    refs = ReferenceTracker()
+    # Upserts cannot be expressed as summary deltas; summaries are rebuilt instead
+    summaries = None if upsert else SummaryDeltas()
+    cursor = mysql_conn.cursor()
+    cursor.execute('SET FOREIGN_KEY_CHECKS = 0')
+
+    migrate_users(access_conn, mysql_conn, upsert)
+    migrate_borrowers(access_conn, mysql_conn, refs, summaries, upsert)
+    migrate_collaterals(access_conn, mysql_conn, refs, upsert)
+    migrate_loans(access_conn, mysql_conn, refs, summaries, upsert)
+    migrate_payments(access_conn, mysql_conn, refs, summaries, upsert)
+    migrate_expenses(access_conn, mysql_conn, refs, upsert)
+
+    cursor.execute('SET FOREIGN_KEY_CHECKS = 1')
+    cursor.close()
+
+    if summaries is not None:
+        summaries.apply(mysql_conn)
+    else:
+        rebuild_summaries(mysql_conn)
+    print('[OK] Summary tables updated\n')
+
+    if photos:
+        extract_photos(access_conn, mysql_conn)
+
+    orphan_counts = refs.write_report()
+    if orphan_counts:
+        print(f'[WARNING] Skipped orphaned rows: {orphan_counts} (see {ORPHAN_REPORT_PATH})\n')
 
     # Create default settings
     create_default_settings(mysql_conn)
 
+def run_shadow_migration(access_conn, mysql_conn, partitioned=False, photos=False, swap=True, force=False):
+    """Build schema and data in the shadow database, verify it there, then swap it in atomically"""
+    from shadow_swap import create_shadow_database, swap_in
+
+    shadow_conn = create_shadow_database(mysql_conn)
+    create_schema(shadow_conn, partitioned)
+    load_data(access_conn, shadow_conn, photos=photos)
+    _, failed = verify_migration(access_conn, shadow_conn)
+    shadow_conn.close()
+
+    if failed and not force:
+        print('[ERROR] Not swapping; the shadow set failed verification and the live tables are unchanged '
+              '(--force to swap anyway)')
+        return False
+    if not swap:
+        print('[INFO] Shadow tables built and verified; swap them in with "coreq swap --swap"')
+        return True
+    return swap_in(mysql_conn, force)
+
+def run_migration(upsert=False, partitioned=False, photos=False, shadow=False, swap=True, force=False,
+                  snapshot=None, evolve=False):
+    """Migrate Access into MySQL (full rebuild, shadow rebuild and swap, or hash-based upsert)"""
+    print('\n' + '=' * 50)
+    print('COMPREHENSIVE ACCESS TO MYSQL MIGRATION' + (' (UPSERT)' if upsert else ' (SHADOW)' if shadow else ''))
+    print('=' * 50 + '\n')
+
+    # Connect
+    access_conn, mysql_conn = connect_to_databases(snapshot)
+
+    if shadow:
+        # The live tables keep serving until the swap
+        swapped = run_shadow_migration(access_conn, mysql_conn, partitioned, photos, swap, force)
+        access_conn.close()
+        mysql_conn.close()
+        if not swapped:
+            sys.exit(1)
+        return
+
+    if upsert:
+        # Re-sync into the existing schema, writing only rows whose hash changed
+        cursor = mysql_conn.cursor()
+        cursor.execute("SHOW TABLES LIKE 'loans'")
+        schema_exists = cursor.fetchone() is not None
+        cursor.close()
+        if not schema_exists:
+            create_schema(mysql_conn, partitioned)
+        elif evolve:
+            # Bring the existing tables up to the declared schema with in-place ALTERs
+            from schema_planner import evolve_schema
+            evolve_schema(mysql_conn, partitioned or None)
+        else:
+            # Schema changes on live tables are only made when asked for
+            from schema_planner import plan_schema, print_plan
+            print('[INFO] Comparing the live schema with the declared schema...')
+            changes, notes = plan_schema(mysql_conn, partitioned or None)
+            print_plan(changes, notes)
+            if changes:
+                print(f'[ERROR] {len(changes)} schema changes planned; review them and rerun with '
+                      f'--evolve-schema to apply them (or use "coreq schema --apply")')
+                access_conn.close()
+                mysql_conn.close()
+                sys.exit(1)
+        create_summary_tables(mysql_conn)
+    else:
+        # Drop all existing tables
+        drop_all_tables(mysql_conn)
+
+        # Create new schema (--partitioned: monthly RANGE partitions on loans/payments)
+        create_schema(mysql_conn, partitioned)
+
+    load_data(access_conn, mysql_conn, upsert, photos)
+
     # Close connections
     access_conn.close()
     mysql_conn.close()
@@ -533,5 +1130,60 @@ def main():
     print('[SUCCESS] MIGRATION COMPLETED SUCCESSFULLY!')
     print('=' * 50)
 
+def main(argv=None):
+    """Main migration function"""
+    parser = argparse.ArgumentParser(description='Comprehensive Access to MySQL migration')
+    parser.add_argument('--upsert', action='store_true',
+                        help='keep existing tables and write only new or changed rows '
+                             '(stops if the live schema differs from the declared one)')
+    parser.add_argument('--evolve-schema', action='store_true',
+                        help='with --upsert: apply the planned in-place schema changes before syncing')
+    parser.add_argument('--partitioned', action='store_true',
+                        help='create loans/payments with monthly RANGE partitions')
+    parser.add_argument('--verify', action='store_true',
+                        help='only compare Access and MySQL row counts')
+    parser.add_argument('--shadow', action='store_true',
+                        help='build everything in <database>__new, verify it, then swap it in with one RENAME')
+    parser.add_argument('--no-swap', action='store_true', help='with --shadow: build and verify only')
+    parser.add_argument('--force', action='store_true', help='with --shadow: swap even if the shadow checks fail')
+    parser.add_argument('--photos', action='store_true',
+                        help='also extract item photos to uploads/items (see item_photos.py)')
+    parser.add_argument('--primary', action='store_true',
+                        help='verify against the primary even if DB_REPLICA_URL is set')
+    parser.add_argument('--snapshot', metavar='DIR', default=None,
+                        help='read Access from a snapshot taken with "coreq snapshot" instead of over ODBC')
+    args = parser.parse_args(argv)
+
+    if args.verify:
+        try:
+            access_conn = open_access_source(args.snapshot)
+            # One read-only snapshot, so counts do not drift while the app keeps writing
+            mysql_conn = coreq_db.connect_snapshot(use_replica=not args.primary)
+        except Exception as e:
+            print(f'[ERROR] Connection failed: {e}')
+            sys.exit(1)
+        _, failed = verify_migration(access_conn, mysql_conn)
+        access_conn.close()
+        mysql_conn.close()
+        if failed:
+            sys.exit(1)
+        return
+
+    if args.shadow and args.upsert:
+        print('[ERROR] Use either --shadow or --upsert')
+        sys.exit(1)
+
+    if args.evolve_schema and not args.upsert:
+        print('[ERROR] --evolve-schema only applies to --upsert')
+        sys.exit(1)
+
+    if args.snapshot and args.photos:
+        # Snapshots leave out OLE columns; photos are read from Access by item_photos.py
+        print('[ERROR] --photos needs the Access file; run "coreq photos" after a --snapshot migration')
+        sys.exit(1)
+
+    run_migration(args.upsert, args.partitioned, args.photos, args.shadow, not args.no_swap, args.force,
+                  args.snapshot, args.evolve_schema)
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,253 @@
+import os
+import json
+import time
+import argparse
+from datetime import datetime, date
+from coreq_db import connect_snapshot
+
+# Rows per keyset page
+PAGE_SIZE = 5000
+
+CACHE_PATH = os.path.join('.cache', 'portfolio_analytics.json')
+
+# Days-past-due buckets: (label, lowest day, highest day or None)
+AGING_BUCKETS = (
+    ('1-7', 1, 7),
+    ('8-30', 8, 30),
+    ('31-90', 31, 90),
+    ('90+', 91, None)
+)
+
+# Portfolio-at-risk thresholds in days past due
+PAR_THRESHOLDS = (1, 7, 30, 90)
+
+CLOSED_STATUSES = ('paid', 'closed')
+
+def stream_table(mysql_conn, table, columns, page_size=PAGE_SIZE, where='', params=()):
+    """Yield rows of a table in primary-key order using keyset pagination"""
+    cursor = mysql_conn.cursor()
+    select = ', '.join(f'`{column}`' for column in columns)
+    condition = f' AND ({where})' if where else ''
+    last_id = 0
+
+    while True:
+        cursor.execute(
+            f'SELECT id, {select} FROM `{table}` WHERE id > %s{condition} ORDER BY id LIMIT %s',
+            (last_id, *params, page_size)
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        for row in rows:
+            yield row
+        last_id = rows[-1][0]
+
+    cursor.close()
+
+def table_versions(mysql_conn):
+    """Cheap fingerprint of loans, payments and collaterals used as the cache key"""
+    cursor = mysql_conn.cursor()
+    versions = {}
+    for table, column in (('loans', 'updatedAt'), ('payments', 'createdAt'), ('collaterals', 'updatedAt')):
+        cursor.execute(f'SELECT COUNT(*), MAX(id), MAX(`{column}`) FROM `{table}`')
+        count, max_id, last_change = cursor.fetchone()
+        versions[table] = [count, max_id, str(last_change) if last_change else None]
+    cursor.close()
+    return versions
+
+def iso_week(value):
+    """ISO week label (YYYY-Www) for a date or datetime"""
+    year, week, _ = value.isocalendar()
+    return f'{year}-W{week:02d}'
+
+def aging_bucket(days_overdue):
+    """Return the aging bucket label for a number of days past due"""
+    for label, low, high in AGING_BUCKETS:
+        if days_overdue >= low and (high is None or days_overdue <= high):
+            return label
+    return 'current'
+
+def compute_portfolio(mysql_conn, as_of=None):
+    """Compute all portfolio metrics in a single pass over payments, collaterals and loans.
+
+    Only loans issued, payments made and collateral sold by the end of as_of
+    are counted, so outstanding balances and aging are as of that day. Loan
+    status and penalties have no history: status counts, the defaulted set
+    and penalty amounts are the current ones.
+    """
+    as_of = as_of or date.today()
+    until = datetime.combine(as_of, datetime.max.time())
+
+    # Build side: payments and collaterals hashed by the key loans join on
+    paid_by_loan = {}
+    collections = {}
+    for _, loan_id, amount, payment_date in stream_table(
+            mysql_conn, 'payments', ('loanId', 'amount', 'paymentDate'),
+            where='paymentDate <= %s', params=(until,)):
+        amount = float(amount or 0)
+        paid_by_loan[loan_id] = paid_by_loan.get(loan_id, 0.0) + amount
+        if payment_date:
+            week = iso_week(payment_date)
+            collections[week] = collections.get(week, 0.0) + amount
+
+    sold_by_collateral = {}
+    recoveries = {}
+    for collateral_id, is_sold, sold_price, sold_date in stream_table(
+            mysql_conn, 'collaterals', ('isSold', 'soldPrice', 'soldDate')):
+        if is_sold and sold_price and (sold_date is None or sold_date <= until):
+            sold_by_collateral[collateral_id] = float(sold_price)
+            if sold_date:
+                week = iso_week(sold_date)
+                recoveries[week] = recoveries.get(week, 0.0) + float(sold_price)
+
+    # Probe side: one pass over loans
+    aging = {label: {'loans': 0, 'outstanding': 0.0} for label in ['current'] + [b[0] for b in AGING_BUCKETS]}
+    par_outstanding = {days: 0.0 for days in PAR_THRESHOLDS}
+    disbursements = {}
+    status_counts = {}
+    total_outstanding = 0.0
+    defaulted_outstanding = 0.0
+    recovered = 0.0
+
+    for (loan_id, collateral_id, amount_issued, date_issued, due_date,
+         status, total_amount, penalties) in stream_table(
+            mysql_conn, 'loans',
+            ('collateralId', 'amountIssued', 'dateIssued', 'dueDate',
+             'status', 'totalAmount', 'penalties'),
+            where='dateIssued <= %s', params=(until,)):
+        status_counts[status] = status_counts.get(status, 0) + 1
+
+        if date_issued:
+            week = iso_week(date_issued)
+            disbursements[week] = disbursements.get(week, 0.0) + float(amount_issued or 0)
+
+        due = float(total_amount or 0) + float(penalties or 0)
+        outstanding = max(due - paid_by_loan.get(loan_id, 0.0), 0.0)
+
+        if status == 'defaulted':
+            defaulted_outstanding += outstanding
+            recovered += sold_by_collateral.get(collateral_id, 0.0)
+
+        # A loan closed since as_of was still open then if it had a balance left
+        if (status in CLOSED_STATUSES and as_of >= date.today()) or outstanding <= 0:
+            continue
+
+        total_outstanding += outstanding
+        days_overdue = (as_of - due_date.date()).days if due_date else 0
+        bucket = aging_bucket(days_overdue)
+        aging[bucket]['loans'] += 1
+        aging[bucket]['outstanding'] += outstanding
+
+        for days in PAR_THRESHOLDS:
+            if days_overdue >= days:
+                par_outstanding[days] += outstanding
+
+    weeks = sorted(set(disbursements) | set(collections) | set(recoveries))
+    return {
+        'asOf': as_of.isoformat(),
+        'statusCounts': status_counts,
+        'totalOutstanding': round(total_outstanding, 2),
+        'aging': {
+            label: {'loans': bucket['loans'], 'outstanding': round(bucket['outstanding'], 2)}
+            for label, bucket in aging.items()
+        },
+        'portfolioAtRisk': {
+            f'PAR{days}': round(par_outstanding[days] / total_outstanding, 4) if total_outstanding else 0.0
+            for days in PAR_THRESHOLDS
+        },
+        'weekly': [
+            {
+                'week': week,
+                'disbursed': round(disbursements.get(week, 0.0), 2),
+                'collected': round(collections.get(week, 0.0), 2),
+                'recovered': round(recoveries.get(week, 0.0), 2)
+            }
+            for week in weeks
+        ],
+        'recovery': {
+            'defaultedOutstanding': round(defaulted_outstanding, 2),
+            'soldCollateralProceeds': round(recovered, 2),
+            'recoveryRate': round(recovered / defaulted_outstanding, 4) if defaulted_outstanding else 0.0
+        }
+    }
+
+def load_cached(versions, as_of):
+    """Return the cached report if the source tables have not changed since it was built"""
+    if not os.path.exists(CACHE_PATH):
+        return None
+    with open(CACHE_PATH, encoding='utf-8') as f:
+        cached = json.load(f)
+    if cached.get('versions') != versions or cached.get('report', {}).get('asOf') != as_of.isoformat():
+        return None
+    return cached['report']
+
+def save_cache(versions, report):
+    """Store a report together with the table versions it was computed from"""
+    os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+    with open(CACHE_PATH, 'w', encoding='utf-8') as f:
+        json.dump({'versions': versions, 'report': report}, f, indent=2)
+
+def get_portfolio_report(mysql_conn, as_of=None, use_cache=True):
+    """Portfolio report, served from cache when loans/payments/collaterals are unchanged"""
+    as_of = as_of or date.today()
+    versions = table_versions(mysql_conn)
+
+    if use_cache:
+        report = load_cached(versions, as_of)
+        if report is not None:
+            return report, True
+
+    report = compute_portfolio(mysql_conn, as_of)
+    save_cache(versions, report)
+    return report, False
+
+def print_report(report):
+    """Print the portfolio report"""
+    print(f'\nPortfolio as of {report["asOf"]}')
+    print('=' * 50)
+    print(f'Outstanding: {report["totalOutstanding"]:,.2f}')
+
+    print('\nAging (days past due):')
+    for label, bucket in report['aging'].items():
+        print(f'  {label:>8}: {bucket["loans"]:>6} loans  {bucket["outstanding"]:>14,.2f}')
+
+    print('\nPortfolio at risk:')
+    for label, ratio in report['portfolioAtRisk'].items():
+        print(f'  {label}: {ratio * 100:.2f}%')
+
+    print('\nLast 8 weeks (disbursed / collected / recovered):')
+    for week in report['weekly'][-8:]:
+        print(f'  {week["week"]}: {week["disbursed"]:>12,.2f} {week["collected"]:>12,.2f} {week["recovered"]:>12,.2f}')
+
+    recovery = report['recovery']
+    print(f'\nRecovery from sold collateral: {recovery["soldCollateralProceeds"]:,.2f} '
+          f'of {recovery["defaultedOutstanding"]:,.2f} defaulted ({recovery["recoveryRate"] * 100:.2f}%)')
+
+def main(argv=None):
+    """Main function"""
+    parser = argparse.ArgumentParser(description='One-pass portfolio analytics')
+    parser.add_argument('--as-of',
+                        help='report date (YYYY-MM-DD, default today); loans, payments and sales after it '
+                             'are left out, but status and penalties are the current ones')
+    parser.add_argument('--no-cache', action='store_true', help='always recompute')
+    parser.add_argument('--json', metavar='PATH', help='also write the report as JSON')
+    args = parser.parse_args(argv)
+
+    as_of = datetime.strptime(args.as_of, '%Y-%m-%d').date() if args.as_of else None
+
+    mysql_conn = connect_snapshot()
+    started = time.perf_counter()
+    report, from_cache = get_portfolio_report(mysql_conn, as_of, not args.no_cache)
+    mysql_conn.close()
+
+    print_report(report)
+    source = 'cache' if from_cache else 'computed'
+    print(f'\n[INFO] {source} in {time.perf_counter() - started:.2f}s')
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f'[OK] Report written to {args.json}')
+
+if __name__ == '__main__':
+    main()
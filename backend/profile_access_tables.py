@@ -0,0 +1,204 @@
+import sys
+import json
+import math
+import time
+import hashlib
+import argparse
+from datetime import datetime
+import coreq_db
+
+# Rows pulled from ODBC per round trip
+FETCH_SIZE = 1000
+
+# HyperLogLog precision: 2^12 registers, ~1.6% standard error
+HLL_PRECISION = 12
+
+# Candidates tracked per column for the top-values summary (Misra-Gries)
+TOP_CAPACITY = 64
+TOP_VALUES = 5
+
+class HyperLogLog:
+    """Fixed-memory distinct-count estimator"""
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(self.size)
+
+    def add(self, value):
+        digest = hashlib.blake2b(repr(value).encode('utf-8'), digest_size=8).digest()
+        x = int.from_bytes(digest, 'big')
+        index = x >> (64 - self.precision)
+        rest = (x << self.precision) & 0xFFFFFFFFFFFFFFFF
+        rank = 64 - self.precision + 1 if rest == 0 else (65 - rest.bit_length())
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+class ColumnProfile:
+    """Streaming statistics for one column"""
+
+    def __init__(self, name, type_name, column_size):
+        self.name = name
+        self.type_name = type_name
+        self.column_size = column_size
+        self.nulls = 0
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.max_length = None
+        self.hll = HyperLogLog()
+        self.top = {}
+
+    def add(self, value):
+        self.count += 1
+        if value is None:
+            self.nulls += 1
+            return
+
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            # Binary columns (ITEM PHOTO): only size and cardinality are useful
+            length = len(value)
+            self.max_length = length if self.max_length is None else max(self.max_length, length)
+            self.hll.add(hashlib.blake2b(bytes(value), digest_size=16).digest())
+            return
+
+        if isinstance(value, str):
+            length = len(value)
+            self.max_length = length if self.max_length is None else max(self.max_length, length)
+
+        self.hll.add(value)
+        self._track_range(value)
+        self._track_top(value)
+
+    def _track_range(self, value):
+        try:
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+        except TypeError:
+            # Mixed types in one Access column; fall back to string ordering
+            self.min = min(str(self.min), str(value))
+            self.max = max(str(self.max), str(value))
+
+    def _track_top(self, value):
+        top = self.top
+        if value in top:
+            top[value] += 1
+        elif len(top) < TOP_CAPACITY:
+            top[value] = 1
+        else:
+            for key in list(top):
+                top[key] -= 1
+                if top[key] == 0:
+                    del top[key]
+
+    def report(self):
+        top = sorted(self.top.items(), key=lambda item: item[1], reverse=True)[:TOP_VALUES]
+        return {
+            'name': self.name,
+            'type': self.type_name,
+            'declaredSize': self.column_size,
+            'nullRatio': round(self.nulls / self.count, 4) if self.count else None,
+            'distinctEstimate': self.hll.count(),
+            'min': self.min,
+            'max': self.max,
+            'maxLength': self.max_length,
+            'topValues': [{'value': value, 'count': count} for value, count in top]
+        }
+
+def connect_to_access():
+    """Connect to the Access database"""
+    try:
+        return coreq_db.connect_access()
+    except RuntimeError as e:
+        print(f'[ERROR] {e}')
+        sys.exit(1)
+
+def get_access_tables(access_conn):
+    """Get list of tables from Access database"""
+    cursor = access_conn.cursor()
+    tables = [t.table_name for t in cursor.tables(tableType='TABLE')
+              if not t.table_name.startswith('MSys')]
+    cursor.close()
+    return tables
+
+def profile_table(access_conn, table, sample=None):
+    """Stream one table once and profile every column"""
+    cursor = access_conn.cursor()
+    top = f'TOP {int(sample)} ' if sample else ''
+    cursor.execute(f'SELECT {top}* FROM [{table}]')
+
+    columns = [
+        ColumnProfile(col[0], getattr(col[1], '__name__', str(col[1])), col[3])
+        for col in cursor.description
+    ]
+
+    rows = 0
+    started = time.perf_counter()
+    while True:
+        batch = cursor.fetchmany(FETCH_SIZE)
+        if not batch:
+            break
+        for row in batch:
+            for column, value in zip(columns, row):
+                column.add(value)
+        rows += len(batch)
+
+    cursor.close()
+    return {
+        'table': table,
+        'rows': rows,
+        'sampled': bool(sample),
+        'seconds': round(time.perf_counter() - started, 3),
+        'columns': [column.report() for column in columns]
+    }
+
+def main(argv=None):
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Profile every column of every Access table')
+    parser.add_argument('tables', nargs='*', help='tables to profile (default: all)')
+    parser.add_argument('--sample', type=int, default=None,
+                        help='profile only the first N rows of each table')
+    parser.add_argument('--output', default='access_profile.json',
+                        help='JSON report path (default access_profile.json)')
+    args = parser.parse_args(argv)
+
+    access_conn = connect_to_access()
+    tables = args.tables or get_access_tables(access_conn)
+
+    report = {
+        'source': coreq_db.access_db_path(),
+        'generatedAt': datetime.now().isoformat(timespec='seconds'),
+        'tables': []
+    }
+
+    print(f'\n[INFO] Profiling {len(tables)} tables...')
+    for table in tables:
+        try:
+            profile = profile_table(access_conn, table, args.sample)
+            report['tables'].append(profile)
+            print(f'  [OK] {table}: {profile["rows"]} rows, '
+                  f'{len(profile["columns"])} columns in {profile["seconds"]}s')
+        except Exception as e:
+            print(f'  [ERROR] Could not profile {table}: {e}')
+
+    access_conn.close()
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, default=str)
+
+    print(f'\n[SUCCESS] Profile written to {args.output}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+import os
+import sys
+import json
+import argparse
+from datetime import datetime
+from decimal import Decimal
+import coreq_db
+from migrate_final import KeySet, ORPHAN_REPORT_PATH
+
+RECONCILE_REPORT_PATH = 'reconciliation.json'
+
+# Differences below this are rounding, not money
+TOLERANCE = Decimal('0.01')
+
+# Money measures reconciled between the two databases. Each side names the
+# FROM clause, row filter and the id/amount/date/borrower expressions; Year()
+# and Month() are valid in both Access SQL and MySQL, so the aggregates are
+# computed by each database and only the grouped totals are transferred.
+MEASURES = {
+    'issued': {
+        'label': 'Amount issued',
+        'access': {
+            'source': '[LOANS]', 'where': '',
+            'id': '[LOANID]', 'amount': '[AMOUNT ISSUED]', 'date': '[DATE ISSUED]', 'borrower': '[ID NUMBER]'
+        },
+        'mysql': {
+            'source': 'loans', 'where': '',
+            'id': 'id', 'amount': 'amountIssued', 'date': 'dateIssued', 'borrower': 'borrowerId'
+        }
+    },
+    'payments': {
+        'label': 'Payments received',
+        'access': {
+            'source': '[PAYMENT TABLE] AS p LEFT JOIN [LOANS] AS l ON p.[LOANID] = l.[LOANID]', 'where': '',
+            'id': 'p.[PAYMENTID]', 'amount': 'p.[AMOUNT PAID]', 'date': 'p.[DATE PAID]', 'borrower': 'l.[ID NUMBER]'
+        },
+        'mysql': {
+            'source': 'payments p LEFT JOIN loans l ON l.id = p.loanId', 'where': '',
+            'id': 'p.id', 'amount': 'p.amount', 'date': 'p.paymentDate', 'borrower': 'l.borrowerId'
+        }
+    },
+    'expenses': {
+        'label': 'Expenses',
+        'access': {
+            'source': '[EXPENDITURE]', 'where': '',
+            'id': '[ID]', 'amount': '[AMOUNT]', 'date': '[DATE]', 'borrower': None
+        },
+        'mysql': {
+            'source': 'expenses', 'where': '',
+            'id': 'id', 'amount': 'amount', 'date': '`date`', 'borrower': None
+        }
+    },
+    'proceeds': {
+        'label': 'Sold collateral proceeds',
+        'access': {
+            'source': '[defaulted items] AS d LEFT JOIN [ITEMS] AS i ON d.[ITEMID] = i.[ITEMID]',
+            'where': 'd.[SOLD] <> 0',
+            'id': 'd.[ITEMID]', 'amount': 'd.[AMOUNT]', 'date': 'd.[DATE SOLD]', 'borrower': 'i.[ID NUMBER]'
+        },
+        'mysql': {
+            'source': 'collaterals', 'where': 'isSold = 1',
+            'id': 'id', 'amount': 'soldPrice', 'date': 'soldDate', 'borrower': 'borrowerId'
+        }
+    }
+}
+
+DIMENSIONS = ('month', 'borrower')
+
+# Parameter placeholder per side
+PLACEHOLDERS = {'access': '?', 'mysql': '%s'}
+
+def money(value):
+    """Decimal rounded to cents (Access CURRENCY and MySQL DECIMAL both arrive as Decimal)"""
+    return Decimal(str(value or 0)).quantize(Decimal('0.01'))
+
+def load_borrower_remap(path=ORPHAN_REPORT_PATH):
+    """Merged client ID -> surviving borrower ID, from the last migration's report"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f).get('borrowerRemap', {})
+
+def group_key(dimension, values, remap=None):
+    """Normalize a group's key so both sides compare equal"""
+    if dimension == 'month':
+        year, month = values
+        return f'{int(year):04d}-{int(month):02d}' if year else 'no date'
+    borrower = KeySet._normalize(values[0])
+    if borrower is None:
+        return 'no borrower'
+    if remap:
+        borrower = KeySet._normalize(remap.get(str(borrower), borrower))
+    return str(borrower)
+
+def group_sql(spec, dimension):
+    """Grouped COUNT/SUM statement for one side"""
+    if dimension == 'month':
+        columns = f'Year({spec["date"]}), Month({spec["date"]})'
+    else:
+        columns = spec['borrower']
+    where = f' WHERE {spec["where"]}' if spec['where'] else ''
+    return (f'SELECT {columns}, COUNT(*), SUM({spec["amount"]}) '
+            f'FROM {spec["source"]}{where} GROUP BY {columns}')
+
+def aggregate(conn, side, measure, dimension, remap=None):
+    """{group key: [count, amount]} computed by the database itself"""
+    spec = MEASURES[measure][side]
+    cursor = conn.cursor()
+    cursor.execute(group_sql(spec, dimension))
+    width = 2 if dimension == 'month' else 1
+
+    groups = {}
+    for row in cursor.fetchall():
+        key = group_key(dimension, row[:width], remap)
+        # Merged clients fold into their survivor's group
+        entry = groups.setdefault(key, [0, Decimal('0.00')])
+        entry[0] += row[width]
+        entry[1] += money(row[width + 1])
+
+    cursor.close()
+    return groups
+
+def diff_groups(access_groups, mysql_groups):
+    """Groups whose count or amount differ, largest amount difference first"""
+    mismatches = []
+    for key in sorted(set(access_groups) | set(mysql_groups)):
+        a_count, a_amount = access_groups.get(key, (0, Decimal('0.00')))
+        m_count, m_amount = mysql_groups.get(key, (0, Decimal('0.00')))
+        if a_count != m_count or abs(a_amount - m_amount) >= TOLERANCE:
+            mismatches.append({
+                'group': key,
+                'accessCount': a_count, 'mysqlCount': m_count,
+                'accessAmount': a_amount, 'mysqlAmount': m_amount,
+                'difference': m_amount - a_amount
+            })
+    mismatches.sort(key=lambda m: abs(m['difference']), reverse=True)
+    return mismatches
+
+def reconcile(access_conn, mysql_conn, measures=None, dimensions=DIMENSIONS):
+    """Compare every measure by every dimension; returns the report"""
+    remap = load_borrower_remap()
+    report = {'generatedAt': datetime.now().isoformat(timespec='seconds'), 'measures': {}}
+
+    for measure in measures or MEASURES:
+        label = MEASURES[measure]['label']
+        result = report['measures'][measure] = {'label': label}
+        print(f'\n[RECONCILE] {label}')
+
+        for dimension in dimensions:
+            if dimension == 'borrower' and MEASURES[measure]['access']['borrower'] is None:
+                continue
+            try:
+                access_groups = aggregate(access_conn, 'access', measure, dimension, remap)
+                mysql_groups = aggregate(mysql_conn, 'mysql', measure, dimension)
+            except Exception as e:
+                print(f'  [ERROR] by {dimension}: {e}')
+                result[dimension] = {'error': str(e)}
+                continue
+
+            mismatches = diff_groups(access_groups, mysql_groups)
+            access_total = sum((amount for _, amount in access_groups.values()), Decimal('0.00'))
+            mysql_total = sum((amount for _, amount in mysql_groups.values()), Decimal('0.00'))
+            result[dimension] = {
+                'groups': len(set(access_groups) | set(mysql_groups)),
+                'accessTotal': access_total,
+                'mysqlTotal': mysql_total,
+                'mismatches': mismatches
+            }
+
+            status = '[OK]' if not mismatches else '[WARNING]'
+            print(f'  {status} by {dimension}: {result[dimension]["groups"]} groups, '
+                  f'Access {access_total:,.2f} / MySQL {mysql_total:,.2f}, {len(mismatches)} mismatched')
+            for mismatch in mismatches[:5]:
+                print(f'      {mismatch["group"]:<14} count {mismatch["accessCount"]}/{mismatch["mysqlCount"]}  '
+                      f'amount {mismatch["accessAmount"]:,.2f}/{mismatch["mysqlAmount"]:,.2f}')
+
+    return report
+
+def drill_rows(conn, side, measure, dimension, key, remap=None):
+    """{row id: (amount, date, borrower)} for the rows of one group"""
+    spec = MEASURES[measure][side]
+    placeholder = PLACEHOLDERS[side]
+    conditions = [spec['where']] if spec['where'] else []
+    params = []
+
+    if dimension == 'month':
+        if key == 'no date':
+            conditions.append(f'{spec["date"]} IS NULL')
+        else:
+            year, month = key.split('-')
+            conditions.append(f'Year({spec["date"]}) = {placeholder} AND Month({spec["date"]}) = {placeholder}')
+            params.extend((int(year), int(month)))
+    elif key == 'no borrower':
+        conditions.append(f'{spec["borrower"]} IS NULL')
+    else:
+        # Merged clients' rows belong to the survivor's group on the Access side
+        ids = [key] + [dropped for dropped, survivor in (remap or {}).items()
+                       if str(KeySet._normalize(survivor)) == key]
+        conditions.append(f'{spec["borrower"]} IN ({", ".join([placeholder] * len(ids))})')
+        params.extend(int(value) if str(value).isdigit() else value for value in ids)
+
+    borrower = spec['borrower'] or 'NULL'
+    cursor = conn.cursor()
+    cursor.execute(
+        f'SELECT {spec["id"]}, {spec["amount"]}, {spec["date"]}, {borrower} '
+        f'FROM {spec["source"]} WHERE {" AND ".join(conditions)}',
+        params
+    )
+    rows = {KeySet._normalize(row[0]): (money(row[1]), row[2], KeySet._normalize(row[3]))
+            for row in cursor.fetchall()}
+    cursor.close()
+    return rows
+
+def drill_down(access_conn, mysql_conn, measure, dimension, key):
+    """Row-level differences inside one mismatching group"""
+    remap = load_borrower_remap()
+    access_rows = drill_rows(access_conn, 'access', measure, dimension, key, remap)
+    mysql_rows = drill_rows(mysql_conn, 'mysql', measure, dimension, key)
+
+    differences = []
+    for row_id in sorted(set(access_rows) | set(mysql_rows), key=str):
+        access_row = access_rows.get(row_id)
+        mysql_row = mysql_rows.get(row_id)
+        if access_row is None:
+            differences.append({'id': row_id, 'issue': 'only in MySQL', 'mysql': mysql_row})
+        elif mysql_row is None:
+            differences.append({'id': row_id, 'issue': 'only in Access', 'access': access_row})
+        elif abs(access_row[0] - mysql_row[0]) >= TOLERANCE:
+            differences.append({'id': row_id, 'issue': 'amount differs', 'access': access_row, 'mysql': mysql_row})
+
+    print(f'\n[DRILL] {MEASURES[measure]["label"]} by {dimension} = {key}: '
+          f'{len(access_rows)} Access rows, {len(mysql_rows)} MySQL rows, {len(differences)} differences')
+    for difference in differences:
+        detail = ', '.join(f'{side}={difference[side][0]} ({difference[side][1]})'
+                           for side in ('access', 'mysql') if side in difference)
+        print(f'  {difference["id"]}: {difference["issue"]} {detail}')
+    return differences
+
+def main(argv=None):
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Reconcile money totals between Access and MySQL')
+    parser.add_argument('--measure', action='append', choices=MEASURES,
+                        help='measure to reconcile (repeatable, default: all)')
+    parser.add_argument('--by', choices=DIMENSIONS, default=None,
+                        help='reconcile by month or by borrower only (default: both)')
+    parser.add_argument('--drill', metavar='GROUP',
+                        help='list row-level differences for one group (needs one --measure and --by)')
+    parser.add_argument('--source', default=None,
+                        help='Access file, or a SQLite stand-in (.db/.sqlite) with the same tables')
+    parser.add_argument('--output', default=RECONCILE_REPORT_PATH, help='JSON report path')
+    parser.add_argument('--primary', action='store_true',
+                        help='read MySQL from the primary even if DB_REPLICA_URL is set')
+    args = parser.parse_args(argv)
+
+    if args.drill and (not args.measure or len(args.measure) != 1 or not args.by):
+        print('[ERROR] --drill needs exactly one --measure and --by')
+        sys.exit(1)
+
+    access_conn = coreq_db.open_source(args.source)
+    mysql_conn = coreq_db.connect_snapshot(use_replica=not args.primary)
+
+    if args.drill:
+        drill_down(access_conn, mysql_conn, args.measure[0], args.by, args.drill)
+    else:
+        dimensions = (args.by,) if args.by else DIMENSIONS
+        report = reconcile(access_conn, mysql_conn, args.measure, dimensions)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, default=str)
+
+        mismatched = sum(len(result[dimension].get('mismatches', []))
+                         for result in report['measures'].values()
+                         for dimension in DIMENSIONS if dimension in result)
+        if mismatched:
+            print(f'\n[WARNING] {mismatched} mismatched groups (see {args.output}; drill in with --drill GROUP)')
+        else:
+            print(f'\n[SUCCESS] All totals reconcile (report: {args.output})')
+
+    access_conn.close()
+    mysql_conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+from decimal import Decimal
+from coreq_db import connect_mysql
+from loan_pricing import load_pricing
+from loan_summaries import SummaryDeltas, create_summary_tables
+from stage_profiler import stage
+
+# Loans per keyset page (one bulk UPDATE and one commit per page)
+PAGE_SIZE = 1000
+
+# Loans re-priced when no --status is given
+DEFAULT_STATUSES = ('active', 'due', 'pastDue')
+
+REPRICING_REPORT_PATH = 'repricing_report.json'
+
+LOAN_PAGE_SQL = '''
+    SELECT l.id, l.status, l.amountIssued, l.loanPeriod, l.interestRate, l.totalAmount,
+           l.dueDate, l.gracePeriodEnd, COALESCE(l.penalties, 0), COALESCE(b.location, ''),
+           COALESCE((SELECT SUM(p.amount) FROM payments p WHERE p.loanId = l.id), 0)
+    FROM loans l
+    LEFT JOIN borrowers b ON b.id = l.borrowerId
+    WHERE l.id > %s{filters}
+    ORDER BY l.id
+    LIMIT %s
+'''
+
+def selection_filters(statuses=None, since=None, until=None, ids=None, include_negotiable=False):
+    """Extra WHERE conditions and parameters for the selected loan set"""
+    conditions = []
+    params = []
+    if statuses:
+        conditions.append(f'l.status IN ({", ".join(["%s"] * len(statuses))})')
+        params.extend(statuses)
+    if since:
+        conditions.append('l.dateIssued >= %s')
+        params.append(since)
+    if until:
+        conditions.append('l.dateIssued < %s')
+        params.append(until)
+    if ids:
+        conditions.append(f'l.id IN ({", ".join(["%s"] * len(ids))})')
+        params.extend(ids)
+    if not include_negotiable:
+        # Negotiable loans carry an admin-set rate, not a settings tier
+        conditions.append('COALESCE(l.isNegotiable, 0) = 0')
+    return ''.join(f' AND {condition}' for condition in conditions), params
+
+def outstanding(total, penalties, paid):
+    return max(Decimal(total) + Decimal(penalties) - Decimal(paid), Decimal('0'))
+
+def reprice_page(rows, pricing):
+    """Changes for one page: [(id, status, location, old, new, old outstanding, new outstanding)]"""
+    changes = []
+    for (loan_id, status, amount_issued, loan_period, rate, total, due_date, grace_end,
+         penalties, location, paid) in rows:
+        new_rate = pricing.rate(loan_period)
+        new_total = pricing.total(amount_issued, new_rate)
+        new_grace_end = pricing.grace_period_end(due_date)
+
+        if (Decimal(rate) == new_rate and Decimal(total) == new_total
+                and grace_end == new_grace_end):
+            continue
+
+        changes.append((
+            loan_id, status, location,
+            {'interestRate': Decimal(rate), 'totalAmount': Decimal(total), 'gracePeriodEnd': grace_end},
+            {'interestRate': new_rate, 'totalAmount': new_total, 'gracePeriodEnd': new_grace_end},
+            outstanding(total, penalties, paid),
+            outstanding(new_total, penalties, paid)
+        ))
+    return changes
+
+def write_page(cursor, changes):
+    """One CASE-based UPDATE for every changed loan in the page"""
+    cases = ' '.join(['WHEN %s THEN %s'] * len(changes))
+    keys = ', '.join(['%s'] * len(changes))
+    params = []
+    for column in ('interestRate', 'totalAmount', 'gracePeriodEnd'):
+        for loan_id, _, _, _, new, _, _ in changes:
+            params.extend((loan_id, new[column]))
+    params.extend(change[0] for change in changes)
+
+    cursor.execute(
+        f'UPDATE loans SET interestRate = CASE id {cases} END, '
+        f'totalAmount = CASE id {cases} END, '
+        f'gracePeriodEnd = CASE id {cases} END '
+        f'WHERE id IN ({keys})',
+        params
+    )
+
+@stage('reprice', phase='convert')
+def reprice_loans(mysql_conn, filters='', filter_params=(), page_size=PAGE_SIZE, dry_run=False):
+    """Recompute derived loan fields from settings in keyset pages; returns the report"""
+    pricing = load_pricing(mysql_conn)
+    create_summary_tables(mysql_conn)
+    summaries = SummaryDeltas()
+    cursor = mysql_conn.cursor()
+    sql = LOAN_PAGE_SQL.format(filters=filters)
+
+    report = {
+        'generatedAt': datetime.now().isoformat(timespec='seconds'),
+        'dryRun': dry_run,
+        'settings': {'interestRates': pricing.interest_rates, 'gracePeriod': pricing.grace_period_days},
+        'scanned': 0,
+        'changed': 0,
+        'totalAmountDelta': Decimal('0.00'),
+        'loans': []
+    }
+
+    print(f'[INFO] Re-pricing with tiers {pricing.interest_rates}, grace period {pricing.grace_period_days} days')
+    started = time.perf_counter()
+    last_id = 0
+    while True:
+        with stage('fetch'):
+            cursor.execute(sql, (last_id, *filter_params, page_size))
+            rows = cursor.fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        report['scanned'] += len(rows)
+
+        changes = reprice_page(rows, pricing)
+        for loan_id, status, location, old, new, old_outstanding, new_outstanding in changes:
+            report['loans'].append({'id': loan_id, 'status': status, 'old': old, 'new': new})
+            report['totalAmountDelta'] += new['totalAmount'] - old['totalAmount']
+            summaries.outstanding_changed(loan_id, status, location, old_outstanding, new_outstanding)
+        report['changed'] += len(changes)
+
+        if changes and not dry_run:
+            with stage('write'):
+                write_page(cursor, changes)
+            # Commits the page and its summary-table deltas together
+            with stage('commit'):
+                summaries.apply(mysql_conn)
+
+        print(f'  [PAGE] through id {last_id}: {len(rows)} scanned, {len(changes)} re-priced')
+
+    cursor.close()
+    elapsed = time.perf_counter() - started
+    report['seconds'] = round(elapsed, 3)
+    print(f'[INFO] {report["scanned"]} loans scanned, {report["changed"]} re-priced in {elapsed:.2f}s '
+          f'(total amount {report["totalAmountDelta"]:+,.2f})')
+    return report
+
+def main(argv=None):
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Re-price loans from the current settings')
+    parser.add_argument('--status', action='append',
+                        help=f'loan status to re-price (repeatable, default: {", ".join(DEFAULT_STATUSES)})')
+    parser.add_argument('--all', action='store_true', help='re-price loans of every status')
+    parser.add_argument('--since', help='only loans issued on or after this date (YYYY-MM-DD)')
+    parser.add_argument('--until', help='only loans issued before this date (YYYY-MM-DD)')
+    parser.add_argument('--id', type=int, action='append', dest='ids', help='only this loan (repeatable)')
+    parser.add_argument('--include-negotiable', action='store_true',
+                        help='also re-price negotiable loans (their custom rate is replaced)')
+    parser.add_argument('--page-size', type=int, default=PAGE_SIZE, help='loans per keyset page')
+    parser.add_argument('--dry-run', action='store_true', help='write the diff report without updating loans')
+    parser.add_argument('--output', default=REPRICING_REPORT_PATH, help='JSON diff report path')
+    args = parser.parse_args(argv)
+
+    if args.all and args.status:
+        print('[ERROR] Use either --all or --status')
+        sys.exit(1)
+
+    statuses = None if args.all else (args.status or list(DEFAULT_STATUSES))
+    filters, params = selection_filters(statuses, args.since, args.until, args.ids, args.include_negotiable)
+
+    mysql_conn = connect_mysql()
+    report = reprice_loans(mysql_conn, filters, params, args.page_size, args.dry_run)
+    mysql_conn.close()
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, default=str)
+
+    if args.dry_run:
+        print(f'[INFO] Dry run: {report["changed"]} loans would change (see {args.output})')
+    else:
+        print(f'[SUCCESS] Re-priced {report["changed"]} loans (see {args.output})')
+
+if __name__ == '__main__':
+    main()
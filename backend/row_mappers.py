@@ -0,0 +1,77 @@
+import re
+from collections import namedtuple
+from operator import itemgetter
+
+class ColumnDriftError(RuntimeError):
+    """A source table no longer has a column a mapper expects"""
+
+# (record name, attributes) -> record type, so each table's type is built once
+_record_types = {}
+
+def normalize_column(name):
+    """Compare column names ignoring case, spaces and punctuation ('Emergency No.' == 'EMERGENCY NO')"""
+    return re.sub(r'[^0-9A-Z]', '', str(name).upper())
+
+def record_type(name, attributes):
+    """Tuple-based record type (namedtuple: no per-row __dict__, C-level field access)"""
+    key = (name, tuple(attributes))
+    if key not in _record_types:
+        _record_types[key] = namedtuple(name, attributes)
+    return _record_types[key]
+
+def compile_mapper(description, name, fields):
+    """Resolve source columns to positions once and return a row -> record function.
+
+    fields is a sequence of (attribute, column) pairs in record order; column
+    may be a tuple of accepted spellings. Raises ColumnDriftError if any column
+    is missing, so a renamed or dropped source column stops the run instead of
+    shifting values into the wrong fields.
+    """
+    positions = {}
+    for index, column in enumerate(description):
+        positions.setdefault(normalize_column(column[0]), index)
+
+    indexes = []
+    missing = []
+    for attribute, columns in fields:
+        spellings = (columns,) if isinstance(columns, str) else columns
+        for spelling in spellings:
+            if normalize_column(spelling) in positions:
+                indexes.append(positions[normalize_column(spelling)])
+                break
+        else:
+            missing.append(spellings[0])
+
+    if missing:
+        available = ', '.join(str(column[0]) for column in description)
+        raise ColumnDriftError(f'{name}: missing source columns {missing} (available: {available})')
+
+    record = record_type(name, [attribute for attribute, _ in fields])
+    new = tuple.__new__
+
+    if len(indexes) == 1:
+        index = indexes[0]
+
+        def map_row(row):
+            return new(record, (row[index],))
+    else:
+        getter = itemgetter(*indexes)
+
+        def map_row(row):
+            return new(record, getter(row))
+
+    map_row.record = record
+    return map_row
+
+def select_columns(cursor, table, exclude=()):
+    """SELECT of every column of an Access table except excluded ones (e.g. OLE photo blobs)"""
+    cursor.execute(f'SELECT * FROM [{table}] WHERE 1 = 0')
+    cursor.fetchall()
+    skipped = {normalize_column(column) for column in exclude}
+    columns = [column[0] for column in cursor.description if normalize_column(column[0]) not in skipped]
+    return f'SELECT {", ".join(f"[{column}]" for column in columns)} FROM [{table}]'
+
+def fetch_records(cursor, name, fields):
+    """Map every remaining row of an executed cursor to records"""
+    mapper = compile_mapper(cursor.description, name, fields)
+    return list(map(mapper, cursor.fetchall()))
@@ -0,0 +1,392 @@
+import io
+import sys
+import argparse
+from collections import namedtuple
+from contextlib import redirect_stdout
+from coreq_db import connect_mysql
+
+# The declared schema is built here, introspected, and dropped again
+SCRATCH_SUFFIX = '__schema_plan'
+
+# MySQL refuses an ALGORITHM it cannot honour with these errors; the next one is tried
+ALGORITHM_NOT_SUPPORTED = (1845, 1846)
+
+# Bytes per character, for VARCHAR length-prefix changes (1 byte up to 255 bytes, then 2)
+CHARSET_BYTES = {'utf8mb4': 4, 'utf8mb3': 3, 'utf8': 3, 'latin1': 1, 'ascii': 1, 'binary': 1}
+
+Column = namedtuple('Column', 'name position type nullable default extra charset collation')
+ForeignKey = namedtuple('ForeignKey', 'name columns ref_table ref_columns on_delete on_update')
+
+# algorithms are tried in order; rebuild means the table's rows are copied
+Change = namedtuple('Change', 'table operation algorithms rebuild description')
+
+class TableSchema:
+    """Columns, indexes, foreign keys and partitioning of one table"""
+
+    def __init__(self, name):
+        self.name = name
+        self.columns = {}
+        self.primary = ()
+        # (unique, columns) -> index name
+        self.indexes = {}
+        self.foreign_keys = []
+        self.partitioned = False
+
+def introspect(cursor, database):
+    """Read every table of a database from information_schema"""
+    tables = {}
+    cursor.execute('''
+        SELECT TABLE_NAME, COLUMN_NAME, ORDINAL_POSITION, COLUMN_TYPE, IS_NULLABLE,
+               COLUMN_DEFAULT, EXTRA, CHARACTER_SET_NAME, COLLATION_NAME
+        FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = %s
+        ORDER BY TABLE_NAME, ORDINAL_POSITION
+    ''', (database,))
+    for table, name, position, column_type, nullable, default, extra, charset, collation in cursor.fetchall():
+        schema = tables.setdefault(table, TableSchema(table))
+        schema.columns[name] = Column(name, position, column_type.lower(), nullable == 'YES',
+                                      default, (extra or '').strip(), charset, collation)
+
+    cursor.execute('''
+        SELECT TABLE_NAME, INDEX_NAME, NON_UNIQUE, COLUMN_NAME, SUB_PART
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = %s
+        ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX
+    ''', (database,))
+    parts = {}
+    for table, index, non_unique, column, sub_part in cursor.fetchall():
+        entry = parts.setdefault((table, index), [not non_unique, []])
+        entry[1].append(f'{column}({sub_part})' if sub_part else column)
+    for (table, index), (unique, columns) in parts.items():
+        if table not in tables:
+            continue
+        if index == 'PRIMARY':
+            tables[table].primary = tuple(columns)
+        else:
+            tables[table].indexes.setdefault((unique, tuple(columns)), index)
+
+    cursor.execute('''
+        SELECT k.TABLE_NAME, k.CONSTRAINT_NAME, k.COLUMN_NAME, k.REFERENCED_TABLE_NAME,
+               k.REFERENCED_COLUMN_NAME, r.DELETE_RULE, r.UPDATE_RULE
+        FROM information_schema.KEY_COLUMN_USAGE k
+        JOIN information_schema.REFERENTIAL_CONSTRAINTS r
+          ON r.CONSTRAINT_SCHEMA = k.CONSTRAINT_SCHEMA AND r.CONSTRAINT_NAME = k.CONSTRAINT_NAME
+         AND r.TABLE_NAME = k.TABLE_NAME
+        WHERE k.TABLE_SCHEMA = %s
+        ORDER BY k.TABLE_NAME, k.CONSTRAINT_NAME, k.ORDINAL_POSITION
+    ''', (database,))
+    keys = {}
+    for table, name, column, ref_table, ref_column, on_delete, on_update in cursor.fetchall():
+        entry = keys.setdefault((table, name), [[], ref_table, [], on_delete, on_update])
+        entry[0].append(column)
+        entry[2].append(ref_column)
+    for (table, name), (columns, ref_table, ref_columns, on_delete, on_update) in keys.items():
+        if table in tables:
+            tables[table].foreign_keys.append(
+                ForeignKey(name, tuple(columns), ref_table, tuple(ref_columns), on_delete, on_update)
+            )
+
+    cursor.execute('''
+        SELECT DISTINCT TABLE_NAME FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = %s AND PARTITION_METHOD IS NOT NULL
+    ''', (database,))
+    for (table,) in cursor.fetchall():
+        if table in tables:
+            tables[table].partitioned = True
+
+    return tables
+
+def quote(value):
+    return "'" + str(value).replace('\\', '\\\\').replace("'", "''") + "'"
+
+def default_clause(column):
+    """DEFAULT ... as MySQL needs it written back"""
+    if column.default is None:
+        return ''
+    if 'DEFAULT_GENERATED' in column.extra:
+        expression = column.default
+        if not expression.upper().startswith('CURRENT_TIMESTAMP'):
+            expression = f'({expression})'
+        return f'DEFAULT {expression}'
+    return f'DEFAULT {quote(column.default)}'
+
+def column_definition(column):
+    """Full column definition for ADD/MODIFY COLUMN"""
+    parts = [f'`{column.name}`', column.type]
+    if column.charset:
+        parts.append(f'CHARACTER SET {column.charset} COLLATE {column.collation}')
+    parts.append('NULL' if column.nullable else 'NOT NULL')
+    default = default_clause(column)
+    if default:
+        parts.append(default)
+    extra = column.extra.replace('DEFAULT_GENERATED', '').strip()
+    if extra:
+        parts.append(extra)
+    return ' '.join(parts)
+
+def varchar_bytes(column):
+    """Maximum bytes of a VARCHAR column, or None for other types"""
+    if not column.type.startswith('varchar('):
+        return None
+    return int(column.type[8:-1]) * CHARSET_BYTES.get(column.charset, 4)
+
+def enum_members(column):
+    if not column.type.startswith(('enum(', 'set(')):
+        return None
+    return column.type[column.type.index('(') + 1:-1]
+
+def column_change(table, live, target):
+    """The cheapest change turning the live column into the target, or None if they match"""
+    if live[2:] == target[2:]:
+        return None
+
+    if live._replace(default=None, position=0) == target._replace(default=None, position=0):
+        # Only the default differs: a metadata change
+        clause = default_clause(target)
+        operation = (f'ALTER COLUMN `{target.name}` SET {clause}' if clause
+                     else f'ALTER COLUMN `{target.name}` DROP DEFAULT')
+        return Change(table, operation, ('INSTANT', 'INPLACE'), False, f'default of {target.name}')
+
+    operation = f'MODIFY COLUMN {column_definition(target)}'
+    same_otherwise = live._replace(type='', position=0) == target._replace(type='', position=0)
+
+    live_members, target_members = enum_members(live), enum_members(target)
+    if same_otherwise and live_members is not None and target_members is not None \
+            and target_members.startswith(live_members + ','):
+        # New ENUM/SET members appended at the end: existing values keep their codes
+        return Change(table, operation, ('INSTANT', 'INPLACE'), False, f'extend {target.type[:4]} {target.name}')
+
+    live_bytes, target_bytes = varchar_bytes(live), varchar_bytes(target)
+    if same_otherwise and live_bytes and target_bytes and live_bytes <= target_bytes \
+            and (live_bytes > 255) == (target_bytes > 255):
+        # Widening within the same length-prefix size is in-place metadata
+        return Change(table, operation, ('INPLACE',), False, f'widen {target.name} to {target.type}')
+
+    return Change(table, operation, ('INPLACE', 'COPY'), True,
+                  f'{target.name}: {live.type} -> {target.type}' if live.type != target.type
+                  else f'{target.name}: definition changed')
+
+def index_clause(unique, columns):
+    """[UNIQUE] INDEX (...) from introspected columns, which carry prefix lengths as 'name(10)'"""
+    quoted = []
+    for column in columns:
+        name, paren, prefix = column.partition('(')
+        quoted.append(f'`{name}`{paren}{prefix}')
+    return f'{"UNIQUE " if unique else ""}INDEX ({", ".join(quoted)})'
+
+def diff_table(live, target, drop=False):
+    """(changes, notes) turning a live table into its declared form"""
+    changes = []
+    notes = []
+    table = target.name
+
+    if live.partitioned != target.partitioned:
+        notes.append(f'{table}: partitioning differs (live {"partitioned" if live.partitioned else "plain"}); '
+                     'this needs a reload with or without --partitioned')
+        return changes, notes
+
+    previous = None
+    for column in sorted(target.columns.values(), key=lambda c: c.position):
+        if column.name not in live.columns:
+            place = f' AFTER `{previous}`' if previous else ' FIRST'
+            changes.append(Change(table, f'ADD COLUMN {column_definition(column)}{place}',
+                                  ('INSTANT', 'INPLACE'), False, f'add {column.name}'))
+        else:
+            change = column_change(table, live.columns[column.name], column)
+            if change:
+                changes.append(change)
+        previous = column.name
+
+    for name in live.columns:
+        if name not in target.columns:
+            if drop:
+                changes.append(Change(table, f'DROP COLUMN `{name}`', ('INSTANT', 'INPLACE'), True, f'drop {name}'))
+            else:
+                notes.append(f'{table}.{name}: not declared (kept; --drop removes it)')
+
+    if live.primary != target.primary:
+        changes.append(Change(
+            table, f'DROP PRIMARY KEY, ADD PRIMARY KEY ({", ".join(f"`{c}`" for c in target.primary)})',
+            ('INPLACE', 'COPY'), True, f'primary key -> {", ".join(target.primary)}'
+        ))
+
+    for signature in target.indexes:
+        if signature not in live.indexes:
+            changes.append(Change(table, f'ADD {index_clause(*signature)}', ('INPLACE',), False,
+                                  f'add {"unique " if signature[0] else ""}index ({", ".join(signature[1])})'))
+    # Indexes backing a live foreign key cannot be dropped while it exists
+    key_columns = [fk.columns for fk in live.foreign_keys]
+    for signature, name in live.indexes.items():
+        if signature not in target.indexes and not any(
+                signature[1][:len(columns)] == columns for columns in key_columns):
+            if drop:
+                changes.append(Change(table, f'DROP INDEX `{name}`', ('INPLACE',), False, f'drop index {name}'))
+            else:
+                notes.append(f'{table}: index {name} ({", ".join(signature[1])}) not declared (kept)')
+
+    live_keys = {fk[1:]: fk.name for fk in live.foreign_keys}
+    target_keys = {fk[1:] for fk in target.foreign_keys}
+    for columns, ref_table, ref_columns, on_delete, on_update in target_keys - set(live_keys):
+        changes.append(Change(
+            table,
+            f'ADD FOREIGN KEY ({", ".join(f"`{c}`" for c in columns)}) '
+            f'REFERENCES `{ref_table}` ({", ".join(f"`{c}`" for c in ref_columns)}) '
+            f'ON DELETE {on_delete} ON UPDATE {on_update}',
+            ('INPLACE', 'COPY'), False, f'add foreign key ({", ".join(columns)}) -> {ref_table}'
+        ))
+    for signature, name in live_keys.items():
+        if signature not in target_keys:
+            if drop:
+                changes.append(Change(table, f'DROP FOREIGN KEY `{name}`', ('INPLACE',), False,
+                                      f'drop foreign key {name}'))
+            else:
+                notes.append(f'{table}: foreign key {name} not declared (kept)')
+
+    return changes, notes
+
+def declared_schema(mysql_conn, partitioned):
+    """Build the declared schema in a scratch database and introspect it"""
+    from migrate_final import create_schema, create_row_hash_table
+
+    database = mysql_conn.database
+    scratch = f'{database}{SCRATCH_SUFFIX}'
+    scratch_conn = connect_mysql(database=None)
+    cursor = scratch_conn.cursor()
+    try:
+        # Same defaults as the live database, so undeclared collations compare equal
+        cursor.execute('''
+            SELECT DEFAULT_CHARACTER_SET_NAME, DEFAULT_COLLATION_NAME
+            FROM information_schema.SCHEMATA WHERE SCHEMA_NAME = %s
+        ''', (database,))
+        charset, collation = cursor.fetchone()
+        cursor.execute(f'DROP DATABASE IF EXISTS `{scratch}`')
+        cursor.execute(f'CREATE DATABASE `{scratch}` CHARACTER SET {charset} COLLATE {collation}')
+        scratch_conn.database = scratch
+        # create_schema reports every table; only its result matters here
+        with redirect_stdout(io.StringIO()):
+            create_schema(scratch_conn, partitioned)
+            create_row_hash_table(scratch_conn)
+        tables = introspect(cursor, scratch)
+        create_statements = {}
+        for table in tables:
+            cursor.execute(f'SHOW CREATE TABLE `{scratch}`.`{table}`')
+            create_statements[table] = cursor.fetchone()[1]
+        return tables, create_statements
+    finally:
+        cursor.execute(f'DROP DATABASE IF EXISTS `{scratch}`')
+        cursor.close()
+        scratch_conn.close()
+
+def plan_schema(mysql_conn, partitioned=None, drop=False):
+    """(changes, notes) to evolve the live schema to the declared one.
+
+    partitioned=None keeps whatever the live loans table uses. Tables that
+    exist only in the live database are left alone.
+    """
+    cursor = mysql_conn.cursor()
+    live = introspect(cursor, mysql_conn.database)
+    cursor.close()
+    if partitioned is None:
+        partitioned = 'loans' in live and live['loans'].partitioned
+
+    target, create_statements = declared_schema(mysql_conn, partitioned)
+    changes = []
+    notes = []
+    for table in target:
+        if table not in live:
+            changes.append(Change(table, create_statements[table], (), False, 'create table'))
+            continue
+        table_changes, table_notes = diff_table(live[table], target[table], drop)
+        changes.extend(table_changes)
+        notes.extend(table_notes)
+    return changes, notes
+
+def change_statement(change, algorithm):
+    if not change.algorithms:
+        return change.operation
+    lock = '' if algorithm == 'INSTANT' else (', LOCK=NONE' if algorithm == 'INPLACE' else ', LOCK=SHARED')
+    return f'ALTER TABLE `{change.table}` {change.operation}, ALGORITHM={algorithm}{lock}'
+
+def apply_plan(mysql_conn, changes, allow_copy=False):
+    """Run the changes, each with the cheapest algorithm MySQL accepts; returns (applied, skipped)"""
+    from mysql.connector import Error as MySQLError
+
+    cursor = mysql_conn.cursor()
+    # New tables and foreign keys reference each other; rows were validated when migrated
+    cursor.execute('SET SESSION foreign_key_checks = 0')
+    applied = 0
+    skipped = []
+    try:
+        for change in changes:
+            if not change.algorithms:
+                cursor.execute(change.operation)
+                applied += 1
+                print(f'  [OK] {change.table}: {change.description}')
+                continue
+
+            for algorithm in [a for a in change.algorithms if allow_copy or a != 'COPY']:
+                try:
+                    cursor.execute(change_statement(change, algorithm))
+                    applied += 1
+                    print(f'  [OK] {change.table}: {change.description} ({algorithm})')
+                    break
+                except MySQLError as e:
+                    if e.errno not in ALGORITHM_NOT_SUPPORTED:
+                        raise
+            else:
+                skipped.append(change)
+                print(f'  [SKIPPED] {change.table}: {change.description} needs a table copy (--allow-copy)')
+    finally:
+        cursor.execute('SET SESSION foreign_key_checks = 1')
+        cursor.close()
+    return applied, skipped
+
+def print_plan(changes, notes):
+    if not changes:
+        print('[SUCCESS] Live schema matches the declared schema')
+    for change in changes:
+        marker = ' [rebuilds table]' if change.rebuild else ''
+        algorithm = change.algorithms[0] if change.algorithms else 'DDL'
+        print(f'  [{algorithm}] {change.table}: {change.description}{marker}')
+        print(f'      {change_statement(change, change.algorithms[0] if change.algorithms else None)};')
+    for note in notes:
+        print(f'  [NOTE] {note}')
+
+def evolve_schema(mysql_conn, partitioned=None, allow_copy=False, drop=False):
+    """Plan and apply in-place schema changes; returns the changes that were skipped"""
+    print('[INFO] Comparing the live schema with the declared schema...')
+    changes, notes = plan_schema(mysql_conn, partitioned, drop)
+    print_plan(changes, notes)
+    if not changes:
+        return []
+    applied, skipped = apply_plan(mysql_conn, changes, allow_copy)
+    print(f'[OK] Schema: {applied} changes applied' + (f', {len(skipped)} skipped' if skipped else '') + '\n')
+    return skipped
+
+def main(argv=None):
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Diff the live schema against the declared one and evolve it in place')
+    parser.add_argument('--apply', action='store_true', help='run the planned changes (default: only print them)')
+    parser.add_argument('--allow-copy', action='store_true',
+                        help='allow changes that copy a table (ALGORITHM=COPY blocks writes while it runs)')
+    parser.add_argument('--drop', action='store_true', help='also drop columns, indexes and keys that are not declared')
+    parser.add_argument('--partitioned', action='store_true', default=None,
+                        help='plan for partitioned loans/payments (default: keep the live layout)')
+    args = parser.parse_args(argv)
+
+    mysql_conn = connect_mysql()
+    if args.apply:
+        skipped = evolve_schema(mysql_conn, args.partitioned, args.allow_copy, args.drop)
+        mysql_conn.close()
+        if skipped:
+            sys.exit(1)
+        return
+
+    changes, notes = plan_schema(mysql_conn, args.partitioned, args.drop)
+    mysql_conn.close()
+    print_plan(changes, notes)
+    if changes:
+        print(f'\n[INFO] {len(changes)} changes planned; run with --apply to make them')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+import sys
+import time
+import argparse
+from coreq_db import connect_mysql
+
+# A full migration is built in <database>__new and swapped in; the replaced
+# tables are kept in <database>__old until the next swap, for rollback
+SHADOW_SUFFIX = '__new'
+OLD_SUFFIX = '__old'
+
+# Seconds the swap waits for running queries to release their table locks.
+# New queries queue behind a waiting RENAME, so this is kept short.
+SWAP_LOCK_WAIT_TIMEOUT = 10
+
+def database_tables(cursor, database):
+    cursor.execute('''
+        SELECT TABLE_NAME FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = %s AND TABLE_TYPE = 'BASE TABLE'
+        ORDER BY TABLE_NAME
+    ''', (database,))
+    return [row[0] for row in cursor.fetchall()]
+
+def table_counts(cursor, database, tables):
+    counts = {}
+    for table in tables:
+        cursor.execute(f'SELECT COUNT(*) FROM `{database}`.`{table}`')
+        counts[table] = cursor.fetchone()[0]
+    return counts
+
+def recreate_database(cursor, name, like):
+    """Drop and create an empty database with the same defaults as `like`"""
+    cursor.execute('''
+        SELECT DEFAULT_CHARACTER_SET_NAME, DEFAULT_COLLATION_NAME
+        FROM information_schema.SCHEMATA WHERE SCHEMA_NAME = %s
+    ''', (like,))
+    charset, collation = cursor.fetchone()
+    cursor.execute(f'DROP DATABASE IF EXISTS `{name}`')
+    cursor.execute(f'CREATE DATABASE `{name}` CHARACTER SET {charset} COLLATE {collation}')
+
+def create_shadow_database(mysql_conn):
+    """Empty <database>__new; returns a connection using it"""
+    database = mysql_conn.database
+    cursor = mysql_conn.cursor()
+    recreate_database(cursor, f'{database}{SHADOW_SUFFIX}', database)
+    cursor.close()
+    print(f'[INFO] Building the migration in {database}{SHADOW_SUFFIX}; {database} stays live until the swap\n')
+    return connect_mysql(database=f'{database}{SHADOW_SUFFIX}')
+
+def outside_references(cursor, database, tables):
+    """Foreign keys of tables that are not swapped, pointing at tables that are.
+
+    They would follow the replaced tables into the old database.
+    """
+    if not tables:
+        return []
+    cursor.execute(f'''
+        SELECT TABLE_NAME, CONSTRAINT_NAME, REFERENCED_TABLE_NAME
+        FROM information_schema.REFERENTIAL_CONSTRAINTS
+        WHERE CONSTRAINT_SCHEMA = %s AND UNIQUE_CONSTRAINT_SCHEMA = %s
+          AND REFERENCED_TABLE_NAME IN ({", ".join(["%s"] * len(tables))})
+    ''', (database, database, *tables))
+    return [(table, name, referenced) for table, name, referenced in cursor.fetchall() if table not in tables]
+
+def check_shadow(cursor, database, tables):
+    """Reasons not to swap: live tables that would become empty or lose their references"""
+    shadow = f'{database}{SHADOW_SUFFIX}'
+    problems = []
+    live_tables = set(database_tables(cursor, database))
+    shadow_counts = table_counts(cursor, shadow, tables)
+    live_counts = table_counts(cursor, database, [table for table in tables if table in live_tables])
+    for table, count in live_counts.items():
+        if count and not shadow_counts[table]:
+            problems.append(f'{table}: {count} live rows but the shadow table is empty')
+    for table, name, referenced in outside_references(cursor, database, tables):
+        problems.append(f'{table}.{name} references {referenced}, but {table} is not part of the swap')
+    return problems
+
+def rename_all(cursor, moves):
+    """One atomic RENAME TABLE for every (from, to) pair; returns milliseconds taken"""
+    cursor.execute('SET SESSION lock_wait_timeout = %s', (SWAP_LOCK_WAIT_TIMEOUT,))
+    started = time.perf_counter()
+    cursor.execute('RENAME TABLE ' + ', '.join(f'{source} TO {target}' for source, target in moves))
+    return (time.perf_counter() - started) * 1000
+
+def swap_in(mysql_conn, force=False):
+    """Replace the live tables with the shadow set in one RENAME; returns True if swapped"""
+    database = mysql_conn.database
+    shadow = f'{database}{SHADOW_SUFFIX}'
+    old = f'{database}{OLD_SUFFIX}'
+    cursor = mysql_conn.cursor()
+
+    tables = database_tables(cursor, shadow)
+    if not tables:
+        print(f'[ERROR] {shadow} has no tables (run a migration with --shadow first)')
+        cursor.close()
+        return False
+
+    problems = check_shadow(cursor, database, tables)
+    for problem in problems:
+        print(f'  [WARNING] {problem}')
+    if problems and not force:
+        print('[ERROR] Not swapping; the live tables are unchanged (--force to swap anyway)')
+        cursor.close()
+        return False
+
+    live_tables = set(database_tables(cursor, database))
+
+    # The previous rollback set is discarded here
+    recreate_database(cursor, old, database)
+    moves = []
+    for table in tables:
+        if table in live_tables:
+            moves.append((f'`{database}`.`{table}`', f'`{old}`.`{table}`'))
+        moves.append((f'`{shadow}`.`{table}`', f'`{database}`.`{table}`'))
+
+    elapsed = rename_all(cursor, moves)
+    cursor.execute(f'DROP DATABASE IF EXISTS `{shadow}`')
+    cursor.close()
+    print(f'[SUCCESS] Swapped {len(tables)} tables into {database} in {elapsed:.1f} ms '
+          f'(previous tables kept in {old}; roll back with --rollback)')
+    return True
+
+def rollback(mysql_conn):
+    """Put the tables kept by the last swap back; the replaced ones move to the shadow database"""
+    database = mysql_conn.database
+    shadow = f'{database}{SHADOW_SUFFIX}'
+    old = f'{database}{OLD_SUFFIX}'
+    cursor = mysql_conn.cursor()
+
+    tables = database_tables(cursor, old)
+    if not tables:
+        print(f'[ERROR] {old} has no tables to roll back to')
+        cursor.close()
+        return False
+
+    live_tables = set(database_tables(cursor, database))
+    recreate_database(cursor, shadow, database)
+    moves = []
+    for table in tables:
+        if table in live_tables:
+            moves.append((f'`{database}`.`{table}`', f'`{shadow}`.`{table}`'))
+        moves.append((f'`{old}`.`{table}`', f'`{database}`.`{table}`'))
+
+    elapsed = rename_all(cursor, moves)
+    cursor.execute(f'DROP DATABASE IF EXISTS `{old}`')
+    cursor.close()
+    print(f'[SUCCESS] Rolled back {len(tables)} tables in {elapsed:.1f} ms '
+          f'(the replaced tables are in {shadow}; --swap puts them back)')
+    return True
+
+def print_status(mysql_conn):
+    database = mysql_conn.database
+    cursor = mysql_conn.cursor()
+    databases = (database, f'{database}{SHADOW_SUFFIX}', f'{database}{OLD_SUFFIX}')
+    counts = [table_counts(cursor, name, database_tables(cursor, name)) for name in databases]
+    cursor.close()
+
+    tables = sorted(set().union(*counts))
+    print(f'\n{"Table":<28}' + ''.join(f'{name:>22}' for name in databases))
+    for table in tables:
+        print(f'{table:<28}' + ''.join(f'{count[table] if table in count else "-":>22}' for count in counts))
+
+def main(argv=None):
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Swap a shadow-built migration into the live database')
+    parser.add_argument('--swap', action='store_true', help='swap the shadow tables in atomically')
+    parser.add_argument('--rollback', action='store_true', help='restore the tables replaced by the last swap')
+    parser.add_argument('--force', action='store_true', help='swap even if the shadow checks fail')
+    args = parser.parse_args(argv)
+
+    mysql_conn = connect_mysql()
+    if args.swap:
+        done = swap_in(mysql_conn, args.force)
+    elif args.rollback:
+        done = rollback(mysql_conn)
+    else:
+        print_status(mysql_conn)
+        done = True
+    mysql_conn.close()
+    if not done:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
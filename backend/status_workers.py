@@ -0,0 +1,264 @@
+import os
+import sys
+import socket
+import argparse
+import multiprocessing
+from datetime import date
+from coreq_db import connect_mysql
+from loan_summaries import create_summary_tables
+from update_statuses_from_access import SWEEP_CHUNK_SIZE, database_now, sweep_due_dates
+
+# Loan ids per claimable range
+RANGE_SIZE = 5000
+
+# A claimed range not renewed for this long is reclaimed by another worker
+LEASE_SECONDS = 120
+
+# Upper bound of the last range (INT column maximum)
+MAX_LOAN_ID = 2147483647
+
+# Planning a run is serialized through this advisory lock
+PLAN_LOCK_TIMEOUT = 30
+
+# Lease rows of finished runs are kept this many days
+LEASE_RETENTION_DAYS = 7
+
+def create_lease_table(mysql_conn):
+    """Create the range lease table if it does not exist"""
+    cursor = mysql_conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS status_sweep_leases (
+            runId VARCHAR(40) NOT NULL,
+            rangeStart INT NOT NULL,
+            rangeEnd INT NOT NULL,
+            status ENUM('pending', 'claimed', 'done') NOT NULL DEFAULT 'pending',
+            owner VARCHAR(120),
+            leaseExpires DATETIME,
+            attempts INT NOT NULL DEFAULT 0,
+            loans INT NOT NULL DEFAULT 0,
+            changed INT NOT NULL DEFAULT 0,
+            cutoff DATETIME,
+            updatedAt DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (runId, rangeStart)
+        )
+    ''')
+    # Lease tables created before runs stored their cut-off time
+    cursor.execute('''
+        SELECT COUNT(*) FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'status_sweep_leases' AND COLUMN_NAME = 'cutoff'
+    ''')
+    if not cursor.fetchone()[0]:
+        cursor.execute('ALTER TABLE status_sweep_leases ADD COLUMN cutoff DATETIME AFTER changed')
+    mysql_conn.commit()
+    cursor.close()
+
+def worker_name():
+    """Identifies the lease owner across hosts and processes"""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+def plan_run(mysql_conn, run_id, range_size=RANGE_SIZE):
+    """Split the loan id space into ranges for a run, once, whichever worker gets there first.
+
+    The planner also fixes the run's cut-off time (database_now(), the clock
+    the single-process sweep and the scheduler use too) on every
+    range, so workers on any host, started at any time, sweep against the
+    same moment. Returns (ranges planned now, cut-off).
+    """
+    cursor = mysql_conn.cursor()
+    cursor.execute('SELECT GET_LOCK(%s, %s)', (f'coreq_status_plan_{run_id}', PLAN_LOCK_TIMEOUT))
+    if cursor.fetchone()[0] != 1:
+        cursor.close()
+        raise RuntimeError(f'Could not acquire the planning lock for run {run_id}')
+
+    try:
+        cursor.execute('''
+            SELECT COUNT(*), SUM(status != 'done'), MIN(cutoff) FROM status_sweep_leases WHERE runId = %s
+        ''', (run_id,))
+        planned, open_ranges, cutoff = cursor.fetchone()
+        if planned:
+            if cutoff is None:
+                # Run planned before cut-offs were stored: fix one now for its remaining ranges
+                cutoff = database_now(mysql_conn)
+                cursor.execute('UPDATE status_sweep_leases SET cutoff = %s WHERE runId = %s', (cutoff, run_id))
+                mysql_conn.commit()
+            if not open_ranges:
+                print(f'[WARNING] Run {run_id} is already complete (cut-off {cutoff}); '
+                      f'nothing to sweep. Use a new --run to sweep again.')
+            return 0, cutoff
+
+        cutoff = database_now(mysql_conn)
+        cursor.execute("SELECT MIN(id), MAX(id) FROM loans WHERE status != 'defaulted' AND status != 'paid'")
+        first_id, last_id = cursor.fetchone()
+        if first_id is None:
+            return 0, cutoff
+
+        ranges = [
+            (run_id, start, start + range_size, cutoff)
+            for start in range(first_id, last_id + 1, range_size)
+        ]
+        # The last range is open-ended so loans created during the run are swept too
+        ranges[-1] = (run_id, ranges[-1][1], MAX_LOAN_ID, cutoff)
+        cursor.executemany(
+            'INSERT INTO status_sweep_leases (runId, rangeStart, rangeEnd, cutoff) VALUES (%s, %s, %s, %s)',
+            ranges
+        )
+        cursor.execute(
+            'DELETE FROM status_sweep_leases WHERE updatedAt < NOW() - INTERVAL %s DAY AND runId != %s',
+            (LEASE_RETENTION_DAYS, run_id)
+        )
+        mysql_conn.commit()
+        print(f'[INFO] Planned run {run_id}: {len(ranges)} ranges of {range_size} ids, cut-off {cutoff}')
+        return len(ranges), cutoff
+    finally:
+        cursor.execute('SELECT RELEASE_LOCK(%s)', (f'coreq_status_plan_{run_id}',))
+        cursor.fetchone()
+        cursor.close()
+
+def claim_range(mysql_conn, run_id, owner, lease_seconds=LEASE_SECONDS):
+    """Atomically claim the next pending (or stale) range; returns (start, end, attempts) or None"""
+    cursor = mysql_conn.cursor()
+    cursor.execute('''
+        UPDATE status_sweep_leases
+        SET status = 'claimed', owner = %s, leaseExpires = NOW() + INTERVAL %s SECOND,
+            attempts = attempts + 1
+        WHERE runId = %s
+          AND (status = 'pending' OR (status = 'claimed' AND leaseExpires < NOW()))
+        ORDER BY rangeStart
+        LIMIT 1
+    ''', (owner, lease_seconds, run_id))
+    claimed = cursor.rowcount
+    mysql_conn.commit()
+
+    if not claimed:
+        cursor.close()
+        return None
+
+    cursor.execute('''
+        SELECT rangeStart, rangeEnd, attempts FROM status_sweep_leases
+        WHERE runId = %s AND owner = %s AND status = 'claimed'
+        ORDER BY updatedAt DESC
+        LIMIT 1
+    ''', (run_id, owner))
+    row = cursor.fetchone()
+    cursor.close()
+    mysql_conn.commit()
+    return row
+
+def renew_lease(mysql_conn, run_id, range_start, owner, lease_seconds=LEASE_SECONDS):
+    """Extend our lease; False if another worker has reclaimed the range"""
+    cursor = mysql_conn.cursor()
+    cursor.execute('''
+        UPDATE status_sweep_leases SET leaseExpires = NOW() + INTERVAL %s SECOND
+        WHERE runId = %s AND rangeStart = %s AND owner = %s AND status = 'claimed'
+    ''', (lease_seconds, run_id, range_start, owner))
+    renewed = cursor.rowcount == 1
+    mysql_conn.commit()
+    cursor.close()
+    return renewed
+
+def finish_range(mysql_conn, run_id, range_start, owner, loans, changed):
+    """Mark a range done (only if we still hold it)"""
+    cursor = mysql_conn.cursor()
+    cursor.execute('''
+        UPDATE status_sweep_leases SET status = 'done', leaseExpires = NULL, loans = %s, changed = %s
+        WHERE runId = %s AND rangeStart = %s AND owner = %s AND status = 'claimed'
+    ''', (loans, changed, run_id, range_start, owner))
+    mysql_conn.commit()
+    cursor.close()
+
+def run_worker(run_id, chunk_size=SWEEP_CHUNK_SIZE, pause=0.0, range_size=RANGE_SIZE,
+               lease_seconds=LEASE_SECONDS):
+    """Claim and sweep ranges until none are left; returns (ranges, loans, changed)"""
+    owner = worker_name()
+    mysql_conn = connect_mysql()
+    create_lease_table(mysql_conn)
+    create_summary_tables(mysql_conn)
+    # Every worker of the run sweeps against the cut-off stored with the plan
+    _, now = plan_run(mysql_conn, run_id, range_size)
+    totals = [0, 0, 0]
+
+    while True:
+        claim = claim_range(mysql_conn, run_id, owner, lease_seconds)
+        if claim is None:
+            break
+        range_start, range_end, attempts = claim
+        note = f' (reclaimed, attempt {attempts})' if attempts > 1 else ''
+        print(f'[{owner}] range {range_start}-{range_end - 1}{note}')
+
+        def heartbeat(loans, changes):
+            if not renew_lease(mysql_conn, run_id, range_start, owner, lease_seconds):
+                print(f'[{owner}] lost the lease on range {range_start}, stopping it')
+                return False
+            return True
+
+        counts = sweep_due_dates(mysql_conn, now, chunk_size, pause,
+                                 start_id=range_start - 1, end_id=range_end, on_chunk=heartbeat)
+        loans = counts['active'] + counts['pastDue'] + counts['defaulted']
+        finish_range(mysql_conn, run_id, range_start, owner, loans, counts['changed'])
+        totals[0] += 1
+        totals[1] += loans
+        totals[2] += counts['changed']
+
+    mysql_conn.close()
+    print(f'[{owner}] finished: {totals[0]} ranges, {totals[1]} loans, {totals[2]} status changes')
+    return tuple(totals)
+
+def run_status(mysql_conn, run_id):
+    """Print the lease table for a run"""
+    cursor = mysql_conn.cursor()
+    cursor.execute('''
+        SELECT status, COUNT(*), SUM(loans), SUM(changed), MAX(attempts)
+        FROM status_sweep_leases WHERE runId = %s GROUP BY status
+    ''', (run_id,))
+    rows = cursor.fetchall()
+    cursor.execute('SELECT MIN(cutoff) FROM status_sweep_leases WHERE runId = %s', (run_id,))
+    cutoff = cursor.fetchone()[0]
+    cursor.close()
+
+    print(f'\nRun {run_id}:' + (f' (cut-off {cutoff})' if cutoff else ''))
+    if not rows:
+        print('  (no ranges planned)')
+    for status, ranges, loans, changed, attempts in rows:
+        print(f'  {status:<8} {ranges:>5} ranges  {int(loans or 0):>8} loans  '
+              f'{int(changed or 0):>6} changed  max attempts {attempts}')
+
+def main(argv=None):
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Status sweep workers sharing loan id ranges through leases')
+    parser.add_argument('--run', default=date.today().isoformat(),
+                        help='run id shared by all workers of one sweep (default: today)')
+    parser.add_argument('--workers', type=int, default=1, help='worker processes on this host')
+    parser.add_argument('--range-size', type=int, default=RANGE_SIZE, help='loan ids per claimable range')
+    parser.add_argument('--lease', type=int, default=LEASE_SECONDS,
+                        help='seconds before an unrenewed range can be reclaimed')
+    parser.add_argument('--chunk-size', type=int, default=SWEEP_CHUNK_SIZE, help='loans per committed chunk')
+    parser.add_argument('--pause', type=float, default=0.0, help='seconds to sleep between chunks')
+    parser.add_argument('--status', action='store_true', help='show the run\'s progress and exit')
+    args = parser.parse_args(argv)
+
+    if args.status:
+        mysql_conn = connect_mysql()
+        create_lease_table(mysql_conn)
+        run_status(mysql_conn, args.run)
+        mysql_conn.close()
+        return
+
+    worker_args = (args.run, args.chunk_size, args.pause, args.range_size, args.lease)
+    if args.workers <= 1:
+        run_worker(*worker_args)
+    else:
+        processes = [multiprocessing.Process(target=run_worker, args=worker_args) for _ in range(args.workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        if any(process.exitcode for process in processes):
+            print('[ERROR] Some workers failed; their ranges are reclaimed once the lease expires')
+            sys.exit(1)
+
+    mysql_conn = connect_mysql()
+    run_status(mysql_conn, args.run)
+    mysql_conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -1,42 +1,35 @@
-import mysql.connector
-import os
-from dotenv import load_dotenv
+from coreq_db import connect_mysql
 
-load_dotenv()
+def main():
+    """Main function"""
+    # Connect to MySQL
+    mysql_conn = connect_mysql()
+    cursor = mysql_conn.cursor()
 
-# Database configuration
-MYSQL_CONFIG = {
-    'host': os.getenv('DB_HOST', 'localhost'),
-    'user': os.getenv('DB_USER', 'root'),
-    'password': os.getenv('DB_PASSWORD', ''),
-    'database': os.getenv('DB_NAME', 'coreq_loans')
-}
+    # Fresh bcrypt hash for password "1234"
+    hashed_password = '$2b$08$jEeeu3d0DytLEQARmO4uVO27ulxeJ//l7IIwQE02/kRK4TQRJGSp6'
 
-# Connect to MySQL
-mysql_conn = mysql.connector.connect(**MYSQL_CONFIG)
-cursor = mysql_conn.cursor()
+    # Update the user password
+    cursor.execute(
+        "UPDATE users SET password = %s WHERE email = %s",
+        (hashed_password, 'admin@coreqcapital.com')
+    )
+    mysql_conn.commit()
 
-# Fresh bcrypt hash for password "1234"
-hashed_password = '$2b$08$jEeeu3d0DytLEQARmO4uVO27ulxeJ//l7IIwQE02/kRK4TQRJGSp6'
+    # Verify
+    cursor.execute("SELECT id, name, email FROM users WHERE email = %s", ('admin@coreqcapital.com',))
+    user = cursor.fetchone()
+    print(f"Updated user:")
+    print(f"  ID: {user[0]}")
+    print(f"  Name: {user[1]}")
+    print(f"  Email: {user[2]}")
 
-# Update the user password
-cursor.execute(
-    "UPDATE users SET password = %s WHERE email = %s",
-    (hashed_password, 'admin@coreqcapital.com')
-)
-mysql_conn.commit()
+    cursor.close()
+    mysql_conn.close()
+    print("\nPassword updated successfully!")
+    print("You can now login with:")
+    print("  Email: admin@coreqcapital.com")
+    print("  Password: 1234")
 
-# Verify
-cursor.execute("SELECT id, name, email FROM users WHERE email = %s", ('admin@coreqcapital.com',))
-user = cursor.fetchone()
-print(f"Updated user:")
-print(f"  ID: {user[0]}")
-print(f"  Name: {user[1]}")
-print(f"  Email: {user[2]}")
-
-cursor.close()
-mysql_conn.close()
-print("\nPassword updated successfully!")
-print("You can now login with:")
-print("  Email: admin@coreqcapital.com")
-print("  Password: 1234")
+if __name__ == '__main__':
+    main()
@@ -1,136 +1,558 @@
-import pyodbc
-import mysql.connector
-import os
-from dotenv import load_dotenv
+import time
+import heapq
+import signal
+import argparse
+import threading
 from datetime import datetime, timedelta
+from coreq_db import connect_access, connect_mysql
+from loan_summaries import SummaryDeltas, create_summary_tables
+from row_mappers import compile_mapper, fetch_records
+from stage_profiler import stage
 
-load_dotenv()
-
-ACCESS_DB_PATH = r'D:\coreq capital WORKING.accdb'
-
-# MySQL config
-MYSQL_CONFIG = {
-    'host': os.getenv('DB_HOST', 'localhost'),
-    'user': os.getenv('DB_USER', 'root'),
-    'password': os.getenv('DB_PASSWORD', ''),
-    'database': os.getenv('DB_NAME', 'coreq_loans')
-}
-
-# Connect to Access
-drivers = [driver for driver in pyodbc.drivers() if 'Access' in driver or 'access' in driver]
-selected_driver = drivers[0]
-for driver in drivers:
-    if '.accdb' in driver:
-        selected_driver = driver
-        break
-
-access_conn = pyodbc.connect(f'Driver={{{selected_driver}}};DBQ={ACCESS_DB_PATH};')
-access_cursor = access_conn.cursor()
-
-# Connect to MySQL
-mysql_conn = mysql.connector.connect(**MYSQL_CONFIG)
-mysql_cursor = mysql_conn.cursor(dictionary=True)
-
-print('Fetching defaulted items from Access...\n')
-
-# Get all defaulted items
-access_cursor.execute('SELECT * FROM [defaulted items]')
-defaulted_items = access_cursor.fetchall()
-
-print(f'Found {len(defaulted_items)} defaulted items')
-
-# Process each defaulted item
-defaulted_count = 0
-for item in defaulted_items:
-    item_id = item[0]  # ITEMID
-    sold = item[5]  # SOLD
-    amount = item[6]  # AMOUNT
-    date_sold = item[7]  # DATE SOLD
-
-    # Find matching collateral
-    mysql_cursor.execute('SELECT * FROM collaterals WHERE id = %s', (item_id,))
-    collateral = mysql_cursor.fetchone()
-
-    if collateral:
-        # Update collateral as seized and sold
-        update_sql = '''
-            UPDATE collaterals
-            SET isSeized = 1, isSold = %s, soldPrice = %s, soldDate = %s
-            WHERE id = %s
-        '''
-        mysql_cursor.execute(update_sql, (
-            1 if sold else 0,
-            float(amount) if amount else None,
-            date_sold if date_sold else None,
-            item_id
-        ))
-
-        # Find and update the loan for this collateral
-        mysql_cursor.execute('SELECT * FROM loans WHERE collateralId = %s', (item_id,))
-        loan = mysql_cursor.fetchone()
-
-        if loan:
-            mysql_cursor.execute('UPDATE loans SET status = %s WHERE id = %s', ('defaulted', loan['id']))
-            defaulted_count += 1
-
-mysql_conn.commit()
-
-print(f'\nUpdated {defaulted_count} loans to defaulted status based on defaulted items')
-
-# Now update remaining loans based on their due dates
-print('\nUpdating remaining loan statuses based on due dates...')
-
-mysql_cursor.execute('''
-    SELECT * FROM loans
-    WHERE status != 'defaulted' AND status != 'paid'
-''')
-remaining_loans = mysql_cursor.fetchall()
-
-now = datetime.now()
-active_count = 0
-past_due_count = 0
-
-for loan in remaining_loans:
-    due_date = loan['dueDate']
-    grace_period_end = loan['gracePeriodEnd']
+# Loans with the borrower location and outstanding balance the summary tables are keyed on
+LOAN_WITH_SUMMARY_KEYS = '''
+    SELECT l.id, l.status, l.dueDate, l.gracePeriodEnd, l.collateralId,
+           COALESCE(b.location, '') AS location,
+           GREATEST(l.totalAmount + COALESCE(l.penalties, 0)
+                    - COALESCE((SELECT SUM(p.amount) FROM payments p WHERE p.loanId = l.id), 0), 0) AS outstanding
+    FROM loans l
+    LEFT JOIN borrowers b ON b.id = l.borrowerId
+'''
 
+# One sweep chunk: open loans after a keyset id ({upper} adds an end id for worker ranges)
+SWEEP_CHUNK_SQL = LOAN_WITH_SUMMARY_KEYS + '''
+    WHERE l.id > %s{upper} AND l.status != 'defaulted' AND l.status != 'paid'
+    ORDER BY l.id
+    LIMIT %s
+'''
+
+# Record fields for LOAN_WITH_SUMMARY_KEYS rows
+LOAN_FIELDS = (
+    ('id', 'id'),
+    ('status', 'status'),
+    ('due_date', 'dueDate'),
+    ('grace_period_end', 'gracePeriodEnd'),
+    ('collateral_id', 'collateralId'),
+    ('location', 'location'),
+    ('outstanding', 'outstanding')
+)
+
+# Access [defaulted items] columns used here
+DEFAULTED_ITEM_FIELDS = (
+    ('item_id', 'ITEMID'),
+    ('sold', 'SOLD'),
+    ('amount', 'AMOUNT'),
+    ('date_sold', 'DATE SOLD')
+)
+
+# Loans per sweep chunk; each chunk is its own short transaction
+SWEEP_CHUNK_SIZE = 500
+
+# Retries for a chunk that hits a deadlock or lock wait timeout
+SWEEP_RETRIES = 5
+
+# MySQL errors that mean "roll back and try the chunk again"
+RETRYABLE_ERRORS = (1213, 1205)
+
+# Lock wait (seconds) for the sweep's own statements, so it backs off
+# quickly instead of queueing behind live API transactions
+SWEEP_LOCK_WAIT_TIMEOUT = 5
+
+# Seconds between scheduler checks for new and changed loans
+SCHEDULE_REFRESH_SECONDS = 60
+
+# Open loans whose status the sweep and scheduler maintain
+OPEN_LOANS_SQL = '''
+    SELECT id, status, dueDate, gracePeriodEnd, updatedAt
+    FROM loans
+    WHERE status NOT IN ('defaulted', 'paid')
+'''
+
+# Scheduler refresh: loans created after the highest id seen, or changed since the watermark
+CHANGED_LOANS_SQL = '''
+    (SELECT id, status, dueDate, gracePeriodEnd, updatedAt FROM loans WHERE id > %s) UNION
+    (SELECT id, status, dueDate, gracePeriodEnd, updatedAt FROM loans WHERE updatedAt >= %s)
+'''
+
+def database_now(mysql_conn):
+    """The database clock (NOW()).
+
+    Every status path (the sweep, status_workers.py ranges and the
+    scheduler) judges due dates against this one clock, so a loan gets the
+    same status whichever mode or host ran.
+    """
+    cursor = mysql_conn.cursor()
+    cursor.execute('SELECT NOW()')
+    now = cursor.fetchone()[0]
+    cursor.close()
+    return now
+
+def loan_status(due_date, grace_period_end, now):
+    """Status a loan should have at `now`"""
     if grace_period_end and now >= grace_period_end:
         # Overdue past grace period - should be defaulted
-        mysql_cursor.execute('UPDATE loans SET status = %s WHERE id = %s', ('defaulted', loan['id']))
-        # Mark collateral as seized
-        if loan['collateralId']:
-            mysql_cursor.execute('UPDATE collaterals SET isSeized = 1 WHERE id = %s', (loan['collateralId'],))
-        defaulted_count += 1
-    elif now >= due_date:
+        return 'defaulted'
+    if now >= due_date:
         # Past due but still in grace period
-        mysql_cursor.execute('UPDATE loans SET status = %s WHERE id = %s', ('pastDue', loan['id']))
-        past_due_count += 1
-    elif now.date() == due_date.date():
+        return 'pastDue'
+    if now.date() == due_date.date():
         # Due today
-        mysql_cursor.execute('UPDATE loans SET status = %s WHERE id = %s', ('due', loan['id']))
-        active_count += 1
-    else:
-        # Still active
-        mysql_cursor.execute('UPDATE loans SET status = %s WHERE id = %s', ('active', loan['id']))
-        active_count += 1
+        return 'due'
+    # Still active
+    return 'active'
+
+def next_transition(due_date, grace_period_end, now):
+    """Earliest time after `now` at which the loan's status changes, or None"""
+    moments = (datetime.combine(due_date.date(), datetime.min.time()), due_date, grace_period_end)
+    upcoming = [moment for moment in moments if moment and moment > now]
+    return min(upcoming) if upcoming else None
+
+def apply_status(mysql_cursor, loan, status, summaries):
+    """Write a loan's new status (seizing collateral on default) and record the summary delta.
+
+    The write only applies if the loan still has the status it was read with;
+    returns False when another writer changed it first.
+    """
+    mysql_cursor.execute('UPDATE loans SET status = %s WHERE id = %s AND status = %s',
+                         (status, loan.id, loan.status))
+    if not mysql_cursor.rowcount:
+        return False
+    summaries.status_changed(loan.id, loan.status, status, loan.location, loan.outstanding)
+    # Mark collateral as seized
+    if status == 'defaulted' and loan.collateral_id:
+        mysql_cursor.execute('UPDATE collaterals SET isSeized = 1 WHERE id = %s', (loan.collateral_id,))
+    return True
+
+def apply_defaulted_items(access_conn, mysql_conn, summaries):
+    """Mark collaterals listed in Access [defaulted items] as seized/sold and default their loans"""
+    access_cursor = access_conn.cursor()
+    mysql_cursor = mysql_conn.cursor()
+
+    print('Fetching defaulted items from Access...\n')
+
+    # Get all defaulted items
+    access_cursor.execute('SELECT * FROM [defaulted items]')
+    defaulted_items = fetch_records(access_cursor, 'DefaultedItem', DEFAULTED_ITEM_FIELDS)
+
+    print(f'Found {len(defaulted_items)} defaulted items')
+
+    # Process each defaulted item
+    defaulted_count = 0
+    map_loan = None
+    for item in defaulted_items:
+        item_id = item.item_id
+        sold = item.sold
+        amount = item.amount
+        date_sold = item.date_sold
+
+        # Find matching collateral
+        mysql_cursor.execute('SELECT id FROM collaterals WHERE id = %s', (item_id,))
+        collateral = mysql_cursor.fetchone()
+
+        if collateral:
+            # Update collateral as seized and sold
+            update_sql = '''
+                UPDATE collaterals
+                SET isSeized = 1, isSold = %s, soldPrice = %s, soldDate = %s
+                WHERE id = %s
+            '''
+            mysql_cursor.execute(update_sql, (
+                1 if sold else 0,
+                float(amount) if amount else None,
+                date_sold if date_sold else None,
+                item_id
+            ))
+
+            # Find and update the loan for this collateral
+            mysql_cursor.execute(LOAN_WITH_SUMMARY_KEYS + ' WHERE l.collateralId = %s', (item_id,))
+            map_loan = map_loan or compile_mapper(mysql_cursor.description, 'LoanState', LOAN_FIELDS)
+            loan = mysql_cursor.fetchone()
+
+            if loan:
+                loan = map_loan(loan)
+                mysql_cursor.execute('UPDATE loans SET status = %s WHERE id = %s AND status = %s',
+                                     ('defaulted', loan.id, loan.status))
+                if mysql_cursor.rowcount:
+                    summaries.status_changed(loan.id, loan.status, 'defaulted', loan.location, loan.outstanding)
+                    defaulted_count += 1
+
+    # Commits the status updates and their summary-table deltas together
+    summaries.apply(mysql_conn)
+
+    print(f'\nUpdated {defaulted_count} loans to defaulted status based on defaulted items')
+
+    access_cursor.close()
+    mysql_cursor.close()
+    return defaulted_count
+
+def write_status_changes(mysql_cursor, changes):
+    """Bulk-write (loan, new status) pairs: one UPDATE for loans, one for seized collaterals.
+
+    The changed loans are locked first and only those whose status is still
+    the one the sweep read are written, so a status the API set since the
+    read is never overwritten. Returns the changes that were applied.
+    """
+    placeholders = ", ".join(["%s"] * len(changes))
+    mysql_cursor.execute(f'SELECT id, status FROM loans WHERE id IN ({placeholders}) FOR UPDATE',
+                         [loan.id for loan, _ in changes])
+    current = dict(mysql_cursor.fetchall())
+    changes = [(loan, status) for loan, status in changes if current.get(loan.id) == loan.status]
+    if not changes:
+        return changes
+
+    cases = ' '.join(['WHEN %s THEN %s'] * len(changes))
+    params = []
+    for loan, status in changes:
+        params.extend((loan.id, status))
+    params.extend(loan.id for loan, _ in changes)
+    mysql_cursor.execute(
+        f'UPDATE loans SET status = CASE id {cases} END '
+        f'WHERE id IN ({", ".join(["%s"] * len(changes))})',
+        params
+    )
+
+    # Mark collateral as seized
+    seized = [loan.collateral_id for loan, status in changes if status == 'defaulted' and loan.collateral_id]
+    if seized:
+        mysql_cursor.execute(
+            f'UPDATE collaterals SET isSeized = 1 WHERE id IN ({", ".join(["%s"] * len(seized))})',
+            seized
+        )
+    return changes
+
+@stage('sweep', phase='convert')
+def sweep_chunk(mysql_conn, last_id, chunk_size, now, end_id=None):
+    """Read, update and commit one keyset chunk; returns (loans, changes)"""
+    mysql_cursor = mysql_conn.cursor()
+    try:
+        # Plain consistent read: takes no row locks
+        upper = '' if end_id is None else ' AND l.id < %s'
+        with stage('fetch'):
+            mysql_cursor.execute(SWEEP_CHUNK_SQL.format(upper=upper),
+                                 (last_id, chunk_size) if end_id is None else (last_id, end_id, chunk_size))
+            loans = fetch_records(mysql_cursor, 'LoanState', LOAN_FIELDS)
+
+        changes = []
+        for loan in loans:
+            status = loan_status(loan.due_date, loan.grace_period_end, now)
+            # Only loans whose status actually changes are written
+            if status != loan.status:
+                changes.append((loan, status))
+
+        if changes:
+            with stage('write'):
+                changes = write_status_changes(mysql_cursor, changes)
+        summaries = SummaryDeltas()
+        for loan, status in changes:
+            summaries.status_changed(loan.id, loan.status, status, loan.location, loan.outstanding)
+        # Commits the chunk and its summary-table deltas together, releasing its row locks
+        with stage('commit'):
+            summaries.apply(mysql_conn)
+        return loans, changes
+    finally:
+        mysql_cursor.close()
+
+def sweep_due_dates(mysql_conn, now=None, chunk_size=SWEEP_CHUNK_SIZE, pause=0.0, retries=SWEEP_RETRIES,
+                    start_id=0, end_id=None, on_chunk=None):
+    """Recompute open loan statuses in primary-key chunks, committing each chunk.
+
+    start_id/end_id limit the sweep to ids in (start_id, end_id). on_chunk is
+    called after every committed chunk; returning False stops the sweep.
+    `now` defaults to the database clock.
+    """
+    from mysql.connector import Error as MySQLError
+
+    now = now or database_now(mysql_conn)
+    counts = {'active': 0, 'pastDue': 0, 'defaulted': 0, 'changed': 0, 'chunks': 0, 'retries': 0}
+    latencies = []
+
+    mysql_cursor = mysql_conn.cursor()
+    mysql_cursor.execute('SET SESSION innodb_lock_wait_timeout = %s', (SWEEP_LOCK_WAIT_TIMEOUT,))
+    mysql_cursor.close()
+    mysql_conn.commit()
+
+    last_id = start_id
+    while True:
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                loans, changes = sweep_chunk(mysql_conn, last_id, chunk_size, now, end_id)
+                break
+            except MySQLError as e:
+                mysql_conn.rollback()
+                if e.errno not in RETRYABLE_ERRORS or attempt >= retries:
+                    raise
+                attempt += 1
+                counts['retries'] += 1
+                backoff = 0.1 * 2 ** attempt
+                print(f'  [RETRY] chunk after id {last_id}: {e.msg} (attempt {attempt}, waiting {backoff:.1f}s)')
+                time.sleep(backoff)
+
+        if not loans:
+            break
+
+        latency = (time.perf_counter() - started) * 1000
+        latencies.append(latency)
+        counts['chunks'] += 1
+        counts['changed'] += len(changes)
+        for loan in loans:
+            status = loan_status(loan.due_date, loan.grace_period_end, now)
+            counts['active' if status == 'due' else status] += 1
+        print(f'  [CHUNK] ids {loans[0].id}-{loans[-1].id}: {len(loans)} loans, '
+              f'{len(changes)} changed, {latency:.1f} ms')
+
+        last_id = loans[-1].id
+        if on_chunk is not None and on_chunk(loans, changes) is False:
+            break
+        if pause:
+            time.sleep(pause)
+
+    if latencies:
+        latencies.sort()
+        counts['latency'] = {
+            'p50': round(latencies[len(latencies) // 2], 1),
+            'p95': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1),
+            'max': round(latencies[-1], 1)
+        }
+    return counts
+
+def print_status_summary(mysql_conn):
+    """Print loan counts per status"""
+    mysql_cursor = mysql_conn.cursor()
+    mysql_cursor.execute('SELECT status, COUNT(*) as count FROM loans GROUP BY status')
+    summary = mysql_cursor.fetchall()
+
+    print('\nFinal loan status summary:')
+    for status, count in summary:
+        print(f'  {status}: {count}')
+    mysql_cursor.close()
+
+def update_statuses(mysql_conn, access_conn=None, chunk_size=SWEEP_CHUNK_SIZE, pause=0.0):
+    """Apply Access defaulted items (when a connection is given), then sweep due dates"""
+    create_summary_tables(mysql_conn)
+
+    defaulted_count = 0
+    if access_conn is not None:
+        defaulted_count = apply_defaulted_items(access_conn, mysql_conn, SummaryDeltas())
+
+    # Now update remaining loans based on their due dates
+    print('\nUpdating remaining loan statuses based on due dates...')
+    counts = sweep_due_dates(mysql_conn, chunk_size=chunk_size, pause=pause)
+    defaulted_count += counts['defaulted']
+
+    print(f'Active loans: {counts["active"]}')
+    print(f'Past due loans: {counts["pastDue"]}')
+    print(f'Total defaulted loans: {defaulted_count}')
+    print(f'Status changes written: {counts["changed"]} in {counts["chunks"]} chunks '
+          f'({counts["retries"]} retries)')
+    if 'latency' in counts:
+        latency = counts['latency']
+        print(f'Chunk latency: p50 {latency["p50"]} ms, p95 {latency["p95"]} ms, max {latency["max"]} ms')
+
+    print_status_summary(mysql_conn)
+
+class StatusScheduler:
+    """Min-heap of upcoming status transitions; each tick touches only loans whose time has come"""
+
+    def __init__(self, mysql_conn, refresh_seconds=SCHEDULE_REFRESH_SECONDS):
+        self.mysql_conn = mysql_conn
+        self.refresh_seconds = refresh_seconds
+        self.heap = []
+        # loanId -> version; heap entries with an older version are stale
+        self.versions = {}
+        self.max_id = 0
+        self.refreshed_at = None
+        # Database clock minus local clock; transitions are timed on the database clock
+        self.clock_offset = timedelta(0)
+        self.summaries = SummaryDeltas()
+
+    def now(self):
+        """The database clock, as of the last refresh's reading"""
+        return datetime.now() + self.clock_offset
+
+    def schedule(self, loan_id, status, due_date, grace_period_end, now):
+        """(Re)queue a loan's next transition, invalidating any earlier entry"""
+        version = self.versions.get(loan_id, 0) + 1
+        self.versions[loan_id] = version
+        if status in ('defaulted', 'paid') or due_date is None:
+            return
+        # A loan whose current status is already out of date transitions now
+        if loan_status(due_date, grace_period_end, now) != status:
+            heapq.heappush(self.heap, (now, loan_id, version))
+            return
+        moment = next_transition(due_date, grace_period_end, now)
+        if moment is not None:
+            heapq.heappush(self.heap, (moment, loan_id, version))
+
+    def refresh(self):
+        """Load new loans (keyset on id) and loans changed since the last refresh.
+
+        The watermark compared with updatedAt comes from the database, taken
+        before the read: the earlier of its local time and UTC, since the API
+        (Sequelize, no timezone set) writes updatedAt in UTC while
+        ON UPDATE CURRENT_TIMESTAMP writes server time. Re-reading a few
+        loans twice is harmless; missing one is not.
+        """
+        cursor = self.mysql_conn.cursor()
+        cursor.execute('SELECT NOW(), LEAST(NOW(), UTC_TIMESTAMP())')
+        now, watermark = cursor.fetchone()
+        self.clock_offset = now - datetime.now()
+        loaded = 0
+
+        if self.refreshed_at is None:
+            cursor.execute(OPEN_LOANS_SQL + ' ORDER BY id')
+        else:
+            # Overlap by a second: updatedAt has second precision
+            cursor.execute(CHANGED_LOANS_SQL, (self.max_id, self.refreshed_at - timedelta(seconds=1)))
+        for loan_id, status, due_date, grace_period_end, _ in cursor.fetchall():
+            self.schedule(loan_id, status, due_date, grace_period_end, now)
+            self.max_id = max(self.max_id, loan_id)
+            loaded += 1
+
+        cursor.close()
+        # Keep the version map to loans that are still scheduled
+        if len(self.versions) > 2 * len(self.heap) + 1000:
+            live = {loan_id for _, loan_id, _ in self.heap}
+            self.versions = {loan_id: v for loan_id, v in self.versions.items() if loan_id in live}
+        self.mysql_conn.commit()
+        self.refreshed_at = watermark
+        return loaded
+
+    def due_loans(self, now):
+        """Pop every current heap entry whose transition time has arrived"""
+        entries = []
+        while self.heap and self.heap[0][0] <= now:
+            entry = heapq.heappop(self.heap)
+            if self.versions.get(entry[1]) == entry[2]:
+                entries.append(entry)
+        return entries
+
+    def tick(self, now=None):
+        """Apply the transitions that are due; returns the number of status changes.
+
+        If anything fails before the commit, the popped transitions go back on
+        the heap and the schedule is left as it was.
+        """
+        now = now or self.now()
+        entries = self.due_loans(now)
+        if not entries:
+            return 0
+
+        loan_ids = [loan_id for _, loan_id, _ in entries]
+        cursor = self.mysql_conn.cursor()
+        try:
+            # Re-read the due loans so status, balance and dates are current
+            cursor.execute(LOAN_WITH_SUMMARY_KEYS + f' WHERE l.id IN ({", ".join(["%s"] * len(loan_ids))})',
+                           loan_ids)
+            loans = fetch_records(cursor, 'LoanState', LOAN_FIELDS)
+
+            changed = 0
+            reschedule = []
+            for loan in loans:
+                status = loan.status
+                if loan.status not in ('defaulted', 'paid'):
+                    status = loan_status(loan.due_date, loan.grace_period_end, now)
+                    if status != loan.status:
+                        if not apply_status(cursor, loan, status, self.summaries):
+                            # Changed by someone else since the read; the next refresh picks it up
+                            continue
+                        changed += 1
+                        print(f'  [STATUS] loan {loan.id}: {loan.status} -> {status}')
+                reschedule.append((loan.id, status, loan.due_date, loan.grace_period_end))
+
+            # Commits the status updates and their summary-table deltas together
+            self.summaries.apply(self.mysql_conn)
+        except Exception:
+            # Nothing was committed: drop the deltas and requeue the transitions
+            self.summaries = SummaryDeltas()
+            for entry in entries:
+                heapq.heappush(self.heap, entry)
+            raise
+        finally:
+            cursor.close()
+
+        # Only committed statuses reach the schedule
+        for loan_id, status, due_date, grace_period_end in reschedule:
+            self.schedule(loan_id, status, due_date, grace_period_end, now)
+        return changed
+
+    def reset(self):
+        """Forget the refresh watermark so the next refresh reloads every open loan"""
+        self.refreshed_at = None
+        self.max_id = 0
+
+    def seconds_until_next(self, now):
+        """Sleep until the earliest transition, but wake up for the next refresh"""
+        wait = self.refresh_seconds
+        if self.heap:
+            wait = min(wait, (self.heap[0][0] - now).total_seconds())
+        return max(wait, 0)
+
+    def run(self, stopping):
+        print('[INFO] Loading open loans into the schedule...')
+        loaded = self.refresh()
+        print(f'[INFO] {loaded} loans loaded, {len(self.heap)} transitions queued')
+
+        next_refresh = time.monotonic() + self.refresh_seconds
+        while not stopping.is_set():
+            try:
+                if time.monotonic() >= next_refresh:
+                    if not self.mysql_conn.is_connected():
+                        self.mysql_conn.reconnect(attempts=3, delay=2)
+                    self.refresh()
+                    next_refresh = time.monotonic() + self.refresh_seconds
+                changed = self.tick()
+                if changed:
+                    print(f'[SCHEDULE] {datetime.now():%Y-%m-%d %H:%M:%S} {changed} status changes, '
+                          f'{len(self.heap)} transitions queued')
+            except Exception as e:
+                print(f'[ERROR] Scheduler tick failed: {e}')
+                if self.mysql_conn.is_connected():
+                    self.mysql_conn.rollback()
+                # Loans changed while failing may have been missed: reload them all
+                self.reset()
+                next_refresh = time.monotonic()
+            stopping.wait(self.seconds_until_next(self.now()))
+
+def run_scheduler(mysql_conn, refresh_seconds=SCHEDULE_REFRESH_SECONDS):
+    """Run the transition scheduler until SIGINT/SIGTERM"""
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stopping.set())
+    signal.signal(signal.SIGINT, lambda *args: stopping.set())
+
+    create_summary_tables(mysql_conn)
+    StatusScheduler(mysql_conn, refresh_seconds).run(stopping)
+    print('[INFO] Scheduler stopped')
+
+def main(argv=None):
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Update loan statuses from Access defaulted items and due dates')
+    parser.add_argument('--no-access', action='store_true',
+                        help='skip Access defaulted items and only sweep due dates (no ODBC driver needed)')
+    parser.add_argument('--chunk-size', type=int, default=SWEEP_CHUNK_SIZE,
+                        help='loans per sweep chunk (each chunk commits separately)')
+    parser.add_argument('--pause', type=float, default=0.0,
+                        help='seconds to sleep between sweep chunks')
+    parser.add_argument('--schedule', action='store_true',
+                        help='after the initial update, keep running and apply each transition when it is due')
+    parser.add_argument('--refresh', type=float, default=SCHEDULE_REFRESH_SECONDS,
+                        help='seconds between scheduler checks for new and changed loans')
+    args = parser.parse_args(argv)
 
-mysql_conn.commit()
+    access_conn = None if args.no_access else connect_access()
+    mysql_conn = connect_mysql()
 
-print(f'Active loans: {active_count}')
-print(f'Past due loans: {past_due_count}')
-print(f'Total defaulted loans: {defaulted_count}')
+    update_statuses(mysql_conn, access_conn, args.chunk_size, args.pause)
 
-# Summary
-mysql_cursor.execute('SELECT status, COUNT(*) as count FROM loans GROUP BY status')
-summary = mysql_cursor.fetchall()
+    if access_conn is not None:
+        access_conn.close()
 
-print('\nFinal loan status summary:')
-for row in summary:
-    print(f'  {row["status"]}: {row["count"]}')
+    if args.schedule:
+        run_scheduler(mysql_conn, args.refresh)
+    mysql_conn.close()
 
-access_cursor.close()
-access_conn.close()
-mysql_cursor.close()
-mysql_conn.close()
+    print('\nDone!')
 
-print('\nDone!')
+if __name__ == '__main__':
+    main()
@@ -1,36 +1,29 @@
-import mysql.connector
-import os
-from dotenv import load_dotenv
+from coreq_db import connect_mysql
 
-load_dotenv()
+def main():
+    """Main function"""
+    # Connect to MySQL
+    mysql_conn = connect_mysql()
+    cursor = mysql_conn.cursor()
 
-# Database configuration
-MYSQL_CONFIG = {
-    'host': os.getenv('DB_HOST', 'localhost'),
-    'user': os.getenv('DB_USER', 'root'),
-    'password': os.getenv('DB_PASSWORD', ''),
-    'database': os.getenv('DB_NAME', 'coreq_loans')
-}
+    # Update the user email
+    cursor.execute(
+        "UPDATE users SET email = %s WHERE id = 1",
+        ('admin@coreqcapital.com',)
+    )
+    mysql_conn.commit()
 
-# Connect to MySQL
-mysql_conn = mysql.connector.connect(**MYSQL_CONFIG)
-cursor = mysql_conn.cursor()
+    # Verify
+    cursor.execute("SELECT id, name, email FROM users WHERE id = 1")
+    user = cursor.fetchone()
+    print(f"Updated user:")
+    print(f"  ID: {user[0]}")
+    print(f"  Name: {user[1]}")
+    print(f"  Email: {user[2]}")
 
-# Update the user email
-cursor.execute(
-    "UPDATE users SET email = %s WHERE id = 1",
-    ('admin@coreqcapital.com',)
-)
-mysql_conn.commit()
+    cursor.close()
+    mysql_conn.close()
+    print("\nEmail updated successfully!")
 
-# Verify
-cursor.execute("SELECT id, name, email FROM users WHERE id = 1")
-user = cursor.fetchone()
-print(f"Updated user:")
-print(f"  ID: {user[0]}")
-print(f"  Name: {user[1]}")
-print(f"  Email: {user[2]}")
-
-cursor.close()
-mysql_conn.close()
-print("\nEmail updated successfully!")
+if __name__ == '__main__':
+    main()